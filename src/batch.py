@@ -0,0 +1,129 @@
+"""Apply an edit recipe to many images without the GUI.
+
+The recipe is a JSON list of edits in the format EditStack.to_json writes,
+for example [{"op": "contrast", "factor": 1.2}, {"op": "grayscale"}].
+Run from the src directory:
+
+    python batch.py recipe.json photos/ "scans/*.png" --output edited --format .jpg
+
+Results keep their paths relative to the directory the inputs share, so
+photos/x.png and scans/x.png become edited/photos/x.jpg and
+edited/scans/x.jpg. A run that would write two images to one file, or
+over an input, stops before anything is processed.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from multiprocessing import Pool
+from PIL import Image
+from engine.export import FORMATS, save_image
+from engine.stack import EditStack
+
+# Set in each worker process by load_recipe, so the recipe is parsed once per process.
+recipe = None
+
+def load_recipe(data):
+    global recipe
+    recipe = EditStack.from_json(data)
+
+def find_images(inputs):
+    """Expand directories and glob patterns into a sorted list of image paths."""
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            candidates = glob.glob(pattern)
+        for path in candidates:
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in FORMATS:
+                paths.add(path)
+    return sorted(paths)
+
+def output_paths(paths, output, extension=None):
+    """Destination of each path under output, keeping its path relative to the inputs' common directory."""
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    destinations = []
+    for path in paths:
+        name, original_extension = os.path.splitext(os.path.relpath(os.path.abspath(path), root))
+        destinations.append(os.path.join(output, name + (extension or original_extension)))
+    return destinations
+
+def destination_conflict(paths, destinations):
+    """Message for the first destination that is an input or is shared by two inputs, or None."""
+    sources = {os.path.realpath(path) for path in paths}
+    claimed = {}
+    for path, destination in zip(paths, destinations):
+        key = os.path.realpath(destination)
+        if key in sources:
+            return f"{destination} would overwrite an input image"
+        if key in claimed:
+            return f"{claimed[key]} and {path} would both be written to {destination}"
+        claimed[key] = path
+    return None
+
+def worker_count(value):
+    count = int(value)
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return count
+
+def process(task):
+    """Render one file with the worker's recipe and write it; returns (path, pixels, error)."""
+    path, destination = task
+    try:
+        with Image.open(path) as image:
+            pixels = image.width * image.height
+            save_image(recipe.render(image), destination)
+    except Exception as error:
+        return path, 0, f"{type(error).__name__}: {error}"
+    return path, pixels, None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recipe", help="JSON file with the list of edits to apply")
+    parser.add_argument("inputs", nargs="+", help="image files, directories or glob patterns")
+    parser.add_argument("--output", "-o", required=True, help="directory to write results to")
+    parser.add_argument("--format", choices=sorted(FORMATS), help="output extension (default: keep the input's)")
+    parser.add_argument("--workers", type=worker_count, default=os.cpu_count(), help="processes to use (default: one per core)")
+    args = parser.parse_args()
+
+    with open(args.recipe) as file:
+        data = file.read()
+    # Parse once here so a bad recipe fails before any worker starts.
+    EditStack.from_json(data)
+
+    paths = find_images(args.inputs)
+    if not paths:
+        print("[ERROR] No images found.")
+        return 1
+    destinations = output_paths(paths, args.output, args.format)
+    conflict = destination_conflict(paths, destinations)
+    if conflict is not None:
+        print(f"[ERROR] {conflict}.")
+        return 1
+    for directory in {os.path.dirname(destination) for destination in destinations}:
+        os.makedirs(directory, exist_ok=True)
+    tasks = list(zip(paths, destinations))
+
+    start = time.perf_counter()
+    failures = 0
+    megapixels = 0.0
+    with Pool(min(args.workers, len(tasks)), initializer=load_recipe, initargs=(data,)) as pool:
+        # Results are written by the workers as they finish; only a summary comes back.
+        for done, (path, pixels, error) in enumerate(pool.imap_unordered(process, tasks), 1):
+            if error is not None:
+                failures += 1
+                print(f"[ERROR] {path}: {error}")
+            megapixels += pixels / 1_000_000
+            elapsed = time.perf_counter() - start
+            print(f"[{done}/{len(tasks)}] {path}  {done / elapsed:.1f} images/s")
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {len(tasks) - failures} of {len(tasks)} images in {elapsed:.1f} s: "
+          f"{len(tasks) / elapsed:.1f} images/s, {megapixels / elapsed:.1f} MP/s")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
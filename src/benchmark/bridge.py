@@ -0,0 +1,82 @@
+"""Count and time the full-frame copies of one edit with and without the shared PIL/Qt bridge.
+
+Run from the src directory:
+
+    python -m benchmark.bridge --megapixels 12 --repeat 5
+
+Uses the offscreen Qt platform unless QT_QPA_PLATFORM is set.
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtGui import QGuiApplication, QPixmap
+from PIL import Image, ImageEnhance
+from PIL.ImageQt import ImageQt
+from benchmark.lut import synthetic_image
+from component.bridge import SharedFrame, to_qimage
+
+def edit(image):
+    return ImageEnhance.Brightness(image).enhance(1.2)
+
+def baseline_steps():
+    """The original round trip: toqimage, frombytes with a BGRA swizzle, edit, ImageQt, QPixmap."""
+    def inbound(source):
+        q_image = source.toqimage()
+        return Image.frombytes("RGBA", (q_image.width(), q_image.height()), q_image.bits(), "raw", "BGRA", 0, 1)
+
+    return [
+        ("toqimage + frombytes BGRA", 2, inbound),
+        ("edit", 0, edit),
+        ("ImageQt", 1, ImageQt),
+        ("QPixmap.fromImage", 1, QPixmap.fromImage),
+    ]
+
+def bridge_steps(image):
+    """The shared-buffer path: edit the frame's PIL view, wrap the result once, upload."""
+    frame = SharedFrame.from_image(image)
+    return [
+        ("SharedFrame.image view", 0, lambda _: frame.image),
+        ("edit", 0, edit),
+        ("to_qimage", 1, to_qimage),
+        ("QPixmap.fromImage", 1, QPixmap.fromImage),
+    ]
+
+def run(steps, image, repeat):
+    """Time each step, feeding each one the previous step's result; return [(name, copies, seconds)].
+
+    copies is the number of full-frame buffers a conversion step allocates.
+    """
+    totals = [0.0] * len(steps)
+    for _ in range(repeat):
+        value = image
+        for index, (_, _, step) in enumerate(steps):
+            start = time.perf_counter()
+            value = step(value)
+            totals[index] += time.perf_counter() - start
+    return [(name, copies, total / repeat) for (name, copies, _), total in zip(steps, totals)]
+
+def report(title, results):
+    copies = sum(count for _, count, _ in results)
+    conversion = sum(seconds for _, count, seconds in results if count)
+    print(f"{title}: {copies} full-frame copies, {conversion * 1000:.1f} ms in conversions")
+    for name, count, seconds in results:
+        print(f"  {name:28s} {seconds * 1000:8.1f} ms  {count} copies")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = QGuiApplication.instance() or QGuiApplication([])
+    image = synthetic_image(args.megapixels)
+    print(f"Image: {image.width}x{image.height} ({args.megapixels} MP), edit: brightness")
+
+    report("before", run(baseline_steps(), image, args.repeat))
+    report("after", run(bridge_steps(image), image, args.repeat))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare the fused point-operation pipeline against chained ImageEnhance calls.
+
+Run from the src directory:
+
+    python -m benchmark.lut --megapixels 12 --repeat 5
+"""
+import argparse
+import time
+from PIL import Image, ImageChops, ImageEnhance
+from engine.lut import PointPipeline
+
+EDITS = [
+    {"op": "contrast", "factor": 1.3},
+    {"op": "brightness", "factor": 0.9},
+    {"op": "saturation", "factor": 1.4},
+]
+
+ENHANCERS = {
+    "contrast": ImageEnhance.Contrast,
+    "brightness": ImageEnhance.Brightness,
+    "saturation": ImageEnhance.Color,
+}
+
+def synthetic_image(megapixels):
+    width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    height = int(width * 2 / 3)
+    red = Image.linear_gradient("L").resize((width, height))
+    green = Image.radial_gradient("L").resize((width, height))
+    blue = Image.effect_noise((width, height), 64)
+    return Image.merge("RGB", (red, green, blue))
+
+def chained(image, edits):
+    for edit in edits:
+        image = ENHANCERS[edit["op"]](image).enhance(edit["factor"])
+    return image
+
+def fused(image, edits):
+    return PointPipeline(edits).apply(image)
+
+def best_time(function, image, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(image, EDITS)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    image = synthetic_image(args.megapixels)
+    print(f"Image: {image.width}x{image.height} ({args.megapixels} MP), edits: {[edit['op'] for edit in EDITS]}")
+
+    chained_time, chained_result = best_time(chained, image, args.repeat)
+    fused_time, fused_result = best_time(fused, image, args.repeat)
+    difference = ImageChops.difference(chained_result, fused_result).getextrema()
+
+    print(f"chained ImageEnhance: {chained_time * 1000:8.1f} ms")
+    print(f"fused PointPipeline:  {fused_time * 1000:8.1f} ms  ({chained_time / fused_time:.1f}x)")
+    print(f"max channel difference: {max(high for _, high in difference)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Time the editor's hot paths on synthetic images and compare against a stored baseline.
+
+Run from the src directory:
+
+    python -m benchmark.suite --sizes 1 12 --output results.json
+    python -m benchmark.suite --save-baseline
+    python -m benchmark.suite --baseline benchmark/baseline.json
+
+Every operation is measured on each image size for median latency, peak
+resident memory above the level before it started, peak Python heap and
+the number of Pillow image blocks allocated. Images above TILED_PIXELS are
+edited through TiledImage, as in the editor. Uses the offscreen Qt platform
+unless QT_QPA_PLATFORM is set. Exits with 1 if any result is slower than
+the baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import PIL
+import PySide6
+from PySide6.QtCore import QPointF
+from PySide6.QtGui import QImage, QPainter, QPixmap
+from PySide6.QtWidgets import QApplication, QGraphicsScene, QGraphicsView
+from PIL import Image
+from benchmark.lut import synthetic_image
+from component.bridge import to_qimage
+from component.resize import ResizablePixmapItem
+from engine.stack import EditStack, normalize_mode
+from engine.tiles import TiledImage, TILED_PIXELS, display_image
+
+SIZES = (1, 12, 50, 100)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# One edit per GUI handler, with the parameters its slider or dialog produces.
+EDITS = {
+    "contrast": {"op": "contrast", "factor": 1.3},
+    "brightness": {"op": "brightness", "factor": 1.2},
+    "saturation": {"op": "saturation", "factor": 1.4},
+    "sharpen": {"op": "sharpen", "factor": 1.5},
+    "blur": {"op": "blur", "radius": 2.5},
+    "grayscale": {"op": "grayscale"},
+    "flip": {"op": "flip", "direction": "horizontal"},
+    "rotate": {"op": "rotate", "angle": 90},
+    "text": {"op": "text", "text": "Benchmark", "position": [10, 10], "color": [255, 255, 255]},
+}
+
+class MemorySampler:
+    """Samples resident memory on a background thread to find the peak during an operation."""
+
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.peak = 0
+        self.running = False
+
+    @classmethod
+    def resident(cls):
+        try:
+            with open("/proc/self/statm") as file:
+                return int(file.read().split()[1]) * cls.PAGE_SIZE
+        except OSError:
+            return 0
+
+    def __enter__(self):
+        self.start = self.peak = self.resident()
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, self.resident())
+
+    def sample(self):
+        while self.running:
+            self.peak = max(self.peak, self.resident())
+            time.sleep(self.interval)
+
+    @property
+    def growth(self):
+        return self.peak - self.start
+
+def measure(function, repeat):
+    """Run function repeat times; return latency, memory and allocation figures for it."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    # Memory is measured on a separate run so tracing does not skew the timings.
+    Image.core.reset_stats()
+    tracemalloc.start()
+    with MemorySampler() as sampler:
+        function()
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": statistics.median(timings),
+        "best_seconds": min(timings),
+        "peak_rss_bytes": sampler.growth,
+        "python_peak_bytes": python_peak,
+        "image_blocks": Image.core.get_stats()["allocated_blocks"],
+    }
+
+def edit_operations(source):
+    """Engine operations behind the enhancer handlers, apply_flip, apply_rotate, add_text and confirm_crop."""
+    operations = {}
+    for name, edit in EDITS.items():
+        stack = EditStack([edit])
+        operations[name] = lambda stack=stack: close_result(stack.render(source), source)
+    width, height = source.size
+    crop = EditStack([{"op": "crop", "box": [width // 4, height // 4, width * 3 // 4, height * 3 // 4]}])
+    operations["crop"] = lambda: close_result(crop.render(source), source)
+    return operations
+
+def close_result(result, source):
+    if isinstance(result, TiledImage) and result is not source:
+        result.close()
+
+def qt_operations(source):
+    """Frame conversion, scene update and resize drag, on the image the canvas would show."""
+    frame = display_image(source)
+    if frame.mode not in ("RGBA", "RGBX", "L"):
+        frame = frame.convert("RGBX")
+    q_image = to_qimage(frame)
+    pixmap = QPixmap.fromImage(q_image)
+
+    view = QGraphicsView()
+    # Parented to the view so the scene and its item live as long as the closures below.
+    scene = QGraphicsScene(view)
+    view.setScene(scene)
+    view.resize(1200, 800)
+    item = ResizablePixmapItem(pixmap)
+    scene.addItem(item)
+    view.fitInView(item)
+    target = QImage(view.viewport().size(), QImage.Format_RGB32)
+
+    def update_image():
+        QPixmap.fromImage(to_qimage(frame))
+
+    def scene_update():
+        item.set_frame(QPixmap.fromImage(q_image))
+        painter = QPainter(target)
+        view.render(painter)
+        painter.end()
+
+    def resize_drag():
+        # Thirty pointer moves and one release, as in a short drag of the handle.
+        for step in range(30):
+            item.resize_image(QPointF(pixmap.width() * (1 - step / 60), pixmap.height()))
+        item.finish_resize()
+        item.set_frame(pixmap)
+
+    return {"update_image": update_image, "scene_update": scene_update, "resize_drag": resize_drag}
+
+def make_source(megapixels):
+    image = normalize_mode(synthetic_image(megapixels))
+    if image.width * image.height > TILED_PIXELS:
+        tiled = TiledImage.from_image(image)
+        image.close()
+        return tiled
+    return image
+
+def run(sizes, repeat, only=None):
+    results = []
+    for megapixels in sizes:
+        source = make_source(megapixels)
+        operations = {**edit_operations(source), **qt_operations(source)}
+        for name, function in operations.items():
+            if only and name not in only:
+                continue
+            result = {"name": name, "megapixels": megapixels, **measure(function, repeat)}
+            results.append(result)
+            print(f"{name:>13} {megapixels:>5} MP {result['seconds'] * 1000:10.1f} ms "
+                  f"{result['peak_rss_bytes'] / 2**20:8.1f} MB rss {result['image_blocks']:6d} blocks")
+        if isinstance(source, TiledImage):
+            source.close()
+    return results
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "pyside6": PySide6.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+def compare(results, baseline, tolerance):
+    """Print each result against the baseline; return the names of those slower than tolerance allows."""
+    reference = {(entry["name"], entry["megapixels"]): entry for entry in baseline["results"]}
+    regressions = []
+    print(f"\nCompared with baseline from {baseline['environment']['platform']}:")
+    for result in results:
+        entry = reference.get((result["name"], result["megapixels"]))
+        if entry is None:
+            continue
+        ratio = result["seconds"] / entry["seconds"] if entry["seconds"] else 1.0
+        flag = "REGRESSION" if ratio > tolerance else ""
+        print(f"{result['name']:>13} {result['megapixels']:>5} MP {ratio:6.2f}x {flag}")
+        if flag:
+            regressions.append(f"{result['name']}@{result['megapixels']}MP")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=SIZES, help="megapixels of the synthetic images")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="run only these operations")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store the results as {DEFAULT_BASELINE}")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    report = {"environment": environment(), "results": run(args.sizes, args.repeat, args.only)}
+
+    for path in filter(None, (args.output, DEFAULT_BASELINE if args.save_baseline else None)):
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report["results"], json.load(file), args.tolerance)
+        if regressions:
+            print(f"[ERROR] Slower than baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
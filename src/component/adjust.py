@@ -1,25 +1,37 @@
 import sys
 import os
-from PySide6.QtWidgets import (QVBoxLayout,
+from PySide6.QtWidgets import (QVBoxLayout, QHBoxLayout,
                                QPushButton, 
                                QSlider,
                                QDialog, 
                                QLineEdit)  
 from PySide6.QtGui import QIntValidator
 from PySide6.QtCore import Qt
+from component.histogram import HistogramPanel
 
 class AdjustDialog(QDialog):
-    def __init__(self, title, slider_min, slider_max, default_value, on_value_changed):
+    """Slider dialog for one adjustment, with the live histogram of the preview beside it.
+
+    The owner feeds the histogram through self.histogram.set_histogram().
+    on_auto_levels, if given, is called by an Auto Levels button.
+    """
+
+    def __init__(self, title, slider_min, slider_max, default_value, on_value_changed, on_released=None,
+                 on_auto_levels=None):
         super().__init__()
         self.setWindowTitle(title)
         self.setModal(False)  
 
-        layout = QVBoxLayout(self)
+        outer = QHBoxLayout(self)
+        layout = QVBoxLayout()
+        outer.addLayout(layout)
 
         self.slider = QSlider(Qt.Horizontal)
         self.slider.setRange(slider_min, slider_max)
         self.slider.setValue(default_value)
         self.slider.valueChanged.connect(on_value_changed)
+        if on_released is not None:
+            self.slider.sliderReleased.connect(on_released)
         layout.addWidget(self.slider)
 
         self.input_field = QLineEdit(self) 
@@ -28,11 +40,17 @@ class AdjustDialog(QDialog):
         self.input_field.textChanged.connect(self.on_input_changed) 
         layout.addWidget(self.input_field)
 
+        if on_auto_levels is not None:
+            auto_levels_button = QPushButton("Auto Levels")
+            auto_levels_button.clicked.connect(on_auto_levels)
+            layout.addWidget(auto_levels_button)
+
         close_button = QPushButton("Close")
         close_button.clicked.connect(self.close)
         layout.addWidget(close_button)
 
-        self.setLayout(layout)
+        self.histogram = HistogramPanel(self)
+        outer.addWidget(self.histogram)
 
     def on_input_changed(self, text):
         if text:
@@ -0,0 +1,79 @@
+from PySide6.QtGui import QImage
+from PIL import Image
+
+# PIL modes whose raw bytes Qt can address directly, and the matching QImage format.
+QT_FORMATS = {
+    "RGBA": QImage.Format_RGBA8888,
+    "RGBX": QImage.Format_RGBX8888,
+    "L": QImage.Format_Grayscale8,
+}
+
+class SharedQImage(QImage):
+    """QImage over a SharedFrame's buffer that keeps the frame alive."""
+
+    def __init__(self, frame):
+        width, height = frame.size
+        super().__init__(frame.data, width, height, frame.stride, QT_FORMATS[frame.mode])
+        self.frame = frame
+
+class SharedFrame:
+    """One pixel buffer exposed to both PIL and Qt without copying.
+
+    Pixels are stored row-major as RGBA8888, RGBX8888 for opaque images or
+    Grayscale8. These are byte-for-byte the raw layouts of PIL's RGBA, RGBX
+    and L modes, so Image.frombuffer and QImage can both wrap the same
+    memory. Qt's premultiplied ARGB32 would need a swizzle and an
+    unpremultiply pass before any PIL filter could read it.
+    """
+
+    def __init__(self, size, mode, data, stride=None):
+        self.size = tuple(size)
+        self.mode = mode
+        self.stride = stride or size[0] * Image.getmodebands(mode)
+        self.data = data
+        self.image = Image.frombuffer(mode, self.size, data, "raw", mode, self.stride, 1)
+        self.image.shared_frame = self
+        self.qimage = SharedQImage(self)
+
+    def crop(self, box):
+        """Frame over the box region of this one's buffer, or None if box cannot be viewed without a copy.
+
+        Rows of the view keep this frame's stride. PIL requires the buffer to
+        hold a full stride for the view's last row, so a box touching the
+        bottom edge can only be viewed if it starts at the left edge.
+        """
+        left, top, right, bottom = box
+        offset = top * self.stride + left * Image.getmodebands(self.mode)
+        if offset + (bottom - top) * self.stride > len(self.data):
+            return None
+        return SharedFrame((right - left, bottom - top), self.mode, memoryview(self.data)[offset:], self.stride)
+
+    @classmethod
+    def from_image(cls, image):
+        """Return the frame backing image, or copy image into a new one exactly once."""
+        frame = getattr(image, "shared_frame", None)
+        if frame is not None:
+            return frame
+
+        if image.mode in QT_FORMATS:
+            mode = image.mode
+            data = image.tobytes()
+        elif image.mode == "RGB":
+            # PIL keeps RGB pixels four bytes wide, so packing to RGBX is a plain copy.
+            mode = "RGBX"
+            data = image.tobytes("raw", "RGBX")
+        else:
+            has_alpha = image.mode in ("LA", "PA", "RGBa", "La") or "transparency" in image.info
+            mode = "RGBA" if has_alpha else "RGBX"
+            data = image.convert(mode).tobytes()
+        return cls(image.size, mode, data)
+
+def crop_view(image, box):
+    """image cropped to box, viewing its frame buffer where possible and copying the region otherwise."""
+    frame = getattr(image, "shared_frame", None)
+    view = frame.crop(box) if frame is not None else None
+    return view.image if view is not None else image.crop(box)
+
+def to_qimage(image):
+    """QImage sharing memory with image, copying at most once and never swizzling."""
+    return SharedFrame.from_image(image).qimage
@@ -0,0 +1,84 @@
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsObject
+from PySide6.QtGui import QPen
+from PySide6.QtCore import Qt, QRectF, Signal
+from PIL import Image
+from component.bridge import to_qimage
+from engine.text import glyph_cache, text_bounds, text_size
+
+class CaptionItem(QGraphicsObject):
+    """Editable handle over a text edit whose pixels are already in the rendered frame.
+
+    The item is a child of the canvas scaled so its units are pixels of the
+    full-resolution image. Dragging it shows the caption's cached glyph run
+    under the cursor; on release moved(index, x, y) reports the new
+    position of edit index in the stack. Double-clicking emits
+    edit_requested(index).
+    """
+
+    moved = Signal(int, int, int)
+    edit_requested = Signal(int)
+
+    def __init__(self, index, edit, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.edit = dict(edit)
+        self.ghost = None
+        self.hovered = False
+        self.setZValue(2)
+        self.setFlag(QGraphicsItem.ItemIsMovable)
+        self.setAcceptHoverEvents(True)
+        self.setCursor(Qt.SizeAllCursor)
+
+    def set_edit(self, index, edit, ratio):
+        """Show edit index of the stack on a canvas with ratio canvas pixels per image pixel."""
+        if edit != self.edit:
+            self.prepareGeometryChange()
+            self.edit = dict(edit)
+            self.ghost = None
+        self.index = index
+        self.setScale(ratio)
+        x, y = self.edit["position"]
+        self.setPos(x * ratio, y * ratio)
+
+    def boundingRect(self):
+        left, top, right, bottom = text_bounds(self.edit)
+        x, y = self.edit["position"]
+        return QRectF(left - x, top - y, right - left, bottom - top)
+
+    def paint(self, painter, option, widget=None):
+        if self.ghost is not None:
+            painter.drawImage(self.boundingRect().topLeft(), self.ghost)
+        if self.hovered or self.ghost is not None:
+            pen = QPen(Qt.white, 1, Qt.DashLine)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            painter.drawRect(self.boundingRect())
+
+    def hoverEnterEvent(self, event):
+        self.hovered = True
+        self.update()
+
+    def hoverLeaveEvent(self, event):
+        self.hovered = False
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            mask, _ = glyph_cache.get(self.edit["text"], text_size(self.edit))
+            ghost = Image.new("RGBA", mask.size, tuple(self.edit["color"]) + (255,))
+            ghost.putalpha(mask)
+            self.ghost = to_qimage(ghost)
+            self.update()
+        super().mousePressEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        super().mouseReleaseEvent(event)
+        self.ghost = None
+        self.update()
+        ratio = self.scale()
+        x, y = round(self.pos().x() / ratio), round(self.pos().y() / ratio)
+        if [x, y] != list(self.edit["position"]):
+            self.moved.emit(self.index, x, y)
+
+    def mouseDoubleClickEvent(self, event):
+        self.edit_requested.emit(self.index)
@@ -2,13 +2,17 @@ import sys
 from PySide6.QtWidgets import (QGraphicsItem, 
                                QGraphicsRectItem)  
 from PySide6.QtGui import QPen, QColor
-from PySide6.QtCore import Qt, QRectF, QPointF
+from PySide6.QtCore import Qt, QRectF
 
 class CropItem(QGraphicsRectItem):
     def __init__(self):
         super().__init__()
-        self.setPen(QPen(Qt.red, 2, Qt.DashLine))
+        # Scene units are image pixels, so the outline and handle are sized in view pixels instead.
+        pen = QPen(Qt.red, 2, Qt.DashLine)
+        pen.setCosmetic(True)
+        self.setPen(pen)
         self.setBrush(QColor(255, 0, 0, 50)) 
+        self.setZValue(3)
         self.setFlag(QGraphicsItem.ItemIsMovable)
         self.setFlag(QGraphicsItem.ItemSendsGeometryChanges)
         
@@ -18,12 +22,12 @@ class CropItem(QGraphicsRectItem):
         self.resize_handle.setBrush(Qt.darkGray)
         self.resize_handle.setPen(Qt.NoPen)
         self.resize_handle.setCursor(Qt.SizeFDiagCursor)
+        self.resize_handle.setFlag(QGraphicsItem.ItemIgnoresTransformations)
         self.update_resize_handle_position()
 
     def update_resize_handle_position(self):
         """Update the position of the resize handle."""
-        rect = self.rect()
-        self.resize_handle.setPos(rect.bottomRight() - QPointF(5, 5)) 
+        self.resize_handle.setPos(self.rect().bottomRight())
 
     def mousePressEvent(self, event):
         """Handle mouse press events for resizing or moving."""
@@ -0,0 +1,109 @@
+import os
+from PySide6.QtWidgets import QGraphicsScene
+from PIL import Image
+from component.loader import ImageLoader
+from component.render import RenderScheduler
+from engine.cache import image_bytes
+from engine.filters import FilterCache
+from engine.histogram import HistogramTracker
+from engine.history import History
+from engine.proxy import PreviewProxy
+from engine.stack import EditStack
+
+# Pixels all open documents may keep in memory before background ones are spilled to disk.
+DEFAULT_SESSION_BUDGET = 2 * 1024 * 1024 * 1024
+# Longest side of the frame a spilled document keeps on its canvas.
+SPILLED_DISPLAY_SIZE = 2048
+
+class Document:
+    """One open image with its own scene, edit state, caches and schedulers.
+
+    Every document's renderer and loader run on the session's shared
+    worker pool. ImageEditor reads and writes the active document's state
+    through attributes of the same names, so switching tabs only changes
+    which Document those attributes resolve to.
+    """
+
+    def __init__(self, pool, parent=None):
+        self.path = None
+        self.scene = QGraphicsScene(parent)
+        self.renderer = RenderScheduler(parent=parent, pool=pool)
+        self.loader = ImageLoader(parent=parent, pool=pool)
+
+        self.original_image = None
+        self.current_pixmap = None
+        self.image_size = None
+        self.image_key = None
+        # Edits are recorded here and rendered from original_image.
+        self.edit_stack = EditStack()
+        # Undo steps; destructive edits keep compressed tile diffs of the frame.
+        self.history = History()
+        # Edits of the last full-resolution frame shown, which tile diffs apply to.
+        self.rendered_edits = []
+        # Slider ticks render on a viewport-sized proxy; the full-resolution
+        # pass runs once the slider is released or goes idle.
+        self.preview_proxy = PreviewProxy()
+        # Sharpen and blur previews reuse their input and its blur pyramid between slider steps.
+        self.filter_cache = FilterCache()
+        # Histogram of the stack on the preview proxy, shown beside the adjust dialogs.
+        self.histogram_tracker = HistogramTracker()
+        self.full_render_pending = False
+        self.pyramid = None
+        # Frame on the canvas of a background tab, whose pyramid is built once the tab is shown.
+        self.pyramid_source = None
+        self.resizable_item = None
+        self.stroke_layer = None
+        # Editable handles of the stack's text edits, children of the canvas.
+        self.captions = []
+
+        # View placement while another tab is shown; fit_pending is set when
+        # the first frame arrived in the background and the view was not fitted.
+        self.view_transform = None
+        self.view_center = None
+        self.fit_pending = False
+        # Order in which documents were last shown, for choosing what to spill.
+        self.last_shown = 0
+        # Set while pixels are being spilled to disk, and once they are there.
+        self.spilling = False
+        self.spilled = False
+
+    @property
+    def title(self):
+        return os.path.basename(self.path) if self.path else "Untitled"
+
+    def pixel_bytes(self):
+        """Approximate bytes of decoded and uploaded pixels this document holds in memory."""
+        images = {}
+        for image in (self.original_image, self.current_pixmap, self.preview_proxy.image):
+            if isinstance(image, Image.Image):
+                images[id(image)] = image
+        if self.pyramid is not None:
+            for level in self.pyramid.levels:
+                if isinstance(level, Image.Image):
+                    images[id(level)] = level
+        total = sum(image_bytes(image) for image in images.values())
+        canvas = self.resizable_item
+        if canvas is not None:
+            total += canvas.frame.width() * canvas.frame.height() * 4 + canvas.tile_pixmap_bytes
+        return total
+
+    def can_spill(self):
+        return (isinstance(self.original_image, Image.Image) and isinstance(self.current_pixmap, Image.Image)
+                and not self.spilling and not self.spilled and not self.renderer.is_busy())
+
+    def close(self):
+        self.renderer.cancel()
+        self.loader.cancel()
+        if self.pyramid is not None:
+            self.pyramid.close()
+            self.pyramid = None
+        for image in {id(image): image for image in (self.original_image, self.current_pixmap)}.values():
+            if image is not None and not isinstance(image, Image.Image):
+                image.close()
+        self.original_image = None
+        self.current_pixmap = None
+        self.history.clear()
+        self.scene.clear()
+        self.scene.deleteLater()
+        self.renderer.deleteLater()
+        self.loader.deleteLater()
@@ -0,0 +1,123 @@
+import traceback
+from PySide6.QtWidgets import (QDialog, QFormLayout, QSpinBox, QComboBox,
+                               QCheckBox, QDialogButtonBox)
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from engine.export import DEFAULT_OPTIONS, PNG_STRATEGIES, ExportCancelled, save_image
+from engine.profiler import span
+
+class ExportOptionsDialog(QDialog):
+    """Encoder settings for one export format."""
+
+    def __init__(self, format, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"{format} Export Options")
+        self.format = format
+        self.fields = {}
+        layout = QFormLayout(self)
+        defaults = DEFAULT_OPTIONS[format]
+
+        if format == "PNG":
+            self.add_spin_box(layout, "compress_level", "Compression level", 0, 9, defaults["compress_level"])
+            strategy = QComboBox()
+            strategy.addItems(list(PNG_STRATEGIES))
+            strategy.setCurrentText(defaults["strategy"])
+            layout.addRow("Filter strategy", strategy)
+            self.fields["strategy"] = strategy.currentText
+        elif format in ("JPEG", "WEBP"):
+            self.add_spin_box(layout, "quality", "Quality", 1, 100, defaults["quality"])
+            checks = ("progressive", "optimize") if format == "JPEG" else ("lossless",)
+            for name in checks:
+                check = QCheckBox()
+                check.setChecked(defaults[name])
+                layout.addRow(name.capitalize(), check)
+                self.fields[name] = check.isChecked
+            if format == "WEBP":
+                self.add_spin_box(layout, "method", "Effort (0 fast - 6 small)", 0, 6, defaults["method"])
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def add_spin_box(self, layout, name, label, minimum, maximum, value):
+        spin_box = QSpinBox()
+        spin_box.setRange(minimum, maximum)
+        spin_box.setValue(value)
+        layout.addRow(label, spin_box)
+        self.fields[name] = spin_box.value
+
+    def options(self):
+        return {name: read() for name, read in self.fields.items()}
+
+class ExportSignals(QObject):
+    progress = Signal(str)
+    finished = Signal(str)
+    failed = Signal(str, str)
+    cancelled = Signal()
+
+class ExportJob(QRunnable):
+    """Renders the full-resolution image and writes it, reporting progress and honouring cancel().
+
+    save(rendered, path, options, cancelled, on_write) writes what render
+    returned; it is save_image unless the job writes something else, such
+    as a project.
+    """
+
+    def __init__(self, render, path, options, exporter, save=save_image):
+        super().__init__()
+        self.render = render
+        self.path = path
+        self.options = options
+        self.save = save
+        self.is_cancelled = False
+        self.reported = 0
+        self.signals = exporter.signals
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def report_written(self, written):
+        # One update per megabyte keeps the GUI's event queue short.
+        if written - self.reported >= 2**20:
+            self.reported = written
+            self.signals.progress.emit(f"Encoding... {written / 2**20:.1f} MB written")
+
+    def run(self):
+        try:
+            self.signals.progress.emit("Rendering...")
+            with span("export render", "engine"):
+                image = self.render()
+            if self.is_cancelled:
+                raise ExportCancelled()
+            self.signals.progress.emit("Encoding...")
+            with span("export encode", "engine"):
+                self.save(image, self.path, self.options, lambda: self.is_cancelled, self.report_written)
+        except ExportCancelled:
+            self.signals.cancelled.emit()
+            return
+        except Exception:
+            self.signals.failed.emit(self.path, traceback.format_exc())
+            return
+        self.signals.finished.emit(self.path)
+
+class Exporter(QObject):
+    """Runs one ExportJob at a time on its own thread."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = ExportSignals()
+        self.job = None
+
+    def start(self, render, path, options, save=save_image):
+        self.job = ExportJob(render, path, options, self, save)
+        self.job.setAutoDelete(True)
+        self.pool.start(self.job)
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+
+    def is_busy(self):
+        return self.pool.activeThreadCount() > 0
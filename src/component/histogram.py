@@ -0,0 +1,58 @@
+from PySide6.QtWidgets import QWidget
+from PySide6.QtGui import QColor, QPainter, QPainterPath, QPen
+from PySide6.QtCore import QRect, Qt
+from engine.histogram import CLIPPING_THRESHOLD, clipping
+
+CHANNEL_COLORS = (QColor(255, 80, 80), QColor(80, 220, 80), QColor(90, 140, 255))
+LABEL_HEIGHT = 16
+
+class HistogramPanel(QWidget):
+    """Per-channel histogram with shadow and highlight clipping indicators.
+
+    The corner markers light up in the colour of every channel with more
+    than CLIPPING_THRESHOLD of its pixels at 0 or 255.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.histogram = None
+        self.setMinimumSize(256, 120)
+
+    def set_histogram(self, histogram):
+        self.histogram = histogram
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(30, 30, 30))
+        if self.histogram is None:
+            painter.end()
+            return
+        area = self.rect().adjusted(4, 4, -4, -4 - LABEL_HEIGHT)
+        # The end bins are left out of the scale so a clipped spike does not flatten the rest.
+        peak = max(max(self.histogram[channel * 256 + 1:channel * 256 + 255]) for channel in range(3)) or 1
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setCompositionMode(QPainter.CompositionMode_Plus)
+        for channel, color in enumerate(CHANNEL_COLORS):
+            path = QPainterPath()
+            path.moveTo(area.left(), area.bottom())
+            for value in range(256):
+                height = min(self.histogram[channel * 256 + value] / peak, 1.0) * area.height()
+                path.lineTo(area.left() + value * area.width() / 255, area.bottom() - height)
+            path.lineTo(area.right(), area.bottom())
+            painter.fillPath(path, QColor(color.red(), color.green(), color.blue(), 140))
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+
+        shadows, highlights = clipping(self.histogram)
+        for index, fractions in enumerate((shadows, highlights)):
+            corner = QRect(area.left() if index == 0 else area.right() - 9, area.top(), 10, 10)
+            clipped = [color for color, fraction in zip(CHANNEL_COLORS, fractions) if fraction > CLIPPING_THRESHOLD]
+            painter.fillRect(corner, mix(clipped) if clipped else QColor(70, 70, 70))
+        painter.setPen(QPen(Qt.lightGray))
+        painter.drawText(QRect(4, area.bottom() + 2, self.width() - 8, LABEL_HEIGHT), Qt.AlignVCenter,
+                         f"Clipped: shadows {max(shadows):.1%}, highlights {max(highlights):.1%}")
+        painter.end()
+
+def mix(colors):
+    return QColor(min(255, sum(color.red() for color in colors)), min(255, sum(color.green() for color in colors)),
+                  min(255, sum(color.blue() for color in colors)))
@@ -0,0 +1,91 @@
+import traceback
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from engine.profiler import span
+
+class LoaderSignals(QObject):
+    loaded = Signal(int, object, object, bool)
+    failed = Signal(int, str)
+    after_finished = Signal(int)
+
+class LoadJob(QRunnable):
+    def __init__(self, generation, stages, after, loader):
+        super().__init__()
+        self.generation = generation
+        self.stages = stages
+        self.after = after
+        self.loader = loader
+        self.signals = loader.signals
+
+    def run(self):
+        for index, (name, stage) in enumerate(self.stages):
+            if self.loader.generation != self.generation:
+                return
+            try:
+                with span(name, "engine"):
+                    result = stage()
+            except Exception:
+                self.signals.failed.emit(self.generation, traceback.format_exc())
+                return
+            if result is not None:
+                image, q_image = result
+                self.signals.loaded.emit(self.generation, image, q_image, index == len(self.stages) - 1)
+        if self.after is None or self.loader.generation != self.generation:
+            return
+        name, after = self.after
+        try:
+            with span(name, "engine"):
+                after()
+        except Exception:
+            self.signals.failed.emit(self.generation, traceback.format_exc())
+            return
+        self.signals.after_finished.emit(self.generation)
+
+class ImageLoader(QObject):
+    """Decodes an image on a background thread in stages of increasing quality.
+
+    Each stage is a (name, callable) returning (image, q_image) or None to
+    skip it. on_loaded(image, q_image, final) is called on the GUI thread for
+    every stage of the newest load; the last stage is the final image.
+    Starting a new load abandons the previous one between stages. An
+    optional after stage runs once the final image has been posted, for
+    work such as filling caches that should not delay it; after_finished
+    is emitted when it completes.
+    """
+
+    after_finished = Signal()
+
+    def __init__(self, parent=None, pool=None):
+        super().__init__(parent)
+        if pool is None:
+            pool = QThreadPool(self)
+            pool.setMaxThreadCount(1)
+        self.pool = pool
+        self.signals = LoaderSignals()
+        self.signals.loaded.connect(self.on_stage_loaded)
+        self.signals.failed.connect(self.on_stage_failed)
+        self.signals.after_finished.connect(self.on_after_finished)
+        self.generation = 0
+        self.on_loaded = None
+
+    def load(self, stages, on_loaded, after=None):
+        self.generation += 1
+        self.on_loaded = on_loaded
+        job = LoadJob(self.generation, stages, after, self)
+        job.setAutoDelete(True)
+        self.pool.start(job)
+
+    def cancel(self):
+        self.generation += 1
+        self.on_loaded = None
+
+    def on_stage_loaded(self, generation, image, q_image, final):
+        if generation == self.generation and self.on_loaded is not None:
+            self.on_loaded(image, q_image, final)
+
+    def on_after_finished(self, generation):
+        if generation == self.generation:
+            self.after_finished.emit()
+
+    def on_stage_failed(self, generation, error):
+        if generation == self.generation:
+            print(f"[ERROR] Image import failed:\n{error}")
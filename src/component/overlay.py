@@ -0,0 +1,52 @@
+from PySide6.QtGui import QColor, QFont, QFontMetrics, QPainter
+from PySide6.QtCore import QObject, QRect, QTimer, Qt
+from engine.profiler import profiler
+
+class PerformanceOverlay(QObject):
+    """Draws the latest frame time and a per-stage breakdown over a view's viewport.
+
+    The view calls paint() from drawForeground; a timer refreshes the
+    viewport a few times a second while the overlay is shown.
+    """
+
+    def __init__(self, view, window=5.0, interval=250):
+        super().__init__(view)
+        self.view = view
+        self.window = window
+        self.font = QFont("monospace", 9)
+        self.font.setStyleHint(QFont.Monospace)
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.view.viewport().update)
+        self.timer.start()
+
+    def lines(self):
+        stages = profiler.breakdown(self.window)
+        stages.pop("frame", None)
+        frame = profiler.last("frame")
+        lines = [f"frame {frame * 1000:8.1f} ms" if frame is not None else "frame        - ms"]
+        lines.append(f"{'stage':<22}{'last':>9}{'mean':>9}{'n':>5}")
+        for name, (last, mean, count) in sorted(stages.items(), key=lambda item: -item[1][1] * item[1][2]):
+            lines.append(f"{name[:21]:<22}{last * 1000:9.1f}{mean * 1000:9.1f}{count:5d}")
+        return lines
+
+    def paint(self, painter):
+        lines = self.lines()
+        metrics = QFontMetrics(self.font)
+        width = max(metrics.horizontalAdvance(line) for line in lines) + 16
+        height = metrics.lineSpacing() * len(lines) + 12
+
+        painter.save()
+        # Draw in viewport pixels, unaffected by zoom and scrolling.
+        painter.resetTransform()
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.fillRect(QRect(8, 8, width, height), QColor(0, 0, 0, 170))
+        painter.setFont(self.font)
+        painter.setPen(Qt.white)
+        for index, line in enumerate(lines):
+            painter.drawText(16, 14 + metrics.ascent() + index * metrics.lineSpacing(), line)
+        painter.restore()
+
+    def close(self):
+        self.timer.stop()
+        self.view.viewport().update()
@@ -0,0 +1,136 @@
+from PySide6.QtWidgets import QWidget
+from PySide6.QtGui import QColor, QCursor, QPainter, QPen
+from PySide6.QtCore import Qt, QEvent, QObject, QPoint, QRect, Signal
+from component.bridge import to_qimage
+from engine.picker import DEFAULT_SAMPLE_SIZE, SAMPLE_SIZES, average_color, read_region
+
+# Image pixels across the loupe, and screen pixels per image pixel in it.
+LOUPE_PIXELS = 15
+LOUPE_ZOOM = 8
+LOUPE_LABEL_HEIGHT = 18
+
+class Loupe(QWidget):
+    """Magnified pixels around the pointer with the sampled area outlined and its average colour."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent, Qt.ToolTip | Qt.FramelessWindowHint)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        side = LOUPE_PIXELS * LOUPE_ZOOM
+        self.setFixedSize(side, side + LOUPE_LABEL_HEIGHT)
+        self.pixels = None
+        self.color = None
+        self.size_sampled = DEFAULT_SAMPLE_SIZE
+
+    def show_sample(self, pixels, color, size_sampled, global_pos):
+        self.pixels = pixels
+        self.color = color
+        self.size_sampled = size_sampled
+        self.move(global_pos + QPoint(20, 20))
+        self.show()
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        side = LOUPE_PIXELS * LOUPE_ZOOM
+        painter.fillRect(self.rect(), Qt.black)
+        if self.pixels is not None:
+            painter.drawImage(QRect(0, 0, side, side), self.pixels)
+        # The sampled neighbourhood, centred on the pixel under the pointer.
+        start = (LOUPE_PIXELS // 2 - self.size_sampled // 2) * LOUPE_ZOOM
+        painter.setPen(QPen(Qt.white, 1))
+        painter.drawRect(start, start, self.size_sampled * LOUPE_ZOOM - 1, self.size_sampled * LOUPE_ZOOM - 1)
+        if self.color is not None:
+            painter.fillRect(0, side, LOUPE_LABEL_HEIGHT, LOUPE_LABEL_HEIGHT, QColor(*self.color))
+            painter.drawText(QRect(LOUPE_LABEL_HEIGHT + 4, side, side, LOUPE_LABEL_HEIGHT), Qt.AlignVCenter,
+                             "RGB({}, {}, {})  {}x{}".format(*self.color, self.size_sampled, self.size_sampled))
+        painter.end()
+
+class ColorPicker(QObject):
+    """Pick tool installed on a view as an event filter, leaving the view's own handlers in place.
+
+    locate(view_pos) returns (image, x, y): the working image and the pixel
+    of it under a viewport position, or None. Hovering shows a loupe read
+    from that image's region around the pointer; clicking emits
+    picked((r, g, b)) averaged over the sample size, which [ and ] change.
+    Escape emits cancelled().
+    """
+
+    picked = Signal(tuple)
+    cancelled = Signal()
+
+    def __init__(self, view, locate, sample_size=DEFAULT_SAMPLE_SIZE):
+        super().__init__(view)
+        self.view = view
+        self.locate = locate
+        self.sample_size = sample_size
+        self.loupe = Loupe(view)
+        # The viewport's mouse tracking before start(), restored by stop(); None while not picking.
+        self.tracking = None
+
+    def start(self):
+        if self.tracking is not None:
+            return
+        self.tracking = self.view.viewport().hasMouseTracking()
+        self.view.viewport().installEventFilter(self)
+        self.view.installEventFilter(self)
+        self.view.viewport().setMouseTracking(True)
+        self.view.setCursor(Qt.CrossCursor)
+
+    def stop(self):
+        if self.tracking is None:
+            return
+        self.view.viewport().removeEventFilter(self)
+        self.view.removeEventFilter(self)
+        self.view.viewport().setMouseTracking(self.tracking)
+        self.tracking = None
+        self.view.setCursor(Qt.ArrowCursor)
+        self.loupe.hide()
+
+    def sample(self, view_pos):
+        """(color, loupe image) at view_pos, or None when the pointer is off the image."""
+        location = self.locate(view_pos)
+        if location is None:
+            return None
+        image, x, y = location
+        color = average_color(image, x, y, self.sample_size)
+        if color is None:
+            return None
+        half = LOUPE_PIXELS // 2
+        return color, to_qimage(read_region(image, (x - half, y - half, x - half + LOUPE_PIXELS, y - half + LOUPE_PIXELS)))
+
+    def eventFilter(self, watched, event):
+        kind = event.type()
+        if kind == QEvent.MouseMove and watched is self.view.viewport():
+            self.hover(event.position().toPoint(), event.globalPosition().toPoint())
+            return False
+        if kind == QEvent.MouseButtonPress and watched is self.view.viewport():
+            if event.button() == Qt.LeftButton:
+                sample = self.sample(event.position().toPoint())
+                if sample is not None:
+                    self.stop()
+                    self.picked.emit(sample[0])
+            return True
+        if kind in (QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick) and watched is self.view.viewport():
+            return True
+        if kind == QEvent.Leave and watched is self.view.viewport():
+            self.loupe.hide()
+        if kind == QEvent.KeyPress and watched is self.view:
+            if event.key() == Qt.Key_Escape:
+                self.stop()
+                self.cancelled.emit()
+                return True
+            if event.key() in (Qt.Key_BracketLeft, Qt.Key_BracketRight):
+                index = SAMPLE_SIZES.index(self.sample_size) if self.sample_size in SAMPLE_SIZES else 1
+                index += 1 if event.key() == Qt.Key_BracketRight else -1
+                self.sample_size = SAMPLE_SIZES[max(0, min(index, len(SAMPLE_SIZES) - 1))]
+                self.hover(self.view.viewport().mapFromGlobal(QCursor.pos()), QCursor.pos())
+                return True
+        return False
+
+    def hover(self, view_pos, global_pos):
+        sample = self.sample(view_pos)
+        if sample is None:
+            self.loupe.hide()
+            return
+        color, pixels = sample
+        self.loupe.show_sample(pixels, color, self.sample_size, global_pos)
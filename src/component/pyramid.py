@@ -0,0 +1,52 @@
+import time
+import traceback
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from engine.profiler import profiler
+from engine.pyramid import ImagePyramid
+
+class PyramidSignals(QObject):
+    level_ready = Signal(object, int)
+
+class PyramidJob(QRunnable):
+    def __init__(self, pyramid, signals):
+        super().__init__()
+        self.pyramid = pyramid
+        self.signals = signals
+
+    def run(self):
+        try:
+            levels = self.pyramid.build()
+            while True:
+                start = time.perf_counter()
+                index = next(levels, None)
+                if index is None:
+                    break
+                profiler.record("pyramid level", "engine", start, time.perf_counter() - start)
+                self.signals.level_ready.emit(self.pyramid, index)
+        except Exception:
+            # Closing a pyramid mid-build can pull its tiles away from this thread.
+            if not self.pyramid.cancelled:
+                print(f"[ERROR] Pyramid build failed:\n{traceback.format_exc()}")
+
+class PyramidBuilder(QObject):
+    """Builds ImagePyramids on a background thread, one level at a time.
+
+    level_ready(pyramid, index) is emitted on the GUI thread after each level
+    is added, so the canvas can switch to it straight away.
+    """
+
+    def __init__(self, parent=None, pool=None):
+        super().__init__(parent)
+        if pool is None:
+            pool = QThreadPool(self)
+            pool.setMaxThreadCount(1)
+        self.pool = pool
+        self.signals = PyramidSignals()
+        self.level_ready = self.signals.level_ready
+
+    def build(self, image):
+        pyramid = ImagePyramid(image)
+        job = PyramidJob(pyramid, self.signals)
+        job.setAutoDelete(True)
+        self.pool.start(job)
+        return pyramid
@@ -0,0 +1,40 @@
+import os
+from PySide6.QtWidgets import QListWidget, QListWidgetItem, QListView
+from PySide6.QtGui import QIcon, QPixmap
+from PySide6.QtCore import Qt, QSize, Signal
+from component.bridge import to_qimage
+from engine.cache import THUMBNAIL_SIZE, file_key
+
+class RecentFilesPanel(QListWidget):
+    """Recently opened files, drawn from cached thumbnails without touching the originals' pixels.
+
+    open_requested(path) is emitted when an entry is clicked.
+    """
+
+    open_requested = Signal(str)
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.setViewMode(QListView.IconMode)
+        self.setIconSize(QSize(THUMBNAIL_SIZE // 3, THUMBNAIL_SIZE // 3))
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setStyleSheet("background-color: #3A3A3A; color: white;")
+        self.itemClicked.connect(lambda item: self.open_requested.emit(item.data(Qt.UserRole)))
+        self.refresh()
+
+    def refresh(self):
+        self.clear()
+        for path in self.cache.recent():
+            try:
+                key = file_key(path)
+            except OSError:
+                continue
+            item = QListWidgetItem(os.path.basename(path))
+            item.setToolTip(path)
+            item.setData(Qt.UserRole, path)
+            thumbnail = self.cache.thumbnail(key)
+            if thumbnail is not None:
+                item.setIcon(QIcon(QPixmap.fromImage(to_qimage(thumbnail))))
+            self.addItem(item)
@@ -0,0 +1,132 @@
+import time
+import traceback
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from component.bridge import to_qimage
+from engine.profiler import profiler, span
+
+class RenderSignals(QObject):
+    finished = Signal(int, object, object)
+    failed = Signal(int, str)
+
+class RenderJob(QRunnable):
+    def __init__(self, generation, render, scheduler, display=None):
+        super().__init__()
+        self.generation = generation
+        self.render = render
+        self.display = display
+        self.scheduler = scheduler
+        self.signals = scheduler.signals
+
+    def run(self):
+        if self.scheduler.is_stale(self.generation):
+            self.signals.finished.emit(self.generation, None, None)
+            return
+        try:
+            with span("render", "engine"):
+                image = self.render()
+            # The QImage is built here so the GUI thread only has to upload it.
+            if image is None:
+                q_image = None
+            else:
+                shown = self.display(image) if self.display is not None else image
+                with span("to_qimage", "convert"):
+                    q_image = to_qimage(shown)
+                if shown is image and q_image.frame.mode == image.mode:
+                    # Pass on the image over the frame's buffer instead of keeping
+                    # both copies; crops of it can then be views of that buffer.
+                    image = q_image.frame.image
+        except Exception:
+            self.signals.failed.emit(self.generation, traceback.format_exc())
+            return
+        self.signals.finished.emit(self.generation, image, q_image)
+
+class RenderScheduler(QObject):
+    """Runs render callables on a worker pool and posts only the newest frame back.
+
+    Each lane has at most one job in flight and one pending. Submitting a job
+    replaces every pending job (they are all older), so intermediate slider
+    values are coalesced. A finished frame older than the last one posted is
+    dropped. Schedulers can share one pool; lanes are limited per scheduler.
+    """
+
+    def __init__(self, lanes=("preview", "full"), parent=None, pool=None):
+        super().__init__(parent)
+        if pool is None:
+            pool = QThreadPool(self)
+            pool.setMaxThreadCount(len(lanes))
+        self.pool = pool
+        self.signals = RenderSignals()
+        self.signals.finished.connect(self.on_job_finished)
+        self.signals.failed.connect(self.on_job_failed)
+
+        self.generation = 0
+        self.posted_generation = 0
+        self.running = {lane: None for lane in lanes}
+        self.pending = {lane: None for lane in lanes}
+        self.callbacks = {}
+
+    def submit(self, render, on_done, lane="full", display=None):
+        """Queue render() and call on_done(image, q_image) on the GUI thread when it is the newest frame.
+
+        display, if given, maps the rendered image to the in-memory image the
+        QImage is built from, e.g. a downsample of a tiled image.
+        """
+        self.generation += 1
+        for name, job in self.pending.items():
+            if job is not None:
+                self.callbacks.pop(job.generation, None)
+                self.pending[name] = None
+
+        job = RenderJob(self.generation, render, self, display)
+        # The submit time is kept to record how long the frame took to reach the canvas.
+        self.callbacks[job.generation] = (lane, on_done, time.perf_counter())
+        if self.running[lane] is None:
+            self.start(lane, job)
+        else:
+            self.pending[lane] = job
+        return job.generation
+
+    def cancel(self):
+        """Drop every queued job and ignore the results of those in flight."""
+        self.generation += 1
+        self.posted_generation = self.generation
+        for lane in self.pending:
+            self.pending[lane] = None
+        self.callbacks.clear()
+
+    def is_stale(self, generation):
+        return generation <= self.posted_generation or generation not in self.callbacks
+
+    def is_busy(self):
+        return any(job is not None for job in self.running.values())
+
+    def start(self, lane, job):
+        self.running[lane] = job
+        job.setAutoDelete(True)
+        self.pool.start(job)
+
+    def finish(self, generation):
+        for lane, job in self.running.items():
+            if job is not None and job.generation == generation:
+                self.running[lane] = None
+                next_job = self.pending[lane]
+                if next_job is not None:
+                    self.pending[lane] = None
+                    self.start(lane, next_job)
+                break
+        return self.callbacks.pop(generation, None)
+
+    def on_job_finished(self, generation, image, q_image):
+        callback = self.finish(generation)
+        if callback is None or image is None or generation <= self.posted_generation:
+            return
+        self.posted_generation = generation
+        _, on_done, submitted = callback
+        with span("show frame", "scene"):
+            on_done(image, q_image)
+        # Time from submitting the job to the frame being on the canvas.
+        profiler.record("frame", "frame", submitted, time.perf_counter() - submitted)
+
+    def on_job_failed(self, generation, error):
+        self.finish(generation)
+        print(f"[ERROR] Render job failed:\n{error}")
@@ -1,22 +1,51 @@
 import sys
 import os
+from collections import OrderedDict
 from PySide6.QtWidgets import (
                                QMenu,
                                QGraphicsPixmapItem, QGraphicsItem, 
-                               QGraphicsRectItem)  
+                               QGraphicsRectItem, QStyleOptionGraphicsItem)  
+from PySide6.QtGui import QPainter, QPainterPath, QPixmap, QTransform
 from PySide6.QtCore import Qt, QRectF, QPointF
+from component.bridge import to_qimage
+from engine.profiler import span
+
+# Bytes of pyramid tiles kept uploaded as QPixmaps.
+TILE_PIXMAP_BUDGET = 64 * 1024 * 1024
 
 class ResizablePixmapItem(QGraphicsPixmapItem):
+    """Persistent canvas item; new frames replace its pixmap in place.
+
+    The item paints from its own QPixmap rather than QGraphicsPixmapItem's,
+    so a region can be painted into it without detaching a shared copy and
+    only that region is repainted.
+
+    With an ImagePyramid attached, the item draws only the visible tiles of
+    the level that matches the current zoom instead of scaling the whole
+    frame on every paint.
+    """
+
     def __init__(self, pixmap):
-        super().__init__(pixmap)
-        self.original_pixmap = pixmap
-        self.current_pixmap = pixmap  
+        super().__init__()
+        self.frame = QPixmap(pixmap)
+        self.original_pixmap = self.frame
+        self.current_pixmap = self.frame  
         self.setFlags(QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemSendsGeometryChanges)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
         self.setCursor(Qt.SizeAllCursor)
 
         self.is_resizing = False
         self.resize_start_pos = None
         self.current_handle = None
+        # While dragging, the new size is shown with an item transform and
+        # only resampled on release, from the smallest cached halving of
+        # original_pixmap that is still large enough.
+        self.resize_size = None
+        self.resize_sources = None
+
+        self.pyramid = None
+        self.tile_pixmaps = OrderedDict()
+        self.tile_pixmap_bytes = 0
 
         self.resize_handle = QGraphicsRectItem(self)
         self.resize_handle.setRect(QRectF(-5, -5, 10, 10))
@@ -26,6 +55,114 @@ class ResizablePixmapItem(QGraphicsPixmapItem):
 
         self.update_resize_handle_position()
 
+    def pixmap(self):
+        return self.frame
+
+    def setPixmap(self, pixmap):
+        if pixmap.size() != self.frame.size():
+            self.prepareGeometryChange()
+        self.frame = QPixmap(pixmap)
+        self.update()
+
+    def boundingRect(self):
+        return QRectF(self.offset(), self.frame.deviceIndependentSize())
+
+    def shape(self):
+        path = QPainterPath()
+        path.addRect(self.boundingRect())
+        return path
+
+    def contains(self, point):
+        return self.boundingRect().contains(point)
+
+    def paint(self, painter, option, widget=None):
+        if self.frame.isNull():
+            return
+        with span("paint", "paint"):
+            self.paint_frame(painter, option)
+
+    def paint_frame(self, painter, option):
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, self.transformationMode() == Qt.SmoothTransformation)
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        level = self.pyramid_level(painter)
+        if level is not None:
+            self.paint_tiles(painter, exposed, level)
+            return
+        source = exposed.translated(-self.offset())
+        ratio = self.frame.devicePixelRatio()
+        painter.drawPixmap(exposed, self.frame, QRectF(source.topLeft() * ratio, source.size() * ratio))
+
+    def set_pyramid(self, pyramid):
+        """Draw from pyramid, which must hold the pixels of the current frame, or stop with None."""
+        self.pyramid = pyramid
+        self.tile_pixmaps.clear()
+        self.tile_pixmap_bytes = 0
+        self.update()
+
+    def pyramid_level(self, painter):
+        """Pyramid level to paint at the painter's zoom, or None to paint the frame itself."""
+        if self.pyramid is None:
+            return None
+        # Full-resolution pixels per frame pixel, and device pixels per full-resolution pixel.
+        full_scale = self.pyramid.width / self.frame.width()
+        zoom = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform()) / full_scale
+        level = self.pyramid.level_for_scale(zoom)
+        if self.pyramid.level(level) is None or abs(2 ** level - full_scale) < 1e-3:
+            return None
+        return level
+
+    def paint_tiles(self, painter, exposed, level):
+        width, height = self.pyramid.level(level).size
+        # Frame pixels per pixel of this level.
+        scale_x = self.frame.width() / width
+        scale_y = self.frame.height() / height
+        area = exposed.translated(-self.offset())
+        box = (area.left() / scale_x, area.top() / scale_y, area.right() / scale_x, area.bottom() / scale_y)
+        for column, row, (left, top, right, bottom) in self.pyramid.visible_tiles(level, box):
+            target = QRectF(left * scale_x, top * scale_y, (right - left) * scale_x, (bottom - top) * scale_y)
+            pixmap = self.tile_pixmap(level, column, row, (left, top, right, bottom))
+            painter.drawPixmap(target.translated(self.offset()), pixmap, QRectF(pixmap.rect()))
+
+    def tile_pixmap(self, level, column, row, box):
+        """Uploaded pixmap of one pyramid tile; tiles are converted only when first drawn."""
+        key = (level, column, row)
+        pixmap = self.tile_pixmaps.get(key)
+        if pixmap is not None:
+            self.tile_pixmaps.move_to_end(key)
+            return pixmap
+        with span("tile upload", "convert"):
+            pixmap = QPixmap.fromImage(to_qimage(self.pyramid.tile(level, box)))
+        self.tile_pixmaps[key] = pixmap
+        self.tile_pixmap_bytes += pixmap.width() * pixmap.height() * 4
+        while self.tile_pixmap_bytes > TILE_PIXMAP_BUDGET and len(self.tile_pixmaps) > 1:
+            _, evicted = self.tile_pixmaps.popitem(last=False)
+            self.tile_pixmap_bytes -= evicted.width() * evicted.height() * 4
+        return pixmap
+
+    def set_frame(self, pixmap, scale=1.0):
+        """Show a new frame, keeping the item, its position and the view transform."""
+        self.setPixmap(pixmap)
+        self.set_pyramid(None)
+        self.resize_sources = None
+        # Share the one QPixmap so painting a region into it never detaches a copy.
+        self.original_pixmap = self.frame
+        self.current_pixmap = self.frame
+        if self.scale() != scale:
+            self.setScale(scale)
+        self.update_resize_handle_position()
+
+    def update_region(self, image, rect):
+        """Paint image into rect of the current frame and repaint only that rect."""
+        painter = QPainter(self.frame)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.drawImage(rect.topLeft(), image)
+        painter.end()
+        self.set_pyramid(None)
+        self.resize_sources = None
+        self.original_pixmap = self.frame
+        self.current_pixmap = self.frame
+        self.update(QRectF(rect))
+
     def contextMenuEvent(self, event):
         context_menu = QMenu()
         remove_action = context_menu.addAction("Remove Image")
@@ -47,6 +184,7 @@ class ResizablePixmapItem(QGraphicsPixmapItem):
             self.is_resizing = True
             self.current_handle = self.resize_handle
             self.resize_start_pos = event.pos()
+            self.resize_size = None
             self.setCursor(Qt.SizeFDiagCursor)
             return
 
@@ -54,7 +192,8 @@ class ResizablePixmapItem(QGraphicsPixmapItem):
 
     def mouseMoveEvent(self, event):
         if self.is_resizing and self.current_handle:
-            self.resize_image(event.pos())
+            # Undo the preview transform so the size is measured in frame pixels.
+            self.resize_image(self.transform().map(event.pos()))
         else:
             super().mouseMoveEvent(event)
 
@@ -62,6 +201,7 @@ class ResizablePixmapItem(QGraphicsPixmapItem):
         if self.is_resizing:
             self.is_resizing = False
             self.setCursor(Qt.SizeAllCursor)
+            self.finish_resize()
         else:
             super().mouseReleaseEvent(event)
 
@@ -76,8 +216,37 @@ class ResizablePixmapItem(QGraphicsPixmapItem):
         else:
             new_height = new_width / aspect_ratio
 
-        resized_pixmap = self.original_pixmap.scaled(new_width, new_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        factor = new_width / self.frame.width()
+        self.setTransform(QTransform.fromScale(factor, factor))
+        # Keep the handle its normal size on screen.
+        self.resize_handle.setScale(1 / factor)
+        self.resize_size = (new_width, new_height)
+
+    def finish_resize(self):
+        """Resample once, with high quality, to the size chosen during the drag."""
+        if self.resize_size is None:
+            return
+        width, height = (max(round(value), 1) for value in self.resize_size)
+        self.resize_size = None
+        source = self.resize_source(width, height)
+        resized_pixmap = source.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.resetTransform()
+        self.resize_handle.setScale(1)
         self.setPixmap(resized_pixmap)
         self.current_pixmap = resized_pixmap  
 
         self.update_resize_handle_position()
+
+    def resize_source(self, width, height):
+        """Smallest cached halving of original_pixmap at least width x height."""
+        if self.resize_sources is None:
+            self.resize_sources = [self.original_pixmap]
+        sources = self.resize_sources
+        while sources[-1].width() >= 2 * width and sources[-1].height() >= 2 * height:
+            last = sources[-1]
+            sources.append(last.scaled(last.width() // 2, last.height() // 2,
+                                       Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+        for source in reversed(sources):
+            if source.width() >= width and source.height() >= height:
+                return source
+        return sources[0]
@@ -0,0 +1,131 @@
+import math
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsPathItem
+from PySide6.QtGui import QColor, QImage, QPainter, QPainterPath, QPen
+from PySide6.QtCore import Qt, QRectF
+from engine.profiler import span
+
+# Pixel cap of the finished-stroke raster; beyond it the layer is stored at reduced resolution.
+MAX_LAYER_PIXELS = 16 * 1000 * 1000
+
+def stroke_pen(stroke):
+    return QPen(QColor(*stroke.color), stroke.width, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
+
+def stroke_path(stroke):
+    path = QPainterPath()
+    for index in range(len(stroke)):
+        x, y = stroke.point(index)
+        if index == 0:
+            path.moveTo(x, y)
+        else:
+            path.lineTo(x, y)
+    if len(stroke) == 1:
+        # A click without a drag still leaves a dot.
+        path.lineTo(x, y)
+    return path
+
+def stroke_rect(stroke):
+    """Whole-pixel scene rectangle covering stroke."""
+    left, top, right, bottom = stroke.bounds()
+    return QRectF(math.floor(left), math.floor(top), math.ceil(right - left) + 1, math.ceil(bottom - top) + 1)
+
+class StrokeItem(QGraphicsPathItem):
+    """The stroke being drawn, as one path item extended in place as points arrive."""
+
+    def __init__(self, stroke):
+        super().__init__()
+        self.stroke = stroke
+        self.path = QPainterPath()
+        self.setPen(stroke_pen(stroke))
+        self.setZValue(2)
+
+    def add(self, x, y):
+        added = self.stroke.add(x, y)
+        if added is None:
+            return
+        if added and self.path.elementCount() == 0:
+            self.path.moveTo(x, y)
+        elif added:
+            self.path.lineTo(x, y)
+        else:
+            self.path.setElementPositionAt(self.path.elementCount() - 1, x, y)
+        self.setPath(self.path)
+
+class StrokeLayer(QGraphicsItem):
+    """Finished strokes rasterized into one cached image, so they cost one item and one blit to draw.
+
+    The raster covers the union of the strokes' bounds in scene
+    coordinates. Adding a stroke inside it paints just that stroke; one
+    that extends it reallocates the raster and, if its resolution had to
+    change, paints every stroke again from its points.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.strokes = []
+        self.box = QRectF()
+        self.scale = 1.0
+        self.image = None
+        self.setZValue(1)
+
+    def boundingRect(self):
+        return self.box
+
+    def add(self, stroke):
+        self.strokes.append(stroke)
+        box = stroke_rect(stroke)
+        with span("stroke raster", "scene"):
+            if self.image is not None and self.box.contains(box):
+                self.paint_strokes([stroke])
+            else:
+                self.resize(self.box.united(box) if self.image is not None else box)
+        self.update()
+
+    def set_strokes(self, strokes):
+        """Show exactly strokes, painting the raster again from their points."""
+        self.strokes = list(strokes)
+        self.image = None
+        if self.strokes:
+            box = QRectF()
+            for stroke in self.strokes:
+                box = box.united(stroke_rect(stroke))
+            with span("stroke raster", "scene"):
+                self.resize(box)
+        else:
+            self.prepareGeometryChange()
+            self.box = QRectF()
+        self.update()
+
+    def resize(self, box):
+        old_image, old_box, old_scale = self.image, self.box, self.scale
+        self.prepareGeometryChange()
+        self.box = box
+        self.scale = min(1.0, math.sqrt(MAX_LAYER_PIXELS / max(box.width() * box.height(), 1)))
+        self.image = QImage(max(int(math.ceil(box.width() * self.scale)), 1),
+                            max(int(math.ceil(box.height() * self.scale)), 1),
+                            QImage.Format_ARGB32_Premultiplied)
+        self.image.fill(Qt.transparent)
+        if old_image is not None and self.scale == old_scale:
+            painter = QPainter(self.image)
+            painter.drawImage(round((old_box.left() - box.left()) * self.scale),
+                              round((old_box.top() - box.top()) * self.scale), old_image)
+            painter.end()
+            self.paint_strokes(self.strokes[-1:])
+        else:
+            self.paint_strokes(self.strokes)
+
+    def paint_strokes(self, strokes):
+        painter = QPainter(self.image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.scale(self.scale, self.scale)
+        painter.translate(-self.box.left(), -self.box.top())
+        for stroke in strokes:
+            painter.setPen(stroke_pen(stroke))
+            painter.drawPath(stroke_path(stroke))
+        painter.end()
+
+    def paint(self, painter, option, widget=None):
+        if self.image is None:
+            return
+        with span("stroke layer", "paint"):
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawImage(self.box, self.image, QRectF(self.image.rect()))
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+DEFAULT_DISK_BUDGET = 512 * 1024 * 1024
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+# Longest side of the cached thumbnails and mid-resolution decodes.
+THUMBNAIL_SIZE = 256
+MID_SIZE = 2048
+RECENT_LIMIT = 12
+# Entries are raw pixels after a one-line header, so reading one back is a
+# single read with no decoding.
+MAGIC = b"REDY1"
+
+def default_cache_dir():
+    """The per-user cache directory for the editor."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "redy")
+
+def file_key(path):
+    """(absolute path, mtime, size) of path; a file changed on disk gets a new key."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+def image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+def write_raw(file, image):
+    file.write(MAGIC + f" {image.mode} {image.width} {image.height}\n".encode())
+    file.write(image.tobytes())
+
+def read_raw(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    end = data.index(b"\n")
+    magic, mode, width, height = data[:end].split()
+    if magic != MAGIC:
+        raise ValueError(f"Not a cache entry: {path}")
+    mode = mode.decode()
+    return Image.frombuffer(mode, (int(width), int(height)), memoryview(data)[end + 1:], "raw", mode, 0, 1)
+
+def downsample(image, max_size):
+    """image shrunk to fit max_size on its longest side, or image itself if it already fits."""
+    scale = min(max_size / image.width, max_size / image.height)
+    if scale >= 1.0:
+        return image
+    size = (max(int(image.width * scale), 1), max(int(image.height * scale), 1))
+    return image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+class DecodeCache:
+    """Thumbnails and mid-resolution decodes of opened files, kept on disk.
+
+    Entries are keyed by file_key(), so an edited or replaced file is never
+    served stale. The directory is held under budget bytes by deleting the
+    least recently used entries; reading an entry refreshes its mtime, which
+    is what eviction orders by. The list of recently opened files is kept
+    alongside. Cache failures are reported and otherwise ignored, as the
+    file itself can always be decoded again.
+    """
+
+    def __init__(self, root=None, budget=DEFAULT_DISK_BUDGET):
+        self.root = root or default_cache_dir()
+        self.budget = budget
+        self.lock = threading.Lock()
+
+    def entry_path(self, key, kind):
+        digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return os.path.join(self.root, f"{digest}.{kind}")
+
+    def get(self, key, kind):
+        """The cached "thumb" or "mid" image for key, or None."""
+        path = self.entry_path(key, kind)
+        try:
+            image = read_raw(path)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as error:
+            print(f"[ERROR] Could not read cache entry {path}: {error}")
+            return None
+        return image
+
+    def thumbnail(self, key):
+        return self.get(key, "thumb")
+
+    def mid(self, key):
+        return self.get(key, "mid")
+
+    def store(self, key, image):
+        """Cache the mid-resolution decode and thumbnail of image, the decoded file for key."""
+        mid = downsample(image, MID_SIZE)
+        thumbnail = downsample(mid, THUMBNAIL_SIZE)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            for kind, entry in (("mid", mid), ("thumb", thumbnail)):
+                self.write(self.entry_path(key, kind), entry)
+            self.evict()
+        except OSError as error:
+            print(f"[ERROR] Could not write to the image cache: {error}")
+
+    def write(self, path, image):
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.root)
+        try:
+            with os.fdopen(handle, "wb") as file:
+                write_raw(file, image)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def evict(self):
+        """Delete the least recently used entries until the cache is within budget."""
+        with self.lock:
+            entries = []
+            for entry in os.scandir(self.root):
+                if entry.name.endswith((".mid", ".thumb")):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            used = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if used <= self.budget:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                used -= size
+
+    def recent(self):
+        """Recently opened paths, newest first."""
+        try:
+            with open(os.path.join(self.root, "recent.json")) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return []
+
+    def add_recent(self, path):
+        path = os.path.abspath(path)
+        paths = [path] + [other for other in self.recent() if other != path]
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, "recent.json"), "w") as file:
+                json.dump(paths[:RECENT_LIMIT], file)
+        except OSError as error:
+            print(f"[ERROR] Could not save the recent files list: {error}")
+
+class ImageCache:
+    """LRU of fully decoded images keyed by file_key(), bounded by pixel bytes.
+
+    Images are shared, not copied: callers must treat them as read-only,
+    as the editor already does with its original image.
+    """
+
+    def __init__(self, budget=DEFAULT_MEMORY_BUDGET):
+        self.budget = budget
+        self.used = 0
+        self.images = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        size = image_bytes(image)
+        with self.lock:
+            old = self.images.pop(key, None)
+            if old is not None:
+                self.used -= image_bytes(old)
+            if size > self.budget:
+                return
+            self.images[key] = image
+            self.used += size
+            while self.used > self.budget:
+                _, evicted = self.images.popitem(last=False)
+                self.used -= image_bytes(evicted)
+
+    def discard(self, key):
+        with self.lock:
+            image = self.images.pop(key, None)
+            if image is not None:
+                self.used -= image_bytes(image)
+
+    def clear(self):
+        with self.lock:
+            self.images.clear()
+            self.used = 0
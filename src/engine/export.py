@@ -0,0 +1,235 @@
+import os
+import zlib
+from PIL import Image
+from engine.stack import TRANSPOSE_METHODS
+from engine.tiles import TiledImage
+
+# Pillow format name for each file extension we write.
+FORMATS = {
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".png": "PNG",
+    ".bmp": "BMP",
+    ".webp": "WEBP",
+}
+
+# zlib strategies Pillow's PNG encoder accepts as compress_type.
+PNG_STRATEGIES = {
+    "default": zlib.Z_DEFAULT_STRATEGY,
+    "filtered": zlib.Z_FILTERED,
+    "huffman": zlib.Z_HUFFMAN_ONLY,
+    "rle": zlib.Z_RLE,
+    "fixed": zlib.Z_FIXED,
+}
+
+# Encoder settings per format; anything else a caller passes is ignored.
+DEFAULT_OPTIONS = {
+    "PNG": {"compress_level": 6, "strategy": "default"},
+    "JPEG": {"quality": 90, "progressive": False, "optimize": False},
+    "WEBP": {"quality": 90, "lossless": False, "method": 4},
+    "BMP": {},
+}
+
+# EXIF orientation value under which a viewer shows the stored pixels transposed by each method.
+EXIF_ORIENTATIONS = {
+    None: 1,
+    Image.FLIP_LEFT_RIGHT: 2,
+    Image.ROTATE_180: 3,
+    Image.FLIP_TOP_BOTTOM: 4,
+    Image.TRANSPOSE: 5,
+    Image.ROTATE_270: 6,
+    Image.TRANSVERSE: 7,
+    Image.ROTATE_90: 8,
+}
+ORIENTATION_TAG = 0x0112
+
+class ExportCancelled(Exception):
+    pass
+
+class ProgressFile:
+    """File wrapper that reports bytes written and aborts the encoder once cancelled() is true.
+
+    It deliberately has no fileno(), so Pillow writes through it in chunks
+    instead of handing the file descriptor to the encoder.
+    """
+
+    def __init__(self, file, cancelled=None, on_write=None):
+        self.file = file
+        self.cancelled = cancelled
+        self.on_write = on_write
+        self.written = 0
+
+    def write(self, data):
+        if self.cancelled is not None and self.cancelled():
+            raise ExportCancelled()
+        self.file.write(data)
+        self.written += len(data)
+        if self.on_write is not None:
+            self.on_write(self.written)
+        return len(data)
+
+    def tell(self):
+        return self.file.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def flush(self):
+        self.file.flush()
+
+def format_for_path(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported output format: {extension or path}")
+    return FORMATS[extension]
+
+def export_mode(image, format):
+    """Convert a rendered image to a mode the format can store."""
+    if image.mode == "RGBX" or (image.mode == "RGBA" and format in ("JPEG", "BMP")):
+        return image.convert("RGB")
+    return image
+
+def encoder_options(format, options=None):
+    """Pillow save() keyword arguments for format, from DEFAULT_OPTIONS overridden by options."""
+    settings = dict(DEFAULT_OPTIONS[format])
+    settings.update({key: value for key, value in (options or {}).items() if key in settings})
+    if format == "PNG":
+        settings["compress_type"] = PNG_STRATEGIES[settings.pop("strategy")]
+    return settings
+
+def render_full(stack, source):
+    """Full-resolution render of stack as an in-memory image for encoding."""
+    image = stack.render(source)
+    if isinstance(image, TiledImage):
+        result = image.to_image()
+        if image is not source:
+            image.close()
+        return result
+    return image
+
+def jpeg_segments(data):
+    """(marker, start, end) of each marker segment of a JPEG file before its scan data."""
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("Not a JPEG file")
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            raise ValueError(f"Corrupt JPEG marker at byte {offset}")
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        if marker == 0xDA:
+            return
+        end = offset + 2 + int.from_bytes(data[offset + 2:offset + 4], "big")
+        yield marker, offset, end
+        offset = end
+    raise ValueError("JPEG file has no scan data")
+
+def set_tiff_orientation(tiff, value):
+    """Overwrite the orientation entry of the first IFD in TIFF bytes; False if it has none."""
+    order = {b"II": "little", b"MM": "big"}.get(bytes(tiff[:2]))
+    if order is None:
+        raise ValueError("Corrupt EXIF header")
+    ifd = int.from_bytes(tiff[4:8], order)
+    for index in range(int.from_bytes(tiff[ifd:ifd + 2], order)):
+        entry = ifd + 2 + 12 * index
+        if int.from_bytes(tiff[entry:entry + 2], order) == ORIENTATION_TAG:
+            # SHORT, one value, stored inline.
+            tiff[entry + 2:entry + 12] = (3).to_bytes(2, order) + (1).to_bytes(4, order) + value.to_bytes(2, order) + b"\0\0"
+            return True
+    return False
+
+def app1_segment(exif):
+    if len(exif) + 2 > 0xFFFF:
+        raise ValueError("EXIF data too large for a JPEG segment")
+    return b"\xff\xe1" + (len(exif) + 2).to_bytes(2, "big") + exif
+
+def oriented_jpeg(source, orientation):
+    """Bytes of the JPEG file source with its EXIF orientation set to show it in orientation.
+
+    orientation is a (quarter turns, mirrored) pair from EditStack.orientation().
+    The compressed image data is copied unchanged, so nothing is re-encoded.
+    An existing orientation entry is overwritten in place; otherwise the
+    EXIF block is rebuilt, or added if the file has none.
+    """
+    with open(source, "rb") as file:
+        data = file.read()
+    value = EXIF_ORIENTATIONS[TRANSPOSE_METHODS[orientation]]
+    insert_at = 2
+    for marker, start, end in jpeg_segments(data):
+        if marker == 0xE0 and start == 2:
+            insert_at = end
+        if marker == 0xE1 and data[start + 4:start + 10] == b"Exif\0\0":
+            tiff = bytearray(data[start + 10:end])
+            if set_tiff_orientation(tiff, value):
+                return data[:start + 10] + bytes(tiff) + data[end:]
+            exif = Image.Exif()
+            exif.load(bytes(tiff))
+            exif[ORIENTATION_TAG] = value
+            return data[:start] + app1_segment(exif.tobytes()) + data[end:]
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = value
+    return data[:insert_at] + app1_segment(exif.tobytes()) + data[insert_at:]
+
+def save_image(image, path, options=None, cancelled=None, on_write=None):
+    """Write a rendered image, or a TiledImage assembled in memory, to path.
+
+    image may also be bytes already encoded in path's format, such as
+    oriented_jpeg() returns; they are written as they are and options are
+    ignored. The file is written to a temporary file next to path and
+    renamed over it only when complete, so a failed or cancelled export
+    never leaves a truncated file behind. cancelled and on_write are
+    passed to ProgressFile.
+    """
+    if isinstance(image, TiledImage):
+        image = image.to_image()
+    format = format_for_path(path)
+    if isinstance(image, Image.Image):
+        image = export_mode(image, format)
+
+    def write(file):
+        if isinstance(image, bytes):
+            output = ProgressFile(file, cancelled, on_write)
+            for offset in range(0, len(image), 2**20):
+                output.write(image[offset:offset + 2**20])
+        else:
+            image.save(ProgressFile(file, cancelled, on_write), format, **encoder_options(format, options))
+
+    write_atomically(path, write)
+
+def write_atomically(path, write, replace=None):
+    """Call write(file) on a temporary file next to path and rename it over path once it is synced to disk.
+
+    replace, if given, is called with the temporary file's path instead of renaming it.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    handle, temp_path = create_temporary(directory, name)
+    try:
+        with os.fdopen(handle, "wb") as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        if replace is None:
+            os.replace(temp_path, path)
+        else:
+            replace(temp_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+def create_temporary(directory, name):
+    """Open a new, uniquely named temporary file for name in directory; returns (descriptor, path).
+
+    Unlike mkstemp, which makes the file private, it is created with mode
+    0o666 so the kernel applies the umask as for any new file. Reading the
+    umask would mean setting it, which races with other threads.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        temp_path = os.path.join(directory, f".{name}.{os.urandom(4).hex()}.tmp")
+        try:
+            return os.open(temp_path, flags, 0o666), temp_path
+        except FileExistsError:
+            continue
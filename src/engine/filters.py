@@ -0,0 +1,121 @@
+import json
+import math
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageFilter
+
+# Convolution edits whose input is cached between renders by FilterCache.
+FILTER_OPS = ("sharpen", "blur")
+
+def gaussian_blur(image, radius):
+    """Gaussian blur approximated by three separable box passes, so cost does not grow with radius."""
+    if radius <= 0:
+        return image
+    return image.filter(ImageFilter.GaussianBlur(radius))
+
+def smooth(image):
+    """The 3x3 smoothed image sharpen extrapolates away from; alpha is left untouched."""
+    smoothed = image.filter(ImageFilter.SMOOTH)
+    if image.mode == "RGBA":
+        smoothed.putalpha(image.getchannel("A"))
+    return smoothed
+
+def sharpen(image, factor, smoothed=None):
+    """Unsharp mask with the SMOOTH kernel; the same result as ImageEnhance.Sharpness."""
+    if factor == 1.0:
+        return image
+    return Image.blend(smoothed or smooth(image), image, factor)
+
+class BlurPyramid:
+    """Blurred copies of one image at doubling radii, built on demand.
+
+    Each level is blurred from the previous one by the radius still
+    missing (Gaussian variances add), and a radius between two levels is
+    a blend of them weighted by variance. Moving a blur slider therefore
+    costs one blend per step once the levels around it exist.
+    """
+
+    def __init__(self, image, base_radius=0.5):
+        self.image = image
+        self.base_radius = base_radius
+        self.levels = [(0.0, image)]
+        self.lock = threading.Lock()
+
+    def level_radius(self, index):
+        return 0.0 if index == 0 else self.base_radius * 2 ** (index - 1)
+
+    def level(self, index):
+        with self.lock:
+            while len(self.levels) <= index:
+                previous_radius, previous = self.levels[-1]
+                radius = self.level_radius(len(self.levels))
+                self.levels.append((radius, gaussian_blur(previous, math.sqrt(radius ** 2 - previous_radius ** 2))))
+            return self.levels[index]
+
+    def blur(self, radius):
+        if radius <= 0:
+            return self.image
+        upper = 1
+        while self.level_radius(upper) < radius:
+            upper += 1
+        high_radius, high = self.level(upper)
+        low_radius, low = self.level(upper - 1)
+        if high_radius == radius:
+            return high
+        weight = (radius ** 2 - low_radius ** 2) / (high_radius ** 2 - low_radius ** 2)
+        return Image.blend(low, high, weight)
+
+class FilteredInput:
+    """The image a filter edit was applied to, with what its neighbouring values can reuse."""
+
+    def __init__(self, source, image):
+        self.source = source
+        self.image = image
+        self.pyramid = BlurPyramid(image)
+        self.smoothed = None
+
+    def apply(self, edit, scale=1.0):
+        if edit["op"] == "blur":
+            return self.pyramid.blur(edit["radius"] * scale)
+        if self.smoothed is None:
+            self.smoothed = smooth(self.image)
+        return sharpen(self.image, edit["factor"], self.smoothed)
+
+class FilterCache:
+    """Keeps the inputs of recent sharpen and blur edits, keyed by source and the edits before them.
+
+    While a filter slider moves, only its own parameter changes, so each
+    render finds the filter's input here instead of re-rendering the edits
+    before it and re-convolving from scratch.
+    """
+
+    def __init__(self, capacity=2):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(scale, prefix, edit):
+        return (edit["op"], scale, json.dumps(prefix, sort_keys=True))
+
+    def get(self, source, scale, prefix, edit):
+        key = self.key(scale, prefix, edit)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.source is not source:
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, source, scale, prefix, edit, image):
+        entry = FilteredInput(source, image)
+        with self.lock:
+            self.entries[self.key(scale, prefix, edit)] = entry
+            self.entries.move_to_end(self.key(scale, prefix, edit))
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
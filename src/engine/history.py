@@ -0,0 +1,174 @@
+import tempfile
+import threading
+import zlib
+from PIL import Image
+from engine.tiles import TILE_SIZE
+
+DEFAULT_HISTORY_BUDGET = 64 * 1024 * 1024
+# zlib level for tile diffs: text and strokes compress well even at the fastest setting.
+COMPRESS_LEVEL = 1
+
+class TilePatch:
+    """Compressed before/after pixels of one tile-sized region changed by an edit."""
+
+    def __init__(self, box, mode, before, after):
+        self.box = box
+        self.mode = mode
+        self.data = {"before": zlib.compress(before.tobytes(), COMPRESS_LEVEL),
+                     "after": zlib.compress(after.tobytes(), COMPRESS_LEVEL)}
+        # Set once the data has been spilled: side -> (offset, length) in the store file.
+        self.spilled = None
+
+    @property
+    def size(self):
+        return (self.box[2] - self.box[0], self.box[3] - self.box[1])
+
+    def nbytes(self):
+        return 0 if self.data is None else sum(len(data) for data in self.data.values())
+
+class HistoryEntry:
+    """One undoable step: the edit stack and strokes after it and, for destructive edits, its tile patches.
+
+    Strokes are not changed once finished, so the list shares them with
+    the stroke layer and costs no pixels.
+    """
+
+    def __init__(self, label, edits, patches=None, strokes=()):
+        self.label = label
+        self.edits = [dict(edit) for edit in edits]
+        self.patches = patches or []
+        self.strokes = tuple(strokes)
+
+    def nbytes(self):
+        return sum(patch.nbytes() for patch in self.patches)
+
+class History:
+    """Undo/redo list of edit stack states within a memory budget.
+
+    Re-renderable edits are stored as their parameters only. Edits that
+    cannot be cheaply re-rendered, such as text, also keep compressed
+    before/after copies of the tiles they touched, so undo and redo patch
+    the shown frame instead of rendering again. When patches exceed budget,
+    those of the oldest entries are moved to a temporary file and read back
+    on demand.
+    """
+
+    def __init__(self, budget=DEFAULT_HISTORY_BUDGET, tile_size=TILE_SIZE):
+        self.budget = budget
+        self.tile_size = tile_size
+        self.entries = []
+        # Index of the entry the current state corresponds to; -1 is the unedited image.
+        self.position = -1
+        self.used = 0
+        self.file = None
+        self.file_lock = threading.Lock()
+
+    def can_undo(self):
+        return self.position >= 0
+
+    def can_redo(self):
+        return self.position < len(self.entries) - 1
+
+    def current_edits(self):
+        return self.entries[self.position].edits if self.position >= 0 else []
+
+    def current_strokes(self):
+        return self.entries[self.position].strokes if self.position >= 0 else ()
+
+    def record(self, label, edits, before=None, after=None, box=None, strokes=None):
+        """Add a step after the current one, dropping anything that could be redone.
+
+        before and after are the frames around a destructive edit and box the
+        region it changed; both frames must have the same size and mode.
+        strokes defaults to those of the current step. Returns the new
+        entry, or None if edits and strokes match the current state.
+        """
+        strokes = self.current_strokes() if strokes is None else tuple(strokes)
+        if [dict(edit) for edit in edits] == self.current_edits() and strokes == self.current_strokes():
+            return None
+        for entry in self.entries[self.position + 1:]:
+            self.used -= entry.nbytes()
+        del self.entries[self.position + 1:]
+
+        patches = []
+        if box is not None and before is not None and after is not None:
+            patches = self.diff(before, after, box)
+        entry = HistoryEntry(label, edits, patches, strokes)
+        self.entries.append(entry)
+        self.position += 1
+        self.used += entry.nbytes()
+        self.spill()
+        return entry
+
+    def diff(self, before, after, box):
+        """Patches for every tile of box where before and after differ."""
+        width, height = after.size
+        left, top = max(int(box[0]), 0), max(int(box[1]), 0)
+        right, bottom = min(int(box[2]), width), min(int(box[3]), height)
+        size = self.tile_size
+        patches = []
+        for tile_top in range(top - top % size, bottom, size):
+            for tile_left in range(left - left % size, right, size):
+                region = (max(tile_left, left), max(tile_top, top),
+                          min(tile_left + size, right), min(tile_top + size, bottom))
+                if region[0] >= region[2] or region[1] >= region[3]:
+                    continue
+                old, new = before.crop(region), after.crop(region)
+                if old.tobytes() != new.tobytes():
+                    patches.append(TilePatch(region, after.mode, old, new))
+        return patches
+
+    def undo(self):
+        """Step back; returns (edits, patches, strokes) to restore, with patches holding "before" images."""
+        if not self.can_undo():
+            return None
+        entry = self.entries[self.position]
+        self.position -= 1
+        return (self.current_edits(), [(patch.box, self.load(patch, "before")) for patch in entry.patches],
+                self.current_strokes())
+
+    def redo(self):
+        """Step forward; returns (edits, patches, strokes) to restore, with patches holding "after" images."""
+        if not self.can_redo():
+            return None
+        self.position += 1
+        entry = self.entries[self.position]
+        return entry.edits, [(patch.box, self.load(patch, "after")) for patch in entry.patches], entry.strokes
+
+    def load(self, patch, side):
+        if patch.data is not None:
+            data = patch.data[side]
+        else:
+            offset, length = patch.spilled[side]
+            with self.file_lock:
+                self.file.seek(offset)
+                data = self.file.read(length)
+        return Image.frombytes(patch.mode, patch.size, zlib.decompress(data))
+
+    def spill(self):
+        """Move patch data of the oldest entries to disk until the rest fits in budget."""
+        for entry in self.entries:
+            if self.used <= self.budget:
+                return
+            for patch in entry.patches:
+                if patch.data is None:
+                    continue
+                if self.file is None:
+                    self.file = tempfile.TemporaryFile()
+                spilled = {}
+                with self.file_lock:
+                    self.file.seek(0, 2)
+                    for side, data in patch.data.items():
+                        spilled[side] = (self.file.tell(), len(data))
+                        self.file.write(data)
+                self.used -= patch.nbytes()
+                patch.spilled = spilled
+                patch.data = None
+
+    def clear(self):
+        self.entries = []
+        self.position = -1
+        self.used = 0
+        if self.file is not None:
+            self.file.close()
+            self.file = None
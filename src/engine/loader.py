@@ -0,0 +1,53 @@
+import io
+from PIL import ExifTags, Image
+
+# Tags in EXIF IFD1 that locate the embedded JPEG thumbnail.
+THUMBNAIL_OFFSET = 0x0201
+THUMBNAIL_LENGTH = 0x0202
+# Embedded previews smaller than this on their longest side are not worth showing.
+MIN_PREVIEW_SIZE = 120
+
+def exif_thumbnail(image):
+    """The JPEG thumbnail embedded in image's EXIF data, decoded, or None."""
+    data = image.info.get("exif")
+    if not data:
+        return None
+    try:
+        ifd1 = image.getexif().get_ifd(ExifTags.IFD.IFD1)
+    except Exception:
+        return None
+    offset, length = ifd1.get(THUMBNAIL_OFFSET), ifd1.get(THUMBNAIL_LENGTH)
+    if not offset or not length:
+        return None
+    # Offsets count from the TIFF header, which follows the "Exif\0\0" marker.
+    start = offset + (6 if data.startswith(b"Exif\x00\x00") else 0)
+    try:
+        thumbnail = Image.open(io.BytesIO(data[start:start + length]))
+        thumbnail.load()
+    except Exception:
+        return None
+    if max(thumbnail.size) < MIN_PREVIEW_SIZE:
+        return None
+    return thumbnail
+
+def draft(path, size):
+    """Decode a JPEG at the smallest DCT scale (1/2 to 1/8) still covering size, or None for other formats."""
+    image = Image.open(path)
+    if image.format != "JPEG" or image.width <= size[0] or image.height <= size[1]:
+        image.close()
+        return None
+    image.draft(image.mode, size)
+    image.load()
+    return image
+
+def probe(path):
+    """Read path's header and any embedded preview; returns (size, preview or None) in milliseconds."""
+    with Image.open(path) as image:
+        preview = exif_thumbnail(image) if image.format == "JPEG" else None
+        return image.size, preview
+
+def decode(path):
+    """Fully decode path into memory."""
+    image = Image.open(path)
+    image.load()
+    return image
@@ -0,0 +1,119 @@
+LUMA_WEIGHTS = (0.299, 0.587, 0.114)
+IDENTITY = list(range(256))
+
+# Ops that map each channel through the same curve, and ops that mix channels.
+CURVE_OPS = ("brightness", "contrast", "levels")
+MATRIX_OPS = ("saturation", "grayscale")
+
+class PointPipeline:
+    """Brightness, contrast, levels, saturation and grayscale compiled into one table and one matrix.
+
+    Brightness, contrast and levels are composed into a single 256-entry lookup table
+    shared by the colour channels, so any number of them costs one
+    Image.point pass. Saturation and grayscale blend each channel with the
+    luma and are composed into one 3x3 colour matrix. Because that blend
+    preserves luma and commutes with the per-channel curves, the matrix is
+    applied after the table; only clipping at intermediate steps can differ
+    from running the ops one by one.
+
+    The mean luminance used as the contrast pivot is taken from the input
+    histogram pushed through the table built so far, matching
+    ImageEnhance.Contrast without an extra pass over the pixels.
+    """
+
+    def __init__(self, edits, histogram=None):
+        self.edits = [edit for edit in edits if not is_identity(edit)]
+        self.histogram = histogram
+        self.compiled = None
+
+    def needs_histogram(self):
+        return any(edit["op"] == "contrast" for edit in self.edits)
+
+    def compile(self, image=None):
+        """Return (table, saturation) for the pipeline; either is None when not needed.
+
+        The result is cached, so a pipeline given the histogram of a whole
+        image can be applied tile by tile with the same table.
+        """
+        if self.compiled is not None:
+            return self.compiled
+        lut = IDENTITY
+        saturation = 1.0
+        for edit in self.edits:
+            op = edit["op"]
+            if op == "brightness":
+                factor = edit["factor"]
+                lut = [clamp(value * factor) for value in lut]
+            elif op == "contrast":
+                if self.histogram is None:
+                    self.histogram = image.histogram()
+                factor = edit["factor"]
+                pivot = int(luma_mean(self.histogram, lut) + 0.5)
+                lut = [clamp(pivot + (value - pivot) * factor) for value in lut]
+            elif op == "levels":
+                black, white = edit["black"], edit["white"]
+                # A white point at or below black, as a hand-written recipe may have, thresholds at black.
+                lut = [clamp((value - black) * 255 / max(white - black, 1)) for value in lut]
+            elif op == "saturation":
+                saturation *= edit["factor"]
+            elif op == "grayscale":
+                saturation = 0.0
+        self.compiled = (None if lut is IDENTITY else lut), (None if saturation == 1.0 else saturation)
+        return self.compiled
+
+    def apply(self, image):
+        """Apply the pipeline to an RGB, RGBX or RGBA image in at most two passes."""
+        lut, saturation = self.compile(image)
+        if lut is not None:
+            table = lut * 3
+            if image.mode in ("RGBA", "RGBX"):
+                table += IDENTITY
+            image = image.point(table)
+        if saturation is not None:
+            image = apply_matrix(image, saturation_matrix(saturation))
+        return image
+
+def is_identity(edit):
+    if edit["op"] == "grayscale":
+        return False
+    if edit["op"] == "levels":
+        return edit["black"] == 0 and edit["white"] == 255
+    return edit["factor"] == 1.0
+
+def clamp(value):
+    return min(255, max(0, int(value + 0.5)))
+
+def luma_mean(histogram, lut):
+    """Mean luminance of an RGB(A) histogram after mapping every channel through lut."""
+    total = sum(histogram[:256])
+    if not total:
+        return 0.0
+    mean = 0.0
+    for channel, weight in enumerate(LUMA_WEIGHTS):
+        counts = histogram[channel * 256:(channel + 1) * 256]
+        mean += weight * sum(lut[value] * count for value, count in enumerate(counts)) / total
+    return mean
+
+def saturation_matrix(saturation):
+    """out = luma + saturation * (channel - luma), i.e. ImageEnhance.Color as a matrix."""
+    matrix = []
+    for row in range(3):
+        for column in range(3):
+            weight = LUMA_WEIGHTS[column] * (1.0 - saturation)
+            if row == column:
+                weight += saturation
+            matrix.append(weight)
+        matrix.append(0.0)
+    return tuple(matrix)
+
+def apply_matrix(image, matrix):
+    if image.mode == "RGBA":
+        alpha = image.getchannel("A")
+        # PIL only applies matrices to RGB sources.
+        image = image.convert("RGB").convert("RGB", matrix)
+        image.putalpha(alpha)
+        return image
+    if image.mode == "RGBX":
+        # PIL only applies matrices to RGB sources.
+        image = image.convert("RGB")
+    return image.convert("RGB", matrix)
@@ -0,0 +1,26 @@
+from PIL import ImageStat
+from engine.tiles import TiledImage
+
+# Side of the neighbourhood a picked colour is averaged over, in image pixels.
+DEFAULT_SAMPLE_SIZE = 3
+SAMPLE_SIZES = (1, 3, 5, 9, 15)
+
+def read_region(image, box):
+    """Pixels of box as a small in-memory image; parts outside image are black.
+
+    A PIL image is cropped and a TiledImage reads only the tiles under box,
+    so nothing but the region itself is copied.
+    """
+    return image.read(box) if isinstance(image, TiledImage) else image.crop(box)
+
+def average_color(image, x, y, size=DEFAULT_SAMPLE_SIZE):
+    """Mean (r, g, b) of the size x size pixels centred on (x, y), clipped to image; None outside it."""
+    width, height = image.size
+    if not (0 <= x < width and 0 <= y < height):
+        return None
+    half = size // 2
+    box = (max(x - half, 0), max(y - half, 0), min(x - half + size, width), min(y - half + size, height))
+    region = read_region(image, box)
+    if region.mode not in ("RGB", "RGBX", "RGBA"):
+        region = region.convert("RGB")
+    return tuple(round(value) for value in ImageStat.Stat(region).mean[:3])
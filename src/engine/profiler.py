@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_CAPACITY = 8192
+
+class Profiler:
+    """Records timing spans from any thread into a fixed-size ring buffer.
+
+    Spans are (name, category, start, duration, thread id, thread name)
+    tuples in perf_counter seconds. The newest capacity spans are kept and
+    can be summarised per stage or exported in Chrome's trace event format,
+    which chrome://tracing and Perfetto open directly.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.spans = deque(maxlen=capacity)
+        self.enabled = True
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, category="editor"):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, category, start, time.perf_counter() - start)
+
+    def record(self, name, category, start, duration):
+        thread = threading.current_thread()
+        with self.lock:
+            self.spans.append((name, category, start, duration, thread.ident, thread.name))
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.spans)
+
+    def clear(self):
+        with self.lock:
+            self.spans.clear()
+
+    def breakdown(self, window=1.0):
+        """{name: (last duration, mean duration, count)} for spans that ended in the last window seconds."""
+        since = time.perf_counter() - window
+        stages = {}
+        for name, _, start, duration, _, _ in self.snapshot():
+            if start + duration < since:
+                continue
+            last, total, count = stages.get(name, (0.0, 0.0, 0))
+            stages[name] = (duration, total + duration, count + 1)
+        return {name: (last, total / count, count) for name, (last, total, count) in stages.items()}
+
+    def last(self, name):
+        """Duration of the newest span called name, or None."""
+        for span_name, _, _, duration, _, _ in reversed(self.snapshot()):
+            if span_name == name:
+                return duration
+        return None
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for name, category, start, duration, thread_id, thread_name in self.snapshot():
+            threads[thread_id] = thread_name
+            events.append({"name": name, "cat": category, "ph": "X", "pid": pid, "tid": thread_id,
+                           "ts": (start - self.origin) * 1e6, "dur": duration * 1e6})
+        for thread_id, thread_name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                           "args": {"name": thread_name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_chrome_trace(), file)
+
+# Shared by the GUI, the render workers and the engine.
+profiler = Profiler()
+span = profiler.span
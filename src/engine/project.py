@@ -0,0 +1,216 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from PIL import Image
+from engine.cache import downsample
+from engine.export import ExportCancelled, ProgressFile, write_atomically
+from engine.stack import normalize_mode
+from engine.strokes import Stroke
+from engine.tiles import TILE_SIZE, TiledImage, display_image
+
+PROJECT_EXTENSION = ".redy"
+VERSION = 1
+# A project is MAGIC, then one zlib blob per source tile and one for the
+# preview, then a JSON manifest indexing them, then a trailer holding the
+# manifest's offset and length. Every blob can be read on its own from a
+# memory map, and the manifest is written last so tiles can be streamed out
+# without knowing their compressed sizes up front.
+MAGIC = b"REDYPRJ1"
+TRAILER = struct.Struct("<QQ8s")
+TRAILER_MAGIC = b"REDYEND1"
+# Longest side of the rendered preview shown while a project opens.
+PREVIEW_SIZE = 2048
+# Fast zlib level: tiles are written once per save and read on every open.
+COMPRESSION_LEVEL = 1
+
+def is_project(path):
+    return path.lower().endswith(PROJECT_EXTENSION)
+
+def map_file(path):
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def stroke_data(stroke):
+    return {"color": list(stroke.color), "width": stroke.width, "tolerance": stroke.tolerance,
+            "points": list(stroke.points)}
+
+def stroke_from_data(data):
+    stroke = Stroke(data["color"], data["width"], data["tolerance"])
+    stroke.points.extend(data["points"])
+    return stroke
+
+class MappedTiledImage(TiledImage):
+    """Read-only TiledImage over the compressed tiles of a memory-mapped project.
+
+    Opening one reads nothing but the manifest; each tile is decompressed
+    from the map on first use into the shared TileCache, so memory follows
+    the tiles actually drawn or rendered rather than the image size. It maps
+    path itself and unmaps it on close().
+    """
+
+    def __init__(self, path, manifest, cache=None):
+        super().__init__(manifest["size"], manifest["mode"], manifest["tile_size"], cache)
+        self.path = path
+        self.mapping = map_file(path)
+        self.index = manifest["tiles"]
+        # Tiles are read on render and loader threads while a save may replace the file.
+        self.lock = threading.Lock()
+
+    def compressed_tile(self, column, row):
+        with self.lock:
+            offset, length = self.index[row * self.columns + column]
+            return self.mapping[offset:offset + length]
+
+    def get_tile(self, column, row):
+        key = (self.key, column, row)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
+        left, top, right, bottom = self.tile_box(column, row)
+        tile = Image.frombytes(self.mode, (right - left, bottom - top), zlib.decompress(self.compressed_tile(column, row)))
+        self.cache.put(key, tile)
+        return tile
+
+    def put_tile(self, column, row, tile):
+        raise TypeError("Tiles of a project file are read-only")
+
+    def replace_file(self, temp_path, index):
+        """Rename temp_path over the mapped file and map the new one, whose tiles are at index.
+
+        Windows refuses to replace a file that is mapped, so the map is
+        closed first; tiles are not read in between.
+        """
+        with self.lock:
+            self.mapping.close()
+            try:
+                os.replace(temp_path, self.path)
+                self.index = index
+            finally:
+                self.mapping = map_file(self.path)
+
+    def close(self):
+        self.cache.discard(self.key)
+        with self.lock:
+            if self.mapping is not None:
+                self.mapping.close()
+                self.mapping = None
+
+class ProjectFile:
+    """An opened project: its manifest and a read-only memory map of the file, unmapped by close()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mapping = map_file(path)
+        try:
+            self.manifest = self.read_manifest()
+        except BaseException:
+            self.close()
+            raise
+
+    def read_manifest(self):
+        path = self.path
+        if len(self.mapping) < len(MAGIC) + TRAILER.size or self.mapping[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a project file: {path}")
+        offset, length, magic = TRAILER.unpack(self.mapping[-TRAILER.size:])
+        if magic != TRAILER_MAGIC:
+            raise ValueError(f"Project file is truncated: {path}")
+        manifest = json.loads(self.mapping[offset:offset + length])
+        if manifest.get("version") != VERSION:
+            raise ValueError(f"Unsupported project version {manifest.get('version')}: {path}")
+        return manifest
+
+    @property
+    def size(self):
+        return tuple(self.manifest["size"])
+
+    @property
+    def edits(self):
+        return self.manifest["edits"]
+
+    def strokes(self):
+        return [stroke_from_data(data) for data in self.manifest["strokes"]]
+
+    def source(self, cache=None):
+        """The source pixels as a MappedTiledImage with its own map, which stays open after close()."""
+        return MappedTiledImage(self.path, self.manifest, cache)
+
+    def preview(self):
+        """The rendered preview saved with the project, decompressed into memory."""
+        preview = self.manifest["preview"]
+        offset, length = preview["blob"]
+        return Image.frombytes(preview["mode"], tuple(preview["size"]), zlib.decompress(self.mapping[offset:offset + length]))
+
+    def close(self):
+        self.mapping.close()
+
+def project_preview(stack, source, frame=None):
+    """Small render of stack on source for a project; frame, if given, is that render at full resolution."""
+    if frame is not None:
+        return downsample(display_image(frame, PREVIEW_SIZE), PREVIEW_SIZE)
+    small = downsample(display_image(source, PREVIEW_SIZE), PREVIEW_SIZE)
+    return stack.render(small, small.width / source.width)
+
+def save_project(project, path, options=None, cancelled=None, on_write=None):
+    """Write project, a dict with source, edits, strokes and preview, to path.
+
+    Has save_image's signature so the exporter can run it. Tiles of a
+    source that was itself opened from a project with the same layout are
+    copied compressed as they are; any other source is compressed tile by
+    tile, so at most one tile is held uncompressed at a time.
+    """
+    source = project["source"]
+    if isinstance(source, Image.Image):
+        source = normalize_mode(source)
+        tile_size = TILE_SIZE
+    else:
+        tile_size = source.tile_size
+    width, height = source.size
+    preview = project["preview"]
+    tiles = []
+
+    def write(file):
+        output = ProgressFile(file, cancelled, on_write)
+        output.write(MAGIC)
+        offset = len(MAGIC)
+
+        def add(blob):
+            nonlocal offset
+            output.write(blob)
+            offset += len(blob)
+            return [offset - len(blob), len(blob)]
+
+        for top in range(0, height, tile_size):
+            for left in range(0, width, tile_size):
+                if cancelled is not None and cancelled():
+                    raise ExportCancelled()
+                column, row = left // tile_size, top // tile_size
+                if isinstance(source, MappedTiledImage):
+                    tiles.append(add(bytes(source.compressed_tile(column, row))))
+                    continue
+                box = (left, top, min(left + tile_size, width), min(top + tile_size, height))
+                tile = source.crop(box) if isinstance(source, Image.Image) else source.get_tile(column, row)
+                tiles.append(add(zlib.compress(tile.tobytes(), COMPRESSION_LEVEL)))
+        manifest = {
+            "version": VERSION,
+            "size": [width, height],
+            "mode": source.mode,
+            "tile_size": tile_size,
+            "tiles": tiles,
+            "preview": {"size": list(preview.size), "mode": preview.mode,
+                        "blob": add(zlib.compress(preview.tobytes(), COMPRESSION_LEVEL))},
+            "edits": project["edits"],
+            "strokes": [stroke_data(stroke) for stroke in project["strokes"]],
+        }
+        data = json.dumps(manifest).encode()
+        manifest_offset = offset
+        output.write(data)
+        output.write(TRAILER.pack(manifest_offset, len(data), TRAILER_MAGIC))
+
+    replace = None
+    if isinstance(source, MappedTiledImage) and os.path.exists(path) and os.path.samefile(path, source.path):
+        # Saved over the file the source is mapped from; its tiles keep being read from the new one.
+        replace = lambda temp_path: source.replace_file(temp_path, tiles)
+    write_atomically(path, write, replace)
@@ -0,0 +1,37 @@
+from PIL import Image
+
+class PreviewProxy:
+    """Caches a viewport-sized downsample of an image for interactive previews."""
+
+    def __init__(self):
+        self.source = None
+        self.max_size = None
+        self.image = None
+
+    def get(self, source, max_size):
+        """Return the downsample of source that fits max_size, rebuilding it only when needed."""
+        if source is self.source and max_size == self.max_size:
+            return self.image
+
+        scale = self.scale(source, max_size)
+        if scale >= 1.0:
+            preview = source
+        else:
+            size = (max(int(source.width * scale), 1), max(int(source.height * scale), 1))
+            preview = source.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+        self.source = source
+        self.max_size = max_size
+        self.image = preview
+        return preview
+
+    @staticmethod
+    def scale(source, max_size):
+        """Size of the proxy for source relative to source, capped at 1."""
+        max_width, max_height = max(max_size[0], 1), max(max_size[1], 1)
+        return min(max_width / source.width, max_height / source.height, 1.0)
+
+    def clear(self):
+        self.source = None
+        self.max_size = None
+        self.image = None
@@ -0,0 +1,110 @@
+import math
+import threading
+from engine.stack import normalize_mode
+from engine.tiles import TiledImage, TILE_SIZE, TILED_PIXELS
+
+# Levels stop halving once their longest side is at most this many pixels.
+MIN_LEVEL_SIZE = 256
+REDUCE_MODES = ("L", "RGB", "RGBA", "RGBX")
+
+class ImagePyramid:
+    """Successively halved copies of an image for drawing it zoomed out.
+
+    Level 0 is the image itself and level n is 1/2**n of its size. Levels
+    are produced one at a time by build(), normally on a worker thread, and
+    become visible through level() as soon as each is finished. Levels above
+    TILED_PIXELS stay TiledImages so a gigapixel pyramid is built within the
+    tile cache budget.
+    """
+
+    def __init__(self, image, tile_size=TILE_SIZE, min_size=MIN_LEVEL_SIZE):
+        self.levels = [image]
+        self.tile_size = tile_size
+        self.min_size = min_size
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+        self.level_count = 1
+        width, height = image.size
+        while max(width, height) > min_size:
+            width, height = math.ceil(width / 2), math.ceil(height / 2)
+            self.level_count += 1
+
+    @property
+    def size(self):
+        return self.levels[0].size
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def build(self):
+        """Produce the missing levels, yielding the index of each one as it is ready."""
+        image = self.levels[-1]
+        while len(self.levels) < self.level_count and not self.cancelled:
+            image = reduce_level(image)
+            with self.lock:
+                if self.cancelled:
+                    close_level(image)
+                    return
+                self.levels.append(image)
+            yield len(self.levels) - 1
+
+    def level(self, index):
+        """The image at index, or None while it is still being built."""
+        with self.lock:
+            return self.levels[index] if index < len(self.levels) else None
+
+    def level_for_scale(self, scale):
+        """Index of the smallest level still at least as detailed as scale display pixels per image pixel."""
+        if scale >= 1.0:
+            return 0
+        return min(int(math.log2(1.0 / scale)), self.level_count - 1)
+
+    def visible_tiles(self, index, box):
+        """Yield the tile boxes of level index that intersect box, given in that level's pixels."""
+        width, height = self.level(index).size
+        size = self.tile_size
+        left, top = max(int(box[0]) // size, 0), max(int(box[1]) // size, 0)
+        right = min(math.ceil(box[2] / size), math.ceil(width / size))
+        bottom = min(math.ceil(box[3] / size), math.ceil(height / size))
+        for row in range(top, bottom):
+            for column in range(left, right):
+                yield column, row, (column * size, row * size,
+                                    min((column + 1) * size, width), min((row + 1) * size, height))
+
+    def tile(self, index, box):
+        """Pixels of box in level index as an in-memory PIL image."""
+        image = self.level(index)
+        if isinstance(image, TiledImage):
+            return image.read(box)
+        return image.crop(box)
+
+    def close(self):
+        """Stop building and release the levels this pyramid created; level 0 belongs to the caller."""
+        with self.lock:
+            self.cancelled = True
+            levels, self.levels = self.levels[1:], self.levels[:1]
+        for image in levels:
+            close_level(image)
+
+def reduce_level(image):
+    """Half-size copy of image; tiled levels become in-memory once they fit."""
+    if isinstance(image, TiledImage):
+        reduced = image.reduce(2)
+        if reduced.width * reduced.height > TILED_PIXELS:
+            return reduced
+        small = reduced.to_image()
+        reduced.close()
+        return small
+    if image.mode not in REDUCE_MODES:
+        image = normalize_mode(image)
+    return image.reduce(2)
+
+def close_level(image):
+    if isinstance(image, TiledImage):
+        image.close()
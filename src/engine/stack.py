@@ -0,0 +1,351 @@
+import json
+import math
+from PIL import Image
+from engine.filters import FILTER_OPS, gaussian_blur, sharpen
+from engine.lut import PointPipeline
+from engine.text import draw_text, text_bounds
+from engine.tiles import TiledImage
+
+# Slider adjustments appear at most once in the stack and are updated in place.
+ADJUSTMENTS = ("contrast", "brightness", "saturation", "sharpen", "blur", "levels")
+# Per-pixel operations that are fused into a single transform when adjacent.
+POINT_OPS = ("contrast", "brightness", "saturation", "grayscale", "levels")
+# Edits that move pixels, so a box in the output no longer matches the same box in their input.
+GEOMETRY_OPS = ("flip", "rotate", "crop")
+# Transpose method of each orientation, as (counter-clockwise quarter turns, mirrored).
+# A mirrored orientation flips left to right first, then turns.
+TRANSPOSE_METHODS = {
+    (0, False): None,
+    (1, False): Image.ROTATE_90,
+    (2, False): Image.ROTATE_180,
+    (3, False): Image.ROTATE_270,
+    (0, True): Image.FLIP_LEFT_RIGHT,
+    (1, True): Image.TRANSPOSE,
+    (2, True): Image.FLIP_TOP_BOTTOM,
+    (3, True): Image.TRANSVERSE,
+}
+
+class EditStack:
+    """Ordered, serializable list of edits applied non-destructively to a source image.
+
+    Each edit is a plain dict such as {"op": "contrast", "factor": 1.2}, so the
+    stack round-trips through JSON unchanged.
+    """
+
+    def __init__(self, edits=None):
+        self.edits = [dict(edit) for edit in edits or []]
+
+    def __len__(self):
+        return len(self.edits)
+
+    def __iter__(self):
+        return iter(self.edits)
+
+    def copy(self):
+        return EditStack(self.edits)
+
+    def set(self, op, **params):
+        """Update the existing op in place, or append it if it is not in the stack yet."""
+        for edit in self.edits:
+            if edit["op"] == op:
+                edit.update(params)
+                return edit
+        return self.push(op, **params)
+
+    def push(self, op, **params):
+        edit = {"op": op, **params}
+        self.edits.append(edit)
+        return edit
+
+    def get(self, op):
+        for edit in self.edits:
+            if edit["op"] == op:
+                return edit
+        return None
+
+    def clear(self):
+        self.edits = []
+
+    def to_json(self):
+        return json.dumps(self.edits)
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(json.loads(data))
+
+    def render(self, source, scale=1.0, cache=None):
+        """Render the stack on source.
+
+        scale is the size of source relative to the image the edits were
+        recorded against, so a preview proxy can be rendered with the same
+        stack. Runs of adjacent point operations are fused by PointPipeline
+        and runs of flips and quarter turns by a single transpose.
+        A TiledImage source is rendered tile by tile into a new TiledImage.
+        With a FilterCache, rendering resumes from the cached input of the
+        last sharpen or blur edit when the edits before it are unchanged.
+        """
+        if isinstance(source, TiledImage):
+            return self.render_tiled(source)
+
+        runs = list(self.runs())
+        image = None
+        start = 0
+        if cache is not None:
+            for index in range(len(runs) - 1, -1, -1):
+                if runs[index][0]["op"] in FILTER_OPS:
+                    entry = cache.get(source, scale, flatten(runs[:index]), runs[index][0])
+                    if entry is not None:
+                        image = entry.apply(runs[index][0], scale)
+                        start = index + 1
+                    break
+        if image is None:
+            image = normalize_mode(source)
+        # Whether image is an intermediate no one else holds, so text can be drawn into it in place.
+        owned = image is not source and start == 0
+
+        for index in range(start, len(runs)):
+            run = runs[index]
+            previous = image
+            if run[0]["op"] in POINT_OPS:
+                image = PointPipeline(run).apply(image)
+            elif is_orientation(run[0]):
+                image = transpose(image, orientation(run))
+            elif cache is not None and run[0]["op"] in FILTER_OPS:
+                image = cache.put(source, scale, flatten(runs[:index]), run[0], image).apply(run[0], scale)
+                owned = False
+                continue
+            elif run[0]["op"] == "text" and owned:
+                if not is_identity(run[0]):
+                    draw_text(image, run[0], scale)
+                continue
+            else:
+                image = apply_edit(image, run[0], scale)
+            owned = owned or image is not previous
+        return image
+
+    def render_tiled(self, source):
+        """Render on a TiledImage, keeping only one tile (plus halo) of each step in memory."""
+        image = source
+        for run in self.runs():
+            if run[0]["op"] in POINT_OPS:
+                pipeline = PointPipeline(run)
+                if pipeline.needs_histogram():
+                    pipeline.histogram = image.histogram()
+                result = image.map(lambda tile, box: pipeline.apply(tile))
+            elif is_orientation(run[0]):
+                result = transpose(image, orientation(run))
+            else:
+                result = apply_tiled_edit(image, run[0])
+            if result is not image and image is not source:
+                image.close()
+            image = result
+        return image
+
+    def region_halo(self):
+        """Pixels of context render_region needs around a box, or None if the stack can only be rendered whole.
+
+        That is the case when an edit moves pixels or depends on statistics
+        of the whole image, as contrast does.
+        """
+        halo = 0
+        for edit in self.edits:
+            if is_identity(edit) or edit["op"] == "text":
+                continue
+            if edit["op"] in FILTER_OPS:
+                halo += filter_halo(edit)
+            elif edit["op"] not in POINT_OPS or PointPipeline([edit]).needs_histogram():
+                return None
+        return halo
+
+    def render_region(self, source, box):
+        """Render box of the full-resolution result from the matching part of source.
+
+        Only valid when region_halo() is not None. Filters read the region
+        with that many extra pixels around it, so the result matches the
+        same box of a whole render.
+        """
+        halo = self.region_halo()
+        left, top, right, bottom = box
+        outer = (max(left - halo, 0), max(top - halo, 0),
+                 min(right + halo, source.width), min(bottom + halo, source.height))
+        image = normalize_mode(source.read(outer) if isinstance(source, TiledImage) else source.crop(outer))
+        for run in self.runs():
+            if run[0]["op"] in POINT_OPS:
+                image = PointPipeline(run).apply(image)
+            elif run[0]["op"] == "text":
+                if not is_identity(run[0]):
+                    draw_text(image, run[0], origin=outer[:2])
+            else:
+                image = apply_edit(image, run[0])
+        return image.crop((left - outer[0], top - outer[1], right - outer[0], bottom - outer[1]))
+
+    def affected_box(self, index, box):
+        """Box of the output that can change when edit index changes only within box, or None for all of it."""
+        left, top, right, bottom = box
+        for edit in self.edits[index + 1:]:
+            if is_identity(edit) or edit["op"] == "text":
+                continue
+            if edit["op"] in FILTER_OPS:
+                halo = filter_halo(edit)
+                left, top, right, bottom = left - halo, top - halo, right + halo, bottom + halo
+            elif edit["op"] in GEOMETRY_OPS or PointPipeline([edit]).needs_histogram():
+                return None
+        return (left, top, right, bottom)
+
+    def orientation(self):
+        """Composed orientation if every edit is a flip, a quarter turn or has no effect, else None."""
+        edits = [edit for edit in self.edits if not is_identity(edit)]
+        if not all(is_orientation(edit) for edit in edits):
+            return None
+        return orientation(edits)
+
+    def runs(self):
+        """Split the stack into runs of adjacent point operations, runs of
+        adjacent flips and quarter turns, and single other edits."""
+        run = []
+        for edit in self.edits:
+            kind = run_kind(edit)
+            if run and (kind is None or kind != run_kind(run[0])):
+                yield run
+                run = []
+            if kind is None:
+                yield [edit]
+            else:
+                run.append(edit)
+        if run:
+            yield run
+
+class RenderedTiles(TiledImage):
+    """Read-only TiledImage of stack rendered on a tiled source, one tile at a time as tiles are read.
+
+    Only for stacks whose region_halo() is not None. Each tile is rendered
+    with render_region when it is first read and kept in the shared
+    TileCache, so showing a large edited image renders the tiles drawn
+    instead of the whole source.
+    """
+
+    def __init__(self, stack, source):
+        # The mode the edits produce, e.g. L after grayscale, from a one-pixel render.
+        mode = stack.render_region(source, (0, 0, 1, 1)).mode
+        super().__init__(source.size, mode, source.tile_size, source.cache)
+        self.stack = stack.copy()
+        self.source = source
+
+    def get_tile(self, column, row):
+        key = (self.key, column, row)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
+        tile = self.stack.render_region(self.source, self.tile_box(column, row))
+        self.cache.put(key, tile)
+        return tile
+
+    def put_tile(self, column, row, tile):
+        raise TypeError("Tiles of a lazy render are read-only")
+
+def run_kind(edit):
+    if edit["op"] in POINT_OPS:
+        return "point"
+    if is_orientation(edit):
+        return "orientation"
+    return None
+
+def is_orientation(edit):
+    return edit["op"] == "flip" or (edit["op"] == "rotate" and edit["angle"] % 90 == 0)
+
+def orientation(edits):
+    """Compose flips and quarter turns, applied in order, into one (quarter turns, mirrored) pair."""
+    turns, mirrored = 0, False
+    for edit in edits:
+        if edit["op"] == "rotate":
+            turns = (turns + edit["angle"] // 90) % 4
+        elif edit["direction"] == "horizontal":
+            turns, mirrored = -turns % 4, not mirrored
+        else:
+            # A vertical flip is a horizontal one followed by a half turn.
+            turns, mirrored = (2 - turns) % 4, not mirrored
+    return turns, mirrored
+
+def transpose(image, orientation):
+    """image in the given orientation; a PIL image or TiledImage, returned as is for the identity."""
+    method = TRANSPOSE_METHODS[orientation]
+    return image if method is None else image.transpose(method)
+
+def flatten(runs):
+    return [edit for run in runs for edit in run]
+
+def normalize_mode(image):
+    """Convert to a working mode every edit understands: RGB, RGBX or RGBA."""
+    if image.mode in ("RGBX", "RGBA"):
+        return image
+    if image.mode in ("LA", "PA") or "transparency" in image.info:
+        mode = "RGBA"
+    else:
+        mode = "RGB"
+    return image if image.mode == mode else image.convert(mode)
+
+def is_identity(edit):
+    op = edit["op"]
+    if op == "text":
+        return not edit["text"]
+    if op in ("contrast", "brightness", "saturation", "sharpen"):
+        return edit["factor"] == 1.0
+    if op == "levels":
+        return edit["black"] == 0 and edit["white"] == 255
+    if op == "blur":
+        return edit["radius"] <= 0
+    return False
+
+def filter_halo(edit):
+    """Pixels of context a convolution edit needs around each tile."""
+    if edit["op"] == "blur":
+        return int(math.ceil(edit["radius"] * 3)) + 2
+    return 2
+
+def apply_tiled_edit(image, edit):
+    """Apply a single non-point edit to a TiledImage."""
+    op = edit["op"]
+    if is_identity(edit):
+        return image
+    if op in ("sharpen", "blur"):
+        return image.map(lambda tile, box: apply_edit(tile, edit), halo=filter_halo(edit))
+    if is_orientation(edit):
+        return transpose(image, orientation([edit]))
+    if op == "crop":
+        return image.crop(edit["box"])
+    if op == "text":
+        def draw_tile(tile, box):
+            tile = tile.copy()
+            draw_text(tile, edit, origin=box[:2])
+            return tile
+
+        return image.map(draw_tile, boxes=[text_bounds(edit)])
+    return TiledImage.from_image(apply_edit(image.to_image(), edit), image.tile_size, image.cache)
+
+def edit_bounds(edit):
+    """Box of the output an edit appended to the stack can change, or None if it may change all of it."""
+    if edit["op"] != "text":
+        return None
+    return text_bounds(edit)
+
+def apply_edit(image, edit, scale=1.0):
+    """Apply a single non-point edit. Pixel-sized parameters are multiplied by scale."""
+    op = edit["op"]
+    if is_identity(edit):
+        return image
+    if op == "sharpen":
+        return sharpen(image, edit["factor"])
+    if op == "blur":
+        return gaussian_blur(image, edit["radius"] * scale)
+    if is_orientation(edit):
+        return transpose(image, orientation([edit]))
+    if op == "rotate":
+        return image.rotate(edit["angle"], expand=True)
+    if op == "crop":
+        left, top, right, bottom = (int(round(value * scale)) for value in edit["box"])
+        return image.crop((left, top, right, bottom))
+    if op == "text":
+        image = image.copy()
+        draw_text(image, edit, scale)
+        return image
+    raise ValueError(f"Unknown edit: {op}")
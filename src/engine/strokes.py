@@ -0,0 +1,82 @@
+import math
+from array import array
+
+class Stroke:
+    """One freehand stroke: RGBA colour, width and points in scene coordinates.
+
+    Points live in a flat array of doubles (x0, y0, x1, y1, ...). They are
+    simplified as they are captured: a new point that keeps every point
+    dropped since the previous vertex within tolerance of the segment just
+    replaces the last vertex, so a straight or gently curving drag stores
+    a handful of vertices instead of one per mouse event. Each dropped
+    point narrows a cone of directions from the segment's start, so the
+    check costs the same however many points the segment has absorbed.
+    """
+
+    def __init__(self, color, width, tolerance=0.5):
+        self.color = tuple(color)
+        self.width = width
+        self.tolerance = tolerance
+        self.points = array("d")
+        # Cone the last segment must stay in for the points merged into it, or None while there are none.
+        self.cone = None
+
+    def __len__(self):
+        return len(self.points) // 2
+
+    def point(self, index):
+        return self.points[2 * index], self.points[2 * index + 1]
+
+    def add(self, x, y):
+        """Capture a point; True if it was appended, False if it moved the last vertex, None if dropped."""
+        count = len(self)
+        if count and math.hypot(x - self.points[-2], y - self.points[-1]) < self.tolerance:
+            return None
+        if count >= 2:
+            anchor = self.point(count - 2)
+            cone = narrow_cone(self.cone, anchor, self.point(count - 1), self.tolerance)
+            if in_cone(cone, anchor, (x, y)):
+                self.cone = cone
+                self.points[-2:] = array("d", (x, y))
+                return False
+        self.cone = None
+        self.points.extend((x, y))
+        return True
+
+    def bounds(self):
+        """(left, top, right, bottom) covered by the stroke, including its width."""
+        xs, ys = self.points[0::2], self.points[1::2]
+        margin = self.width / 2 + 1
+        return (min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin)
+
+def narrow_cone(cone, anchor, point, tolerance):
+    """cone limited further to segments from anchor that pass within tolerance of point.
+
+    A cone is (base angle, lowest and highest angle relative to base, reach).
+    A segment from anchor at least reach long whose direction lies within
+    the angles passes within tolerance of every point that narrowed it, as
+    each of those is then at most its own distance along the segment.
+    """
+    dx, dy = point[0] - anchor[0], point[1] - anchor[1]
+    distance = math.hypot(dx, dy)
+    if distance <= tolerance:
+        # Within tolerance of the anchor, so of any segment starting there.
+        return cone
+    angle = math.atan2(dy, dx)
+    spread = math.asin(tolerance / distance)
+    if cone is None:
+        return (angle, -spread, spread, distance)
+    base, low, high, reach = cone
+    offset = relative_angle(angle, base)
+    return (base, max(low, offset - spread), min(high, offset + spread), max(reach, distance))
+
+def in_cone(cone, anchor, point):
+    if cone is None:
+        return True
+    base, low, high, reach = cone
+    dx, dy = point[0] - anchor[0], point[1] - anchor[1]
+    return math.hypot(dx, dy) >= reach and low <= relative_angle(math.atan2(dy, dx), base) <= high
+
+def relative_angle(angle, base):
+    """angle - base wrapped into [-pi, pi)."""
+    return (angle - base + math.pi) % (2 * math.pi) - math.pi
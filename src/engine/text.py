@@ -0,0 +1,67 @@
+import functools
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageDraw, ImageFont
+
+DEFAULT_TEXT_SIZE = 11
+# Rasterized glyph runs kept for reuse, by count; captions are small, so this is a few MB at most.
+GLYPH_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=32)
+def load_font(size):
+    return ImageFont.load_default(size=size)
+
+def text_size(edit, scale=1.0):
+    return max(1, round(edit.get("size", DEFAULT_TEXT_SIZE) * scale))
+
+class GlyphCache:
+    """LRU of rasterized glyph runs keyed by (font size, text).
+
+    A run is the coverage mask of a whole string and the offset of its top
+    left corner from the drawing position, so a caption is rasterized once
+    and every later render only composites the mask.
+    """
+
+    def __init__(self, size=GLYPH_CACHE_SIZE):
+        self.size = size
+        self.runs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, text, size):
+        key = (size, text)
+        with self.lock:
+            run = self.runs.get(key)
+            if run is not None:
+                self.runs.move_to_end(key)
+                return run
+        run = rasterize(text, size)
+        with self.lock:
+            self.runs[key] = run
+            while len(self.runs) > self.size:
+                self.runs.popitem(last=False)
+        return run
+
+def rasterize(text, size):
+    font = load_font(size)
+    left, top, right, bottom = ImageDraw.Draw(Image.new("1", (1, 1))).textbbox((0, 0), text, font=font)
+    mask = Image.new("L", (max(right - left, 1), max(bottom - top, 1)))
+    ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font)
+    return mask, (left, top)
+
+glyph_cache = GlyphCache()
+
+def text_bounds(edit, scale=1.0):
+    """(left, top, right, bottom) a text edit draws into, in pixels of an image at scale."""
+    mask, (left, top) = glyph_cache.get(edit["text"], text_size(edit, scale))
+    x, y = (round(value * scale) + offset for value, offset in zip(edit["position"], (left, top)))
+    return (x, y, x + mask.width, y + mask.height)
+
+def draw_text(image, edit, scale=1.0, origin=(0, 0)):
+    """Composite a text edit into image in place, touching only its bounding box.
+
+    origin is where image's top left corner lies in the coordinates the
+    edit was recorded in, for drawing into a tile or region.
+    """
+    mask, _ = glyph_cache.get(edit["text"], text_size(edit, scale))
+    left, top, _, _ = text_bounds(edit, scale)
+    image.paste(tuple(edit["color"]), (left - origin[0], top - origin[1]), mask)
@@ -0,0 +1,296 @@
+import itertools
+import math
+import tempfile
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+TILE_SIZE = 512
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# Images larger than this are edited through TiledImage instead of in memory.
+TILED_PIXELS = 50 * 1000 * 1000
+# Longest side of the in-memory downsample shown for a tiled image.
+DISPLAY_SIZE = 4096
+
+class TileCache:
+    """LRU cache of decoded tiles shared by every TiledImage, bounded by pixel bytes."""
+
+    def __init__(self, budget=DEFAULT_MEMORY_BUDGET):
+        self.budget = budget
+        self.used = 0
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+            return tile
+
+    def put(self, key, tile):
+        size = tile_bytes(tile)
+        with self.lock:
+            old = self.tiles.pop(key, None)
+            if old is not None:
+                self.used -= tile_bytes(old)
+            if size > self.budget:
+                return
+            self.tiles[key] = tile
+            self.used += size
+            while self.used > self.budget:
+                _, evicted = self.tiles.popitem(last=False)
+                self.used -= tile_bytes(evicted)
+
+    def discard(self, owner):
+        """Drop every tile belonging to owner."""
+        with self.lock:
+            for key in [key for key in self.tiles if key[0] == owner]:
+                self.used -= tile_bytes(self.tiles.pop(key))
+
+default_cache = TileCache()
+
+# Cache keys use a counter rather than id() so a new image never sees a dead one's tiles.
+image_ids = itertools.count()
+
+def tile_bytes(tile):
+    return tile.width * tile.height * len(tile.getbands())
+
+class TiledImage:
+    """Image stored as fixed-size tiles in a temporary file and decoded on demand.
+
+    Tiles are kept in a shared TileCache, so the pixels held in memory stay
+    within its budget however large the image is. Edits produce a new
+    TiledImage by processing one tile at a time; convolution filters read
+    each tile with a halo of neighbouring pixels so results match filtering
+    the whole image.
+    """
+
+    def __init__(self, size, mode, tile_size=TILE_SIZE, cache=None):
+        self.key = next(image_ids)
+        self.size = tuple(size)
+        self.mode = mode
+        self.tile_size = tile_size
+        self.cache = cache or default_cache
+        self.bands = Image.getmodebands(mode)
+        self.columns = math.ceil(self.width / tile_size)
+        self.rows = math.ceil(self.height / tile_size)
+        self.tile_stride = tile_size * tile_size * self.bands
+        # Created with the first tile written, so images whose tiles come from elsewhere never make one.
+        self.file = None
+        self.file_lock = threading.Lock()
+        self.info = {}
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    @classmethod
+    def from_image(cls, image, tile_size=TILE_SIZE, cache=None):
+        tiled = cls(image.size, image.mode, tile_size, cache)
+        for column, row, box in tiled.tiles():
+            tiled.put_tile(column, row, image.crop(box))
+        return tiled
+
+    @classmethod
+    def open(cls, path, mode=None, tile_size=TILE_SIZE, cache=None):
+        """Decode path once and spill it into tiles; the decoded frame is released afterwards."""
+        with Image.open(path) as image:
+            if mode is not None and image.mode != mode:
+                image = image.convert(mode)
+            return cls.from_image(image, tile_size, cache)
+
+    def tiles(self):
+        """Yield (column, row, box) for every tile in row-major order."""
+        for row in range(self.rows):
+            for column in range(self.columns):
+                yield column, row, self.tile_box(column, row)
+
+    def tile_box(self, column, row):
+        left = column * self.tile_size
+        top = row * self.tile_size
+        return (left, top, min(left + self.tile_size, self.width), min(top + self.tile_size, self.height))
+
+    def get_tile(self, column, row):
+        key = (self.key, column, row)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
+
+        with self.file_lock:
+            self.file.seek(self.tile_offset(column, row))
+            data = self.file.read(self.tile_stride)
+        tile = Image.frombytes(self.mode, (self.tile_size, self.tile_size), data)
+        left, top, right, bottom = self.tile_box(column, row)
+        if (right - left, bottom - top) != tile.size:
+            tile = tile.crop((0, 0, right - left, bottom - top))
+        self.cache.put(key, tile)
+        return tile
+
+    def put_tile(self, column, row, tile):
+        if tile.mode != self.mode:
+            tile = tile.convert(self.mode)
+        data = tile.tobytes()
+        if tile.size != (self.tile_size, self.tile_size):
+            padded = Image.new(self.mode, (self.tile_size, self.tile_size))
+            padded.paste(tile, (0, 0))
+            data = padded.tobytes()
+        with self.file_lock:
+            if self.file is None:
+                self.file = tempfile.TemporaryFile()
+            self.file.seek(self.tile_offset(column, row))
+            self.file.write(data)
+        self.cache.put((self.key, column, row), tile)
+
+    def tile_offset(self, column, row):
+        return (row * self.columns + column) * self.tile_stride
+
+    def read(self, box):
+        """Return the pixels inside box as an in-memory PIL image."""
+        left, top, right, bottom = box
+        region = Image.new(self.mode, (right - left, bottom - top))
+        first_column, first_row = max(left, 0) // self.tile_size, max(top, 0) // self.tile_size
+        last_column = min((right - 1) // self.tile_size, self.columns - 1)
+        last_row = min((bottom - 1) // self.tile_size, self.rows - 1)
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                tile_left, tile_top, tile_right, tile_bottom = self.tile_box(column, row)
+                overlap = (max(left, tile_left), max(top, tile_top), min(right, tile_right), min(bottom, tile_bottom))
+                if overlap[0] >= overlap[2] or overlap[1] >= overlap[3]:
+                    continue
+                tile = self.get_tile(column, row)
+                piece = tile.crop((overlap[0] - tile_left, overlap[1] - tile_top,
+                                   overlap[2] - tile_left, overlap[3] - tile_top))
+                region.paste(piece, (overlap[0] - left, overlap[1] - top))
+        return region
+
+    def map(self, function, halo=0, boxes=None):
+        """Return a new TiledImage with function applied tile by tile.
+
+        function is called with the tile grown by halo pixels on every side
+        (clipped to the image) and that region's box, and returns an image of
+        the same size. Only tiles that intersect one of boxes are processed
+        when boxes is given; the rest are copied unchanged.
+        """
+        result = TiledImage(self.size, self.mode, self.tile_size, self.cache)
+        for column, row, box in self.tiles():
+            if boxes is not None and not any(intersects(box, other) for other in boxes):
+                result.put_tile(column, row, self.get_tile(column, row))
+                continue
+            left, top, right, bottom = box
+            outer = (max(left - halo, 0), max(top - halo, 0),
+                     min(right + halo, self.width), min(bottom + halo, self.height))
+            processed = function(self.read(outer), outer)
+            inner = (left - outer[0], top - outer[1], right - outer[0], bottom - outer[1])
+            result.put_tile(column, row, processed.crop(inner))
+        return result
+
+    def crop(self, box):
+        left, top, right, bottom = (int(value) for value in box)
+        result = TiledImage((right - left, bottom - top), self.mode, self.tile_size, self.cache)
+        for column, row, (tile_left, tile_top, tile_right, tile_bottom) in result.tiles():
+            result.put_tile(column, row, self.read((tile_left + left, tile_top + top,
+                                                    tile_right + left, tile_bottom + top)))
+        return result
+
+    def transpose(self, method):
+        width, height = self.size
+        if method in (Image.ROTATE_90, Image.ROTATE_270, Image.TRANSPOSE, Image.TRANSVERSE):
+            size = (height, width)
+        else:
+            size = (width, height)
+        result = TiledImage(size, self.mode, self.tile_size, self.cache)
+        for column, row, box in result.tiles():
+            source_box = transposed_source_box(method, box, self.size)
+            result.put_tile(column, row, self.read(source_box).transpose(method))
+        return result
+
+    def histogram(self):
+        histogram = [0] * (256 * self.bands)
+        for column, row, _ in self.tiles():
+            for index, count in enumerate(self.get_tile(column, row).histogram()):
+                histogram[index] += count
+        return histogram
+
+    def resize(self, size, resample=Image.BILINEAR, reducing_gap=None):
+        """Downsample into an in-memory PIL image, reading one tile at a time."""
+        target_width, target_height = size
+        scale_x = target_width / self.width
+        scale_y = target_height / self.height
+        # Resampling filters reach this many source pixels beyond a tile when shrinking.
+        margin_x = math.ceil(1 / min(scale_x, 1.0)) + 2
+        margin_y = math.ceil(1 / min(scale_y, 1.0)) + 2
+
+        result = Image.new(self.mode, size)
+        for _, _, (left, top, right, bottom) in self.tiles():
+            target_left, target_right = int(left * scale_x), int(right * scale_x)
+            target_top, target_bottom = int(top * scale_y), int(bottom * scale_y)
+            if right == self.width:
+                target_right = target_width
+            if bottom == self.height:
+                target_bottom = target_height
+            if target_left >= target_right or target_top >= target_bottom:
+                continue
+
+            outer = (max(left - margin_x, 0), max(top - margin_y, 0),
+                     min(right + margin_x, self.width), min(bottom + margin_y, self.height))
+            region = self.read(outer)
+            box = (target_left / scale_x - outer[0], target_top / scale_y - outer[1],
+                   target_right / scale_x - outer[0], target_bottom / scale_y - outer[1])
+            piece = region.resize((target_right - target_left, target_bottom - target_top), resample, box=box)
+            result.paste(piece, (target_left, target_top))
+        return result
+
+    def reduce(self, factor):
+        """Shrink by an integer factor with box averaging into a new TiledImage, one tile at a time."""
+        size = (math.ceil(self.width / factor), math.ceil(self.height / factor))
+        result = TiledImage(size, self.mode, self.tile_size, self.cache)
+        for column, row, (left, top, right, bottom) in result.tiles():
+            region = self.read((left * factor, top * factor,
+                                min(right * factor, self.width), min(bottom * factor, self.height)))
+            result.put_tile(column, row, region.reduce(factor))
+        return result
+
+    def to_image(self):
+        """Assemble the whole image in memory."""
+        return self.read((0, 0, self.width, self.height))
+
+    def close(self):
+        self.cache.discard(self.key)
+        if self.file is not None:
+            self.file.close()
+
+def intersects(box, other):
+    return box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]
+
+def transposed_source_box(method, box, source_size):
+    """Box in the source image whose transpose fills box in the result."""
+    left, top, right, bottom = box
+    width, height = source_size
+    if method == Image.FLIP_LEFT_RIGHT:
+        return (width - right, top, width - left, bottom)
+    if method == Image.FLIP_TOP_BOTTOM:
+        return (left, height - bottom, right, height - top)
+    if method == Image.ROTATE_180:
+        return (width - right, height - bottom, width - left, height - top)
+    if method == Image.ROTATE_90:
+        return (width - bottom, left, width - top, right)
+    if method == Image.ROTATE_270:
+        return (top, height - right, bottom, height - left)
+    if method == Image.TRANSPOSE:
+        return (top, left, bottom, right)
+    if method == Image.TRANSVERSE:
+        return (width - bottom, height - right, width - top, height - left)
+    raise ValueError(f"Unknown transpose method: {method}")
+
+def display_image(image, max_size=DISPLAY_SIZE):
+    """In-memory image to show for image; tiled images are downsampled to max_size."""
+    if not isinstance(image, TiledImage):
+        return image
+    scale = min(max_size / image.width, max_size / image.height, 1.0)
+    size = (max(int(image.width * scale), 1), max(int(image.height * scale), 1))
+    return image.resize(size)
@@ -1,29 +1,73 @@
 import sys
 import os
+import itertools
+import math
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QHBoxLayout, QMenu, QFileDialog, 
                                QPushButton, QGraphicsView, 
-                               QGraphicsScene, QFrame, QToolTip, 
-                               QGraphicsPixmapItem, QDialog, QGridLayout,
+                               QFrame, QToolTip, 
+                               QGraphicsItem, QDialog, QGridLayout,
                                QColorDialog, QFontDialog, QLineEdit, QLabel, QSlider,
-                               QMessageBox)  
-from PySide6.QtGui import QAction, QPixmap, QIcon, QFont, QTransform, QPainter, QPen
-from PySide6.QtCore import Qt, QSize, QRectF, QPoint
-from PIL import Image, ImageEnhance, ImageFilter, ImageDraw, ImageFont, ImageQt
-from PIL.ImageQt import ImageQt  
+                               QMessageBox, QProgressDialog, QTabBar, QInputDialog)  
+from PySide6.QtGui import QAction, QKeySequence, QPixmap, QIcon, QFont, QPainter, QColor
+from PySide6.QtCore import Qt, QSize, QRect, QPoint, QTimer, QThread, QThreadPool, Signal
+from PIL import Image
+from component.caption import CaptionItem
 from component.crop import CropItem
 from component.resize import ResizablePixmapItem
 from component.adjust import AdjustDialog
+from component.bridge import SharedFrame, crop_view, to_qimage
+from component.document import Document, DEFAULT_SESSION_BUDGET, SPILLED_DISPLAY_SIZE
+from component.pyramid import PyramidBuilder
+from component.overlay import PerformanceOverlay
+from component.picker import ColorPicker
+from component.export import Exporter, ExportOptionsDialog
+from component.recent import RecentFilesPanel
+from component.strokes import StrokeItem, StrokeLayer
+from engine.cache import DecodeCache, ImageCache, downsample, file_key
+from engine.export import format_for_path, oriented_jpeg, render_full
+from engine.histogram import auto_levels
+from engine.loader import decode, draft, probe
+from engine.profiler import profiler, span
+from engine.project import PROJECT_EXTENSION, ProjectFile, is_project, project_preview, save_project
+from engine.stack import GEOMETRY_OPS, EditStack, RenderedTiles, edit_bounds, normalize_mode, orientation, transpose
+from engine.text import draw_text
+from engine.strokes import Stroke
+from engine.tiles import TiledImage, TileCache, TILED_PIXELS, display_image
 
 class DrawingGraphicsView(QGraphicsView):
+    # Emitted when a stroke is finished and added to the stroke layer.
+    stroke_finished = Signal()
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setRenderHint(QPainter.Antialiasing)
         self.drawing = False
         self.last_point = QPoint()
         self.pen_color = Qt.red  # Default pen color
-        self.pen_width = 2  # Default pen width
-        self.lines = []  # List to store drawn lines
+        self.pen_width = 2  # Default pen width, in view pixels
+        # Off while a tool such as crop needs mouse events to reach scene items.
+        self.drawing_enabled = True
+        # Finished strokes are kept as points and drawn from one cached raster;
+        # only the stroke being drawn is a live path item.
+        self.stroke_layer = None
+        self.stroke_item = None
+        self.overlay = None
+
+    def set_overlay(self, overlay):
+        """Show overlay on top of the scene, or remove it with None."""
+        if self.overlay is not None:
+            self.overlay.close()
+        self.overlay = overlay
+        # The overlay is fixed to the viewport, so scrolling must repaint all of it.
+        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate if overlay is not None
+                                   else QGraphicsView.MinimalViewportUpdate)
+        self.viewport().update()
+
+    def drawForeground(self, painter, rect):
+        super().drawForeground(painter, rect)
+        if self.overlay is not None:
+            self.overlay.paint(painter)
 
     def set_pen_color(self, color):
         self.pen_color = color
@@ -31,33 +75,100 @@ class DrawingGraphicsView(QGraphicsView):
     def set_pen_width(self, width):
         self.pen_width = width
 
+    @property
+    def strokes(self):
+        return [] if self.stroke_layer is None else self.stroke_layer.strokes
+
     def start_drawing(self, pos):
         self.drawing = True
         self.last_point = pos
+        # Width and simplification tolerance are set in view pixels and stored in scene units.
+        zoom = self.transform().m11()
+        stroke = Stroke(QColor(self.pen_color).getRgb(), self.pen_width / zoom, 0.5 / zoom)
+        self.stroke_item = StrokeItem(stroke)
+        self.scene().addItem(self.stroke_item)
+        self.draw_line_to(pos)
 
     def stop_drawing(self):
         self.drawing = False
+        if self.stroke_item is None:
+            return
+        item, self.stroke_item = self.stroke_item, None
+        if item.scene() is not self.scene():
+            return
+        self.scene().removeItem(item)
+        if self.stroke_layer is None:
+            self.stroke_layer = StrokeLayer()
+            self.scene().addItem(self.stroke_layer)
+        self.stroke_layer.add(item.stroke)
+        self.stroke_finished.emit()
+
+    def set_strokes(self, strokes):
+        """Show exactly strokes, as when undo or redo changes them."""
+        if tuple(strokes) == tuple(self.strokes):
+            return
+        if self.stroke_layer is None:
+            self.stroke_layer = StrokeLayer()
+            self.scene().addItem(self.stroke_layer)
+        self.stroke_layer.set_strokes(strokes)
+
+    def clear_strokes(self):
+        """Forget every stroke; called before the scene is cleared for a new image."""
+        self.drawing = False
+        for item in (self.stroke_item, self.stroke_layer):
+            if item is not None and item.scene() is not None:
+                item.scene().removeItem(item)
+        self.stroke_item = None
+        self.stroke_layer = None
 
     def draw_line_to(self, pos):
-        if self.drawing:
-            line = (self.last_point, pos)
-            self.lines.append(line)
-            self.scene().addLine(self.last_point.x(), self.last_point.y(), pos.x(), pos.y(), QPen(self.pen_color, self.pen_width))
+        if self.drawing and self.stroke_item is not None:
+            point = self.mapToScene(pos.toPoint())
+            self.stroke_item.add(point.x(), point.y())
             self.last_point = pos
 
     def mousePressEvent(self, event):
-        if event.button() == Qt.LeftButton:
-            self.start_drawing(event.localPos())  
+        if (event.button() == Qt.LeftButton and self.drawing_enabled and self.scene() is not None
+                and not isinstance(self.itemAt(event.position().toPoint()), CaptionItem)):
+            self.start_drawing(event.position())
+        else:
+            super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event):
         if self.drawing:
-            self.draw_line_to(event.localPos()) 
+            self.draw_line_to(event.position())
+        else:
+            super().mouseMoveEvent(event)
 
     def mouseReleaseEvent(self, event):
-        if event.button() == Qt.LeftButton:
+        if event.button() == Qt.LeftButton and self.drawing:
             self.stop_drawing()
+        else:
+            super().mouseReleaseEvent(event)
+
+def document_attribute(name):
+    """ImageEditor attribute stored on the active Document."""
+    return property(lambda self: getattr(self.document, name),
+                    lambda self, value: setattr(self.document, name, value))
 
 class ImageEditor(QMainWindow):
+    graphics_scene = document_attribute("scene")
+    renderer = document_attribute("renderer")
+    loader = document_attribute("loader")
+    original_image = document_attribute("original_image")
+    current_pixmap = document_attribute("current_pixmap")
+    image_size = document_attribute("image_size")
+    image_key = document_attribute("image_key")
+    edit_stack = document_attribute("edit_stack")
+    history = document_attribute("history")
+    rendered_edits = document_attribute("rendered_edits")
+    preview_proxy = document_attribute("preview_proxy")
+    filter_cache = document_attribute("filter_cache")
+    full_render_pending = document_attribute("full_render_pending")
+    pyramid = document_attribute("pyramid")
+    pyramid_source = document_attribute("pyramid_source")
+    resizable_item = document_attribute("resizable_item")
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Redy")
@@ -69,12 +180,40 @@ class ImageEditor(QMainWindow):
         self.current_sharpening = 50 
         self.current_blur = 0 
         self.last_click_pos = None
-        self.rotation_angle = 0 
-        self.current_pixmap = None 
-        self.original_image = None  
-        self.flipped_image = None  
-        self.is_flipped = False  
         self.current_text_color = Qt.white  
+
+        # Each tab is a Document; their renders, loads and pyramids all run on
+        # one pool. self.document is the one the editor's image state refers to.
+        self.worker_pool = QThreadPool(self)
+        self.worker_pool.setMaxThreadCount(max(QThread.idealThreadCount(), 2))
+        self.documents = []
+        self.document = None
+        self.active_document = None
+        self.show_order = itertools.count(1)
+        self.memory_budget = DEFAULT_SESSION_BUDGET
+
+        # Images above TILED_PIXELS are kept as disk-backed tiles within this budget.
+        self.tile_cache = TileCache()
+        self.full_render_timer = QTimer(self)
+        self.full_render_timer.setSingleShot(True)
+        self.full_render_timer.setInterval(300)
+        self.full_render_timer.timeout.connect(self.render_full_resolution)
+
+        # Reopened files come from decoded images kept in memory, or start from
+        # a mid-resolution decode cached on disk while the full decode runs.
+        self.image_cache = ImageCache()
+        self.decode_cache = DecodeCache()
+        self.exporter = Exporter(parent=self)
+        self.exporter.signals.progress.connect(self.on_export_progress)
+        self.exporter.signals.finished.connect(self.on_export_finished)
+        self.exporter.signals.failed.connect(self.on_export_failed)
+        self.exporter.signals.cancelled.connect(self.on_export_cancelled)
+        self.export_progress = None
+
+        # Half-size levels of the shown image are built in the background so
+        # zoomed-out views draw only the visible tiles of a matching level.
+        self.pyramid_builder = PyramidBuilder(parent=self, pool=self.worker_pool)
+        self.pyramid_builder.level_ready.connect(self.on_pyramid_level_ready)
         
         self.setStyleSheet("""
             QMainWindow {
@@ -130,7 +269,7 @@ class ImageEditor(QMainWindow):
 
         self.create_menu_bar()
 
-        self.current_pixmap = None 
+        self.new_document()
 
     def create_left_sidebar(self, layout):
         left_sidebar = QVBoxLayout()
@@ -200,12 +339,26 @@ class ImageEditor(QMainWindow):
             self.graphics_view.setCursor(Qt.ArrowCursor)
 
     def create_image_board(self, layout):
+        board = QVBoxLayout()
+        board.setSpacing(0)
+        self.tab_bar = QTabBar()
+        self.tab_bar.setTabsClosable(True)
+        self.tab_bar.setExpanding(False)
+        self.tab_bar.setStyleSheet("QTabBar::tab { background: #333; color: white; padding: 4px 10px; }"
+                                   "QTabBar::tab:selected { background: #5A5A5A; }")
+        self.tab_bar.currentChanged.connect(self.on_tab_changed)
+        self.tab_bar.tabCloseRequested.connect(self.close_document)
+        board.addWidget(self.tab_bar)
+
         self.graphics_view = DrawingGraphicsView(self)
-        self.graphics_scene = QGraphicsScene()
-        self.graphics_view.setScene(self.graphics_scene)
         self.graphics_view.setAlignment(Qt.AlignCenter)
         self.graphics_view.setStyleSheet("background-color: #5A5A5A;") 
-        layout.addWidget(self.graphics_view)
+        self.graphics_view.stroke_finished.connect(self.record_stroke)
+        board.addWidget(self.graphics_view)
+        # Sampling is a view event filter, so the view's own mouse handlers stay in place.
+        self.color_picker = ColorPicker(self.graphics_view, self.locate_pixel)
+        self.color_picker.picked.connect(self.on_color_picked)
+        layout.addLayout(board)
 
     def create_right_sidebar(self, layout):
         right_sidebar = QVBoxLayout()
@@ -237,7 +390,13 @@ class ImageEditor(QMainWindow):
             feature_grid.addWidget(button, i // 2, i % 2)
 
         right_sidebar.addLayout(feature_grid)
-        right_sidebar.addStretch()
+
+        recent_label = QLabel("Recent Files")
+        recent_label.setStyleSheet("color: white;")
+        right_sidebar.addWidget(recent_label)
+        self.recent_panel = RecentFilesPanel(self.decode_cache)
+        self.recent_panel.open_requested.connect(self.open_image)
+        right_sidebar.addWidget(self.recent_panel)
         layout.addLayout(right_sidebar)
 
     def toggle_draw_mode(self):
@@ -261,24 +420,28 @@ class ImageEditor(QMainWindow):
             self.graphics_view.scale(scale_factor, scale_factor)  
 
     def activate_color_picker(self):
-        self.graphics_view.setCursor(Qt.CrossCursor)  
-        self.graphics_view.mousePressEvent = self.pick_color_from_image
-    
-    def pick_color_from_image(self, event):
         if self.current_pixmap is not None:
-            pos = event.pos()
-            scene_pos = self.graphics_view.mapToScene(pos)
-
-            item = self.graphics_scene.itemAt(scene_pos, QTransform())
-            if isinstance(item, QGraphicsPixmapItem):
-                pixmap = item.pixmap()
-                x = int(scene_pos.x())
-                y = int(scene_pos.y())
-                if 0 <= x < pixmap.width() and 0 <= y < pixmap.height():
-                    color = pixmap.toImage().pixelColor(x, y)
-                    self.current_text_color = color  
-                    self.graphics_view.setCursor(Qt.ArrowCursor) 
-                    self.show_color_picked_message(color)
+            self.color_picker.start()
+
+    def locate_pixel(self, view_pos):
+        """(working image, x, y) of the full-resolution pixel under a viewport position, or None."""
+        canvas = self.resizable_item
+        image = self.current_pixmap
+        if canvas is None or image is None or canvas.scene() is not self.graphics_scene:
+            return None
+        point = canvas.mapFromScene(self.graphics_view.mapToScene(view_pos))
+        pixmap = canvas.pixmap()
+        # Floor, not truncation: a point just left of or above the image is outside it, not on pixel 0.
+        x = math.floor(point.x() * image.width / pixmap.width())
+        y = math.floor(point.y() * image.height / pixmap.height())
+        if not (0 <= x < image.width and 0 <= y < image.height):
+            return None
+        return image, x, y
+
+    def on_color_picked(self, rgb):
+        color = QColor(*rgb)
+        self.current_text_color = color
+        self.show_color_picked_message(color)
 
     def show_color_picked_message(self, color):
         rgb_value = f"RGB({color.red()}, {color.green()}, {color.blue()})"
@@ -328,33 +491,192 @@ class ImageEditor(QMainWindow):
             print(f"Selected font: {font.family()}, size: {font.pointSize()}")
 
     def add_text_to_image(self, text):
-        if self.current_pixmap is not None:
-            q_image = self.current_pixmap.toqimage()  
-            pil_image = Image.frombytes("RGBA", (q_image.width(), q_image.height()), 
-                                        q_image.bits(), "raw", "BGRA", 0, 1)
-
-            draw = ImageDraw.Draw(pil_image)
-            font = ImageFont.load_default()
-            text_position = (10, 10)  
-            text_color = (255, 255, 255)  
-            draw.text(text_position, text, fill=text_color, font=font)
-
-            self.update_image(pil_image)  
+        """Add a caption as a text edit.
+
+        When the canvas shows the full-resolution render of the stack, its
+        cached glyph run is composited into a copy of that frame and only
+        its box is converted and repainted.
+        """
+        if self.current_pixmap is None or not text:
+            return
+        synced = self.is_frame_synced()
+        edit = self.edit_stack.push("text", text=text, position=[10, 10], color=[255, 255, 255])
+        box = self.frame_box(edit_bounds(edit))
+        if not synced or box is None:
+            self.render_stack(dirty=edit_bounds(edit))
+            return
+        frame = self.current_pixmap
+        stack = self.edit_stack.copy()
+
+        def render():
+            image = frame.copy()
+            draw_text(image, edit)
+            return image
+
+        self.submit_region(render, box, stack)
+
+    def move_caption(self, index, x, y):
+        self.update_caption(index, position=[x, y])
+
+    def edit_caption(self, index):
+        text, ok = QInputDialog.getText(self, "Edit Text", "Text:", text=self.edit_stack.edits[index]["text"])
+        if ok and text:
+            self.update_caption(index, text=text)
+
+    def update_caption(self, index, **params):
+        """Change text edit index in place and re-render only the pixels it covered or now covers.
+
+        The box is rendered from the original image when every edit can be
+        rendered by region; otherwise the whole stack is rendered and just
+        the box is converted and repainted.
+        """
+        synced = self.is_frame_synced()
+        edit = self.edit_stack.edits[index]
+        old = edit_bounds(edit)
+        edit.update(params)
+        new = edit_bounds(edit)
+        box = self.edit_stack.affected_box(index, (min(old[0], new[0]), min(old[1], new[1]),
+                                                   max(old[2], new[2]), max(old[3], new[3])))
+        if box is not None:
+            box = self.frame_box(box)
+        if not synced or box is None:
+            self.render_stack()
+            return
+        frame = self.current_pixmap
+        if self.edit_stack.region_halo() is None:
+            self.render_stack(dirty=box)
+            return
+        source = self.original_image
+        stack = self.edit_stack.copy()
+
+        def render():
+            image = frame.copy()
+            image.paste(stack.render_region(source, box), box[:2])
+            return image
+
+        self.submit_region(render, box, stack)
+
+    def is_frame_synced(self):
+        """Whether the canvas shows the full-resolution, in-memory render of the current edit stack."""
+        return (isinstance(self.current_pixmap, Image.Image) and not self.full_render_pending
+                and self.resizable_item is not None and self.rendered_edits == self.edit_stack.edits)
+
+    def frame_box(self, box):
+        """box clipped to the current frame, or None if nothing of it is left."""
+        width, height = self.current_pixmap.size
+        box = (max(box[0], 0), max(box[1], 0), min(box[2], width), min(box[3], height))
+        return box if box[0] < box[2] and box[1] < box[3] else None
+
+    def submit_region(self, render, box, stack):
+        """Render a new full-resolution frame of stack that differs from the shown one only inside box."""
+        self.full_render_timer.stop()
+        self.renderer.submit(render,
+                             self.for_document(lambda image, q_image: self.on_stack_rendered(image, q_image, box, stack)),
+                             display=lambda image: image.crop(box))
+
+    def sync_captions(self):
+        """Give each text edit an editable handle on the canvas.
+
+        Captions followed by a crop, flip or rotate get none, as their
+        positions no longer match the rendered image.
+        """
+        canvas = self.resizable_item
+        frame = self.current_pixmap
+        captions = self.document.captions
+        editable = []
+        if canvas is not None and frame is not None:
+            for index, edit in enumerate(self.edit_stack.edits):
+                if edit["op"] in GEOMETRY_OPS:
+                    editable = []
+                elif edit["op"] == "text" and edit["text"]:
+                    editable.append(index)
+        for number, index in enumerate(editable):
+            edit = self.edit_stack.edits[index]
+            if number == len(captions):
+                item = CaptionItem(index, edit, canvas)
+                item.moved.connect(self.move_caption)
+                item.edit_requested.connect(self.edit_caption)
+                captions.append(item)
+            captions[number].set_edit(index, edit, canvas.pixmap().width() / frame.width)
+        for item in captions[len(editable):]:
+            item.setParentItem(None)
+            if item.scene() is not None:
+                item.scene().removeItem(item)
+        del captions[len(editable):]
 
     def reset_image(self):
         """Reset the image to its original state."""
         if self.original_image is not None:
-            self.update_image(self.original_image)  
-            self.current_contrast = 50
-            self.current_brightness = 50
-            self.current_saturation = 50
-            self.current_sharpening = 50 
-            if hasattr(self, 'contrast_dialog'):
-                self.contrast_dialog.slider.setValue(self.current_contrast)
-            if hasattr(self, 'brightness_dialog'):
-                self.brightness_dialog.slider.setValue(self.current_brightness)
-            if hasattr(self, 'saturation_dialog'):
-                self.saturation_dialog.slider.setValue(self.current_saturation)
+            self.edit_stack.clear()
+            self.sync_sliders()
+            self.render_stack()
+
+    def sync_sliders(self):
+        """Move the adjustment sliders to the values in the edit stack without re-applying them."""
+        def factor(op, default=1.0):
+            edit = self.edit_stack.get(op)
+            return default if edit is None else edit.get("factor", default)
+
+        blur = self.edit_stack.get("blur")
+        self.current_contrast = round(factor("contrast") * 50)
+        self.current_brightness = round(factor("brightness") * 50)
+        self.current_saturation = round(factor("saturation") * 50)
+        self.current_sharpening = round((factor("sharpen") - 1.0) * 50 + 50)
+        self.current_blur = 0 if blur is None else round(blur["radius"] * 20)
+        for name, value in (("contrast", self.current_contrast), ("brightness", self.current_brightness),
+                            ("saturation", self.current_saturation), ("sharpen", self.current_sharpening),
+                            ("blur", self.current_blur)):
+            dialog = getattr(self, f'{name}_dialog', None)
+            if dialog is not None:
+                dialog.slider.blockSignals(True)
+                dialog.slider.setValue(value)
+                dialog.slider.blockSignals(False)
+                dialog.input_field.setText(str(value))
+
+    def record_stroke(self):
+        """Add an undo step for the stroke just finished, leaving the edits as last recorded."""
+        self.history.record("stroke", self.history.current_edits(), strokes=self.graphics_view.strokes)
+
+    def undo(self):
+        self.restore_history(self.history.undo())
+
+    def redo(self):
+        self.restore_history(self.history.redo())
+
+    def restore_history(self, state):
+        """Show a state from the history.
+
+        Steps with tile diffs are patched into the shown frame directly when
+        it is the full-resolution frame they were taken from; anything else
+        is re-rendered, showing the fast preview first.
+        """
+        if state is None or self.original_image is None:
+            return
+        edits, patches, strokes = state
+        self.graphics_view.set_strokes(strokes)
+        leaving = self.edit_stack.edits
+        if edits == leaving and not patches:
+            # Only strokes changed.
+            return
+        self.edit_stack = EditStack(edits)
+        self.sync_sliders()
+
+        frame = self.current_pixmap
+        canvas = getattr(self, 'resizable_item', None)
+        if (patches and not self.full_render_pending and leaving == self.rendered_edits
+                and isinstance(frame, Image.Image) and canvas is not None and canvas.scale() == 1.0
+                and canvas.pixmap().size() == QSize(*frame.size)):
+            self.renderer.cancel()
+            with span("apply tile diffs", "engine"):
+                image = frame.copy()
+                for box, tile in patches:
+                    image.paste(tile, box[:2])
+            dirty = (min(box[0] for box, _ in patches), min(box[1] for box, _ in patches),
+                     max(box[2] for box, _ in patches), max(box[3] for box, _ in patches))
+            self.on_stack_rendered(image, to_qimage(image.crop(dirty)), dirty)
+            self.rendered_edits = self.edit_stack.copy().edits
+        else:
+            self.render_preview()
 
     def create_menu_bar(self):
         menubar = self.menuBar()
@@ -364,6 +686,12 @@ class ImageEditor(QMainWindow):
         import_action.triggered.connect(self.import_image)
         file_menu.addAction(import_action)
 
+        self.save_project_action = QAction("Save Project...", self)
+        self.save_project_action.setShortcut(QKeySequence.Save)
+        self.save_project_action.setEnabled(False)
+        self.save_project_action.triggered.connect(self.save_project_as)
+        file_menu.addAction(self.save_project_action)
+
         export_menu = QMenu("Export", self)
         
         self.export_jpg_action = QAction("JPG", self)
@@ -376,65 +704,106 @@ class ImageEditor(QMainWindow):
         self.export_png_action.triggered.connect(lambda: self.export_image("png"))
         export_menu.addAction(self.export_png_action)
 
+        self.export_webp_action = QAction("WebP", self)
+        self.export_webp_action.setEnabled(False)
+        self.export_webp_action.triggered.connect(lambda: self.export_image("webp"))
+        export_menu.addAction(self.export_webp_action)
+
         file_menu.addMenu(export_menu)
 
+        edit_menu = menubar.addMenu("Edit")
+
+        undo_action = QAction("Undo", self)
+        undo_action.setShortcut(QKeySequence.Undo)
+        undo_action.triggered.connect(self.undo)
+        edit_menu.addAction(undo_action)
+
+        redo_action = QAction("Redo", self)
+        redo_action.setShortcut(QKeySequence.Redo)
+        redo_action.triggered.connect(self.redo)
+        edit_menu.addAction(redo_action)
+
         settings_menu = menubar.addMenu("Settings")
 
+        self.overlay_action = QAction("Performance Overlay", self)
+        self.overlay_action.setCheckable(True)
+        self.overlay_action.toggled.connect(self.toggle_performance_overlay)
+        settings_menu.addAction(self.overlay_action)
+
+        trace_action = QAction("Export Performance Trace...", self)
+        trace_action.triggered.connect(self.export_performance_trace)
+        settings_menu.addAction(trace_action)
+
+    def toggle_performance_overlay(self, checked):
+        self.graphics_view.set_overlay(PerformanceOverlay(self.graphics_view) if checked else None)
+
+    def export_performance_trace(self):
+        """Save the recorded timing spans as a Chrome trace (chrome://tracing, Perfetto)."""
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Performance Trace", "trace.json", "Trace Files (*.json)")
+        if file_path:
+            profiler.export(file_path)
+            print(f"[SUCCESS] Performance trace saved to {file_path}")
+
     def show_blur_popup(self):
         """Show a dialog to adjust the blur."""
-        self.blur_dialog = AdjustDialog("Adjust Blur", 0, 100, self.current_blur, self.on_blur_value_changed)
+        self.blur_dialog = AdjustDialog("Adjust Blur", 0, 100, self.current_blur, self.on_blur_value_changed,
+                                        self.render_full_resolution, self.auto_levels)
         self.blur_dialog.show()
+        self.refresh_histogram()
 
     def show_contrast_popup(self):
-        self.contrast_dialog = AdjustDialog("Adjust Contrast", 0, 100, self.current_contrast, self.on_contrast_value_changed)
+        self.contrast_dialog = AdjustDialog("Adjust Contrast", 0, 100, self.current_contrast, self.on_contrast_value_changed,
+                                            self.render_full_resolution, self.auto_levels)
         self.contrast_dialog.show()
+        self.refresh_histogram()
 
     def show_brightness_popup(self):
-        self.brightness_dialog = AdjustDialog("Adjust Brightness", 0, 100, self.current_brightness, self.on_brightness_value_changed)
+        self.brightness_dialog = AdjustDialog("Adjust Brightness", 0, 100, self.current_brightness, self.on_brightness_value_changed,
+                                              self.render_full_resolution, self.auto_levels)
         self.brightness_dialog.show()
+        self.refresh_histogram()
 
     def show_saturation_popup(self):
-        self.saturation_dialog = AdjustDialog("Adjust Saturation", 0, 100, self.current_saturation, self.on_saturation_value_changed)
+        self.saturation_dialog = AdjustDialog("Adjust Saturation", 0, 100, self.current_saturation, self.on_saturation_value_changed,
+                                              self.render_full_resolution, self.auto_levels)
         self.saturation_dialog.show()
+        self.refresh_histogram()
 
     def show_sharpen_popup(self):
         """Open a dialog to adjust sharpening amount."""
-        self.sharpen_dialog = AdjustDialog("Adjust Sharpening", 0, 100, self.current_sharpening, self.on_sharpen_value_changed)
+        self.sharpen_dialog = AdjustDialog("Adjust Sharpening", 0, 100, self.current_sharpening, self.on_sharpen_value_changed,
+                                           self.render_full_resolution, self.auto_levels)
         self.sharpen_dialog.show()
+        self.refresh_histogram()
 
     def on_sharpen_value_changed(self, value):
         self.sharpen_dialog.input_field.setText(str(value))
 
         if self.current_pixmap is not None:
-            q_image = self.current_pixmap.toqimage()
-            pil_image = Image.frombytes("RGBA", (q_image.width(), q_image.height()),
-                                        q_image.bits(), "raw", "BGRA", 0, 1)
-
-            enhancer = ImageEnhance.Sharpness(self.original_image)
-
             scale_factor = (value - 50) / 50.0 + 1.0
 
             scale_factor = max(0.0, min(scale_factor, 2.0))
 
-            sharpened_image = enhancer.enhance(scale_factor)
-
-            self.update_image(sharpened_image)
-            self.current_pixmap = sharpened_image  
+            self.apply_adjustment("sharpen", factor=scale_factor)
             self.current_sharpening = value  
             
     def show_crop_dialog(self):
         """Show the cropping dialog with the crop overlay item."""
-        q_image = ImageQt(self.current_pixmap)  
-        pixmap = QPixmap.fromImage(q_image)
-
-        self.graphics_scene.clear()
-        self.original_pixmap_item = QGraphicsPixmapItem(pixmap)
-        self.graphics_scene.addItem(self.original_pixmap_item)
-
+        # The crop overlay goes over the persistent canvas; the canvas is not
+        # rebuilt, and the rectangle is mapped through it when confirmed.
+        canvas = self.resizable_item
+        if canvas is None or self.current_pixmap is None:
+            return
+        # Starting again replaces the overlay and buttons of a crop still showing.
+        if getattr(self, 'crop_item', None) is not None or getattr(self, 'crop_proxy', None) is not None:
+            self.cancel_crop()
+        bounds = canvas.sceneBoundingRect()
         self.crop_item = CropItem()
         self.graphics_scene.addItem(self.crop_item)
-        self.crop_item.setRect(QRectF(50, 50, 100, 100))  
+        self.crop_item.setRect(bounds.adjusted(bounds.width() / 4, bounds.height() / 4,
+                                               -bounds.width() / 4, -bounds.height() / 4))
         self.crop_item.update_resize_handle_position()
+        self.graphics_view.drawing_enabled = False
 
         self.crop_widget = QWidget()
         crop_layout = QVBoxLayout()
@@ -451,39 +820,57 @@ class ImageEditor(QMainWindow):
         crop_layout.addLayout(button_layout)
         self.crop_widget.setLayout(crop_layout)
 
-        self.graphics_scene.addWidget(self.crop_widget)
+        # The proxy owns the widget; it is removed from the scene when the crop ends.
+        self.crop_proxy = self.graphics_scene.addWidget(self.crop_widget)
+        # Keep the buttons at their normal size and in view whatever the zoom.
+        self.crop_proxy.setFlag(QGraphicsItem.ItemIgnoresTransformations)
+        self.crop_proxy.setZValue(4)
+        self.crop_proxy.setPos(self.graphics_view.mapToScene(10, 10))
         self.crop_widget.show()
 
         self.graphics_view.setDragMode(QGraphicsView.RubberBandDrag)
 
     def get_crop_rectangle(self):
-        if self.crop_item:
-            rect = self.crop_item.rect()
-            return (rect.x(), rect.y(), rect.width(), rect.height())
-        return None
+        """The crop rectangle as (x, y, width, height) in pixels of the current image, or None.
+
+        The rectangle is mapped through the canvas item, so moving or
+        resizing the canvas and zooming the view do not shift the crop.
+        """
+        canvas = self.resizable_item
+        if not self.crop_item or canvas is None or self.current_pixmap is None:
+            return None
+        local = canvas.mapRectFromScene(self.crop_item.mapRectToScene(self.crop_item.rect()))
+        width, height = self.current_pixmap.size
+        scale_x = width / canvas.pixmap().width()
+        scale_y = height / canvas.pixmap().height()
+        left = min(max(int(round(local.left() * scale_x)), 0), width)
+        top = min(max(int(round(local.top() * scale_y)), 0), height)
+        right = min(max(int(round(local.right() * scale_x)), 0), width)
+        bottom = min(max(int(round(local.bottom() * scale_y)), 0), height)
+        if right - left < 1 or bottom - top < 1:
+            return None
+        return (left, top, right - left, bottom - top)
 
     def confirm_crop(self):
         """Confirm cropping, update the image, and remove the crop overlay."""
+        self.graphics_view.drawing_enabled = True
         if self.crop_item is not None:
             try:
                 crop_rect = self.get_crop_rectangle() 
 
                 if crop_rect:
                     x, y, width, height = crop_rect
-                    pil_image = self.original_image.crop((x, y, x + width, y + height))
-
-                    self.current_pixmap = pil_image
-                    self.update_image(self.current_pixmap)  
-
-                    if self.crop_item.scene() is not None:  
-                        self.graphics_scene.removeItem(self.crop_item)
-                        print("Crop item removed from the scene.")
-                    else:
-                        print("Crop item is already deleted or not in the scene.")
-
+                    self.apply_crop([x, y, x + width, y + height])
                 else:
                     print("Invalid crop rectangle.")
 
+                # The crop ends either way, so nothing of it is left in the scene.
+                if self.crop_item.scene() is not None:
+                    self.graphics_scene.removeItem(self.crop_item)
+                    print("Crop item removed from the scene.")
+                else:
+                    print("Crop item is already deleted or not in the scene.")
+
                 self.crop_item = None
 
             except RuntimeError as e:
@@ -492,9 +879,11 @@ class ImageEditor(QMainWindow):
                 print(f"Unexpected error: {e}")
         else:
             print("No crop item to confirm.")
+        self.remove_crop_buttons()
 
     def cancel_crop(self):
         """Cancel cropping and remove crop overlay and buttons."""
+        self.graphics_view.drawing_enabled = True
         if self.crop_item is not None:
             try:
                 self.graphics_scene.removeItem(self.crop_item)
@@ -507,9 +896,21 @@ class ImageEditor(QMainWindow):
             except Exception as e:
                 print(f"Unexpected error: {e}")
 
-        if hasattr(self, 'crop_widget') and self.crop_widget is not None:
-            self.crop_widget.hide()
-            self.crop_widget = None 
+        self.remove_crop_buttons()
+
+    def remove_crop_buttons(self):
+        """Take the crop buttons out of the scene and delete them.
+
+        Only hiding them would leave a proxy whose widget Python no longer
+        references, which crashes the next scene.clear().
+        """
+        proxy = getattr(self, 'crop_proxy', None)
+        if proxy is not None:
+            if proxy.scene() is not None:
+                proxy.scene().removeItem(proxy)
+            proxy.deleteLater()
+        self.crop_proxy = None
+        self.crop_widget = None
 
     def show_flip_dialog(self):
         flip_popup = QDialog(self)
@@ -547,35 +948,66 @@ class ImageEditor(QMainWindow):
 
     def apply_flip(self, direction):
         if self.current_pixmap is not None:
-            q_image = self.current_pixmap.toqimage()  
-            pil_image = Image.frombytes("RGBA", (q_image.width(), q_image.height()), 
-                                         q_image.bits(), "raw", "BGRA", 0, 1)
-
-            if not self.is_flipped:
-                self.original_image = pil_image
-
-                if direction == "horizontal":
-                    self.flipped_image = pil_image.transpose(Image.FLIP_LEFT_RIGHT)
-                elif direction == "vertical":
-                    self.flipped_image = pil_image.transpose(Image.FLIP_TOP_BOTTOM)
-
-                self.update_image(self.flipped_image)  
-            else:
-                self.update_image(self.original_image)  
-            
-            self.is_flipped = not self.is_flipped
+            self.apply_orientation("flip", direction=direction)
 
     def apply_rotate(self, direction):
         if self.current_pixmap is not None:
             if direction == "left":
-                self.rotation_angle -= 90 
+                self.apply_orientation("rotate", angle=90)
             elif direction == "right":
-                self.rotation_angle += 90  
-
-            self.rotation_angle %= 360  
-
-            transformed_image = self.current_pixmap.rotate(self.rotation_angle, expand=True)
-            self.update_image(transformed_image)
+                self.apply_orientation("rotate", angle=-90)
+
+    def apply_orientation(self, op, **params):
+        """Flip or turn the image by a quarter turn.
+
+        When the canvas shows the full-resolution render of every edit before
+        this one, the new frame is that render transposed once instead of
+        the whole stack rendered again from the original.
+        """
+        edit = self.edit_stack.push(op, **params)
+        frame = self.current_pixmap
+        if (frame is None or self.full_render_pending or self.resizable_item is None
+                or self.rendered_edits != self.edit_stack.edits[:-1]):
+            self.render_stack()
+            return
+        stack = self.edit_stack.copy()
+        self.full_render_timer.stop()
+        self.renderer.submit(lambda: transpose(frame, orientation([edit])),
+                             self.for_document(lambda image, q_image: self.on_stack_rendered(image, q_image, stack=stack)),
+                             display=display_image)
+
+    def apply_crop(self, box):
+        """Crop to box, in pixels of the current image.
+
+        When the canvas shows the full-resolution render of every edit before
+        the crop, nothing is re-rendered: the new image is a view of the
+        current buffer and the canvas keeps the matching part of its pixmap.
+        Pixels are only copied when a later edit or export reads them.
+        """
+        edit = self.edit_stack.push("crop", box=list(box))
+        frame = self.current_pixmap
+        canvas = self.resizable_item
+        if (not isinstance(frame, Image.Image) or self.full_render_pending or canvas is None
+                or self.rendered_edits != self.edit_stack.edits[:-1]):
+            self.render_stack(dirty=edit_bounds(edit))
+            return
+
+        self.renderer.cancel()
+        self.close_pyramid()
+        with span("crop view", "engine"):
+            image = crop_view(frame, tuple(box))
+        pixmap = canvas.pixmap()
+        scale = frame.width / pixmap.width()
+        left, top, right, bottom = box
+        region = QRect(int(left / scale), int(top / scale),
+                       max(int(round((right - left) / scale)), 1), max(int(round((bottom - top) / scale)), 1))
+        self.history.record("crop", self.edit_stack.edits)
+        self.rendered_edits = self.edit_stack.copy().edits
+        self.current_pixmap = image
+        with span("set_frame", "scene"):
+            canvas.set_frame(pixmap.copy(region), image.width / region.width())
+        self.sync_captions()
+        self.build_pyramid(image)
 
     def crop_image(self):
         if self.current_pixmap is not None:
@@ -585,155 +1017,800 @@ class ImageEditor(QMainWindow):
             right = width * 3 // 4
             bottom = height * 3 // 4
 
-            self.current_pixmap = self.current_pixmap.crop((left, top, right, bottom))
-            self.update_image(self.current_pixmap)
+            self.apply_edit("crop", box=[left, top, right, bottom])
         
     def convert_to_grayscale(self):
         if self.current_pixmap is not None:
-            gray_image = self.current_pixmap.convert("L")  
-            self.update_image(gray_image)
+            self.apply_edit("grayscale")
 
     def on_blur_value_changed(self, value):
         self.blur_dialog.input_field.setText(str(value))
 
         if self.current_pixmap is not None:
-            if hasattr(self, 'original_pixmap'):
-                pil_image = self.original_pixmap
-            else:
-                self.original_pixmap = self.current_pixmap
-                pil_image = self.original_pixmap
-
-            q_image = pil_image.toqimage()
-            pil_image = Image.frombytes("RGBA", (q_image.width(), q_image.height()),
-                                        q_image.bits(), "raw", "BGRA", 0, 1)
-
             blur_radius = value / 20.0  
-            blurred_image = pil_image.filter(ImageFilter.GaussianBlur(blur_radius))  
-
-            self.update_image(blurred_image)  
-            self.current_pixmap = blurred_image  
+            self.apply_adjustment("blur", radius=blur_radius)
             self.current_blur = value  
             
     def on_contrast_value_changed(self, value):
         self.contrast_dialog.input_field.setText(str(value))  
         if self.current_pixmap is not None:
-            if hasattr(self, 'original_pixmap'):
-                enhancer = ImageEnhance.Contrast(self.original_pixmap)
-            else:
-                self.original_pixmap = self.current_pixmap
-                enhancer = ImageEnhance.Contrast(self.original_pixmap)
-
             scale_factor = value / 50.0 if value != 50 else 1.0
-            enhanced_image = enhancer.enhance(scale_factor)
-            self.update_image(enhanced_image)
-            self.current_pixmap = enhanced_image  
+            self.apply_adjustment("contrast", factor=scale_factor)
             self.current_contrast = value  
 
     def on_brightness_value_changed(self, value):
         self.brightness_dialog.input_field.setText(str(value)) 
         if self.current_pixmap is not None:
-            if hasattr(self, 'original_pixmap'):
-                enhancer = ImageEnhance.Brightness(self.original_pixmap)
-            else:
-                self.original_pixmap = self.current_pixmap
-                enhancer = ImageEnhance.Brightness(self.original_pixmap)
-
             scale_factor = value / 50.0 if value != 50 else 1.0
-            enhanced_image = enhancer.enhance(scale_factor)
-            self.update_image(enhanced_image)
-            self.current_pixmap = enhanced_image  
+            self.apply_adjustment("brightness", factor=scale_factor)
             self.current_brightness = value  
 
     def on_saturation_value_changed(self, value):
         self.saturation_dialog.input_field.setText(str(value))  
         if self.current_pixmap is not None:
-            if hasattr(self, 'original_pixmap'):
-                enhancer = ImageEnhance.Color(self.original_pixmap)
-            else:
-                self.original_pixmap = self.current_pixmap
-                enhancer = ImageEnhance.Color(self.original_pixmap)
-
             scale_factor = value / 50.0 if value != 50 else 1.0
-            enhanced_image = enhancer.enhance(scale_factor)
-            self.update_image(enhanced_image)
-            self.current_pixmap = enhanced_image  
+            self.apply_adjustment("saturation", factor=scale_factor)
             self.current_saturation = value  
 
+    def apply_adjustment(self, op, **params):
+        """Update a slider adjustment in the edit stack and preview it."""
+        self.edit_stack.set(op, **params)
+        self.render_preview()
+
+    def apply_edit(self, op, **params):
+        """Append an edit to the stack and render it at full resolution."""
+        edit = self.edit_stack.push(op, **params)
+        self.render_stack(dirty=edit_bounds(edit))
+
+    def preview_size(self):
+        """Device pixels of the viewport, the size the preview proxy is fitted to."""
+        viewport = self.graphics_view.viewport().size()
+        ratio = self.graphics_view.devicePixelRatioF()
+        return (int(viewport.width() * ratio), int(viewport.height() * ratio))
+
+    def render_preview(self):
+        """Render the edit stack on a viewport-sized proxy and schedule the full-resolution pass.
+
+        While an adjust dialog is open, the histogram of the preview is
+        updated in the same job.
+        """
+        max_size = self.preview_size()
+        source = self.original_image
+        proxy = self.preview_proxy
+        filter_cache = self.filter_cache
+        stack = self.edit_stack.copy()
+        tracker = self.document.histogram_tracker if self.adjust_dialogs() else None
+
+        def render():
+            preview = proxy.get(source, max_size)
+            scale = preview.width / source.width
+            image = stack.render(preview, scale, filter_cache)
+            if tracker is not None:
+                tracker.update(stack, preview, scale, filter_cache, image)
+            return image
+
+        def show(image, q_image):
+            self.show_rendered_frame(image, q_image, scale)
+            if tracker is not None:
+                self.show_histogram(tracker.get(stack.edits))
+
+        # Scale the proxy frame up so scene coordinates stay in full-resolution pixels.
+        scale = 1.0 / proxy.scale(source, max_size)
+        self.full_render_pending = True
+        self.renderer.submit(render, self.for_document(show), lane="preview")
+        self.full_render_timer.start()
+
+    def adjust_dialogs(self):
+        """The adjust dialogs currently shown."""
+        dialogs = []
+        for name in ("blur", "contrast", "brightness", "saturation", "sharpen"):
+            dialog = getattr(self, f'{name}_dialog', None)
+            if dialog is not None and dialog.isVisible():
+                dialogs.append(dialog)
+        return dialogs
+
+    def show_histogram(self, histogram):
+        # The dialogs show the active document; a background tab's render must not overwrite them.
+        if histogram is None or self.document is not self.active_document:
+            return
+        for dialog in self.adjust_dialogs():
+            dialog.histogram.set_histogram(histogram)
+
+    def refresh_histogram(self):
+        """Bring the adjust dialogs' histogram up to date with the edit stack, computing it here if needed."""
+        if self.original_image is None or self.document is not self.active_document or not self.adjust_dialogs():
+            return
+        tracker = self.document.histogram_tracker
+        stack = self.edit_stack.copy()
+        histogram = tracker.get(stack.edits)
+        if histogram is None:
+            with span("histogram", "engine"):
+                preview = self.preview_proxy.get(self.original_image, self.preview_size())
+                histogram = tracker.update(stack, preview, preview.width / self.original_image.width, self.filter_cache)
+        self.show_histogram(histogram)
+
+    def auto_levels(self):
+        """Stretch the preview's histogram to the full range with a levels edit at the end of the stack."""
+        if self.original_image is None:
+            return
+        edits = [edit for edit in self.edit_stack.edits if edit["op"] != "levels"]
+        preview = self.preview_proxy.get(self.original_image, self.preview_size())
+        histogram = self.document.histogram_tracker.update(EditStack(edits), preview,
+                                                           preview.width / self.original_image.width, self.filter_cache)
+        levels = auto_levels(histogram)
+        if levels is None:
+            print("[INFO] The image has a single tone; auto levels left it unchanged.")
+            return
+        self.edit_stack = EditStack(edits)
+        self.edit_stack.push("levels", black=levels[0], white=levels[1])
+        self.render_preview()
+
+    def render_full_resolution(self):
+        """Replace the preview with a full-resolution render once the slider settles."""
+        self.full_render_timer.stop()
+        if self.full_render_pending:
+            self.render_stack()
+
+    def render_stack(self, dirty=None):
+        """Render the whole edit stack from the original image in the background.
+
+        dirty is the box the newest edit can change. When the canvas already
+        shows the previous full-resolution frame, only that box is converted
+        and repainted.
+        """
+        canvas = getattr(self, 'resizable_item', None)
+        if (dirty is None or self.full_render_pending or canvas is None
+                or isinstance(self.current_pixmap, TiledImage) or canvas.scale() != 1.0
+                or canvas.pixmap().size() != QSize(*self.current_pixmap.size)):
+            dirty = None
+        else:
+            width, height = self.current_pixmap.size
+            dirty = (max(dirty[0], 0), max(dirty[1], 0), min(dirty[2], width), min(dirty[3], height))
+            if dirty[0] >= dirty[2] or dirty[1] >= dirty[3]:
+                dirty = None
+
+        self.full_render_timer.stop()
+        self.full_render_pending = False
+        source = self.original_image
+        stack = self.edit_stack.copy()
+        if dirty is None:
+            self.renderer.submit(lambda: stack.render(source),
+                                 self.for_document(lambda image, q_image: self.on_stack_rendered(image, q_image, stack=stack)),
+                                 display=display_image)
+        else:
+            self.renderer.submit(lambda: stack.render(source),
+                                 self.for_document(lambda image, q_image: self.on_stack_rendered(image, q_image, dirty, stack)),
+                                 display=lambda image: image.crop(dirty))
+
+    def on_stack_rendered(self, image, q_image, dirty=None, stack=None):
+        """Show a full-resolution render of stack and record it as an undo step if it is the newest state."""
+        self.close_pyramid()
+        previous = self.current_pixmap
+        if stack is not None and stack.edits == self.edit_stack.edits:
+            label = stack.edits[-1]["op"] if len(stack) else "reset"
+            if (dirty is not None and isinstance(previous, Image.Image)
+                    and (previous.size, previous.mode) == (image.size, image.mode)):
+                self.history.record(label, stack.edits, previous, image, dirty)
+            else:
+                self.history.record(label, stack.edits)
+            self.rendered_edits = stack.edits
+        if isinstance(previous, TiledImage) and previous is not self.original_image and previous is not image:
+            previous.close()
+        self.current_pixmap = image
+        if dirty is not None and self.resizable_item.pixmap().size() == QSize(*image.size):
+            with span("update_region", "scene"):
+                self.resizable_item.update_region(q_image, QRect(dirty[0], dirty[1], q_image.width(), q_image.height()))
+            self.sync_captions()
+        else:
+            self.show_rendered_frame(image, q_image)
+        self.build_pyramid(image)
+        self.enforce_memory_budget()
+        self.refresh_histogram()
+
+    def build_pyramid(self, image):
+        """Start building the zoom levels of image, the full-resolution frame now on the canvas.
+
+        A background document's levels are built when it is shown, as it may be spilled before that.
+        """
+        self.close_pyramid()
+        if self.document is not self.active_document:
+            self.pyramid_source = image
+            return
+        self.pyramid = self.pyramid_builder.build(image)
+        self.resizable_item.set_pyramid(self.pyramid)
+
+    def close_pyramid(self):
+        self.pyramid_source = None
+        if self.pyramid is not None:
+            self.pyramid.close()
+            self.pyramid = None
+
+    def on_pyramid_level_ready(self, pyramid, index):
+        canvas = getattr(self, 'resizable_item', None)
+        if canvas is not None and canvas.pyramid is pyramid:
+            canvas.update()
+
+    def new_document(self):
+        """Add an empty tab and show it."""
+        document = Document(self.worker_pool, parent=self)
+        document.loader.after_finished.connect(self.recent_panel.refresh)
+        self.documents.append(document)
+        self.tab_bar.setCurrentIndex(self.tab_bar.addTab(document.title))
+        return document
+
+    def on_tab_changed(self, index):
+        if 0 <= index < len(self.documents):
+            self.switch_document(self.documents[index])
+
+    def switch_document(self, document):
+        """Show document's scene and make its state the editor's.
+
+        Nothing is rendered or copied: the scene keeps its canvas, so the
+        switch costs a setScene. A document whose pixels were spilled to
+        disk keeps a reduced frame on its canvas and is restored behind it.
+        """
+        if document is self.active_document:
+            return
+        if self.active_document is not None:
+            self.leave_document()
+        self.document = self.active_document = document
+        document.last_shown = next(self.show_order)
+
+        view = self.graphics_view
+        view.setScene(document.scene)
+        view.stroke_layer = document.stroke_layer
+        if document.fit_pending:
+            document.fit_pending = False
+            view.fitInView(document.scene.itemsBoundingRect(), Qt.KeepAspectRatio)
+        elif document.view_transform is not None:
+            view.setTransform(document.view_transform)
+            view.centerOn(document.view_center)
+        self.sync_sliders()
+        self.update_export_actions()
+        if document.spilled:
+            self.restore_document()
+        elif document.pyramid_source is not None:
+            self.build_pyramid(document.pyramid_source)
+        self.enforce_memory_budget()
+        self.refresh_histogram()
+
+    def leave_document(self):
+        """Park the shown document's view state before another tab is shown."""
+        document = self.active_document
+        view = self.graphics_view
+        if getattr(self, 'crop_item', None) is not None:
+            self.cancel_crop()
+        view.stop_drawing()
+        document.stroke_layer = view.stroke_layer
+        document.view_transform = view.transform()
+        document.view_center = view.mapToScene(view.viewport().rect().center())
+        # A settling slider still gets its full-resolution render, in the background.
+        self.render_full_resolution()
+        if document.spilled:
+            # Abandon a restore in flight; the document stays on disk.
+            document.loader.cancel()
+
+    def close_document(self, index):
+        document = self.documents[index]
+        if len(self.documents) == 1:
+            self.new_document()
+        if document is self.active_document:
+            self.full_render_timer.stop()
+            self.graphics_view.stop_drawing()
+            self.active_document = None
+        index = self.documents.index(document)
+        self.documents.remove(document)
+        self.tab_bar.removeTab(index)
+        # The decoded original stays in image_cache, so reopening the file is served from memory.
+        document.close()
+
+    def update_export_actions(self):
+        enabled = self.original_image is not None and self.export_progress is None
+        for action in (self.export_jpg_action, self.export_png_action, self.export_webp_action,
+                       self.save_project_action):
+            action.setEnabled(enabled)
+
+    def for_document(self, callback, document=None):
+        """callback bound to document (the current one by default).
+
+        Renders and loads finish on the GUI thread whichever tab is shown
+        by then; the wrapper points the editor's state at the document the
+        work was started for while callback runs.
+        """
+        document = document or self.document
+
+        def call(*args):
+            previous = self.document
+            self.document = document
+            try:
+                return callback(*args)
+            finally:
+                self.document = previous
+        return call
+
+    def enforce_memory_budget(self):
+        """Spill the least recently shown background documents until the session fits memory_budget."""
+        used = sum(document.pixel_bytes() for document in self.documents)
+        for document in sorted(self.documents, key=lambda document: document.last_shown):
+            if used <= self.memory_budget:
+                break
+            if document is not self.active_document and document.can_spill():
+                used -= document.pixel_bytes()
+                self.spill_document(document)
+
+    def spill_document(self, document):
+        """Move a background document's images to disk-backed tiles, keeping a reduced frame on its canvas.
+
+        Its decoded original stays in image_cache until the LRU evicts it.
+        """
+        document.spilling = True
+        document.preview_proxy.clear()
+        document.filter_cache.clear()
+        document.pyramid_source = None
+        if document.pyramid is not None:
+            document.pyramid.close()
+            document.pyramid = None
+        original, current = document.original_image, document.current_pixmap
+        tile_cache = self.tile_cache
+
+        def spill():
+            spilled = {}
+            for image in (original, current):
+                if id(image) not in spilled:
+                    tiled = TiledImage.from_image(image, cache=tile_cache)
+                    # Written through the shared cache; keep none of it resident.
+                    tile_cache.discard(tiled.key)
+                    spilled[id(image)] = tiled
+            preview = downsample(current, SPILLED_DISPLAY_SIZE)
+            return (spilled[id(original)], spilled[id(current)]), to_qimage(preview)
+
+        on_spilled = lambda images, q_image, final: self.on_document_spilled(original, current, images, q_image)
+        document.loader.load([("spill", spill)], self.for_document(on_spilled, document))
+
+    def on_document_spilled(self, original, current, images, q_image):
+        self.document.spilling = False
+        if self.original_image is not original or self.current_pixmap is not current:
+            # Edited or closed meanwhile; the spilled copies are stale.
+            for tiled in {id(tiled): tiled for tiled in images}.values():
+                tiled.close()
+            return
+        self.original_image, self.current_pixmap = images
+        self.document.spilled = True
+        with span("set_frame", "scene"):
+            self.resizable_item.set_frame(QPixmap.fromImage(q_image), current.width / q_image.width())
+
+    def restore_document(self):
+        """Read the shown document's spilled images back into memory on the worker pool.
+
+        The original is taken from image_cache instead while the LRU still holds it.
+        """
+        original, current = self.original_image, self.current_pixmap
+        cached = self.image_cache.get(self.image_key) if self.image_key is not None else None
+
+        def restore():
+            restored = {} if cached is None else {id(original): SharedFrame.from_image(cached)}
+            for tiled in (original, current):
+                if id(tiled) not in restored:
+                    restored[id(tiled)] = SharedFrame.from_image(tiled.to_image())
+                    tiled.cache.discard(tiled.key)
+            frame = restored[id(current)]
+            return (restored[id(original)].image, frame.image), frame.qimage
+
+        on_restored = lambda images, q_image, final: self.on_document_restored(original, current, images, q_image)
+        self.loader.load([("restore", restore)], self.for_document(on_restored))
+
+    def on_document_restored(self, original, current, images, q_image):
+        self.document.spilled = False
+        if self.original_image is original:
+            self.original_image = images[0]
+        if self.current_pixmap is current:
+            self.current_pixmap = images[1]
+            self.show_rendered_frame(images[1], q_image)
+            self.build_pyramid(images[1])
+        for tiled in {id(tiled): tiled for tiled in (original, current)}.values():
+            if tiled is not self.original_image and tiled is not self.current_pixmap:
+                tiled.close()
+        self.enforce_memory_budget()
+
     def import_image(self):
-        image_path, _ = QFileDialog.getOpenFileName(self, "Open Image", "", "Image Files (*.png *.jpg *.bmp)")
+        image_path, _ = QFileDialog.getOpenFileName(self, "Open Image", "", f"Image Files (*.png *.jpg *.bmp *{PROJECT_EXTENSION})")
         if image_path:
-            self.original_image = Image.open(image_path)  
-            self.current_pixmap = self.original_image  
-            pixmap = QPixmap(image_path)
+            self.open_image(image_path)
+
+    def open_image(self, image_path):
+        """Open image_path in a new tab, or show its tab if it is already open."""
+        try:
+            key = file_key(image_path)
+        except OSError as error:
+            print(f"[ERROR] Could not open {image_path}: {error}")
+            return
+        for index, document in enumerate(self.documents):
+            if document.path == key[0]:
+                self.tab_bar.setCurrentIndex(index)
+                return
+        if self.document.path is not None:
+            self.new_document()
+        self.document.path = key[0]
+        self.tab_bar.setTabText(self.documents.index(self.document), self.document.title)
+        self.tab_bar.setTabToolTip(self.documents.index(self.document), key[0])
+        self.full_render_timer.stop()
+        self.full_render_pending = False
+        self.renderer.cancel()
+        self.preview_proxy.clear()
+        self.filter_cache.clear()
+        self.edit_stack.clear()
+        self.history.clear()
+        self.rendered_edits = []
+        self.close_pyramid()
+        if isinstance(self.current_pixmap, TiledImage):
+            self.current_pixmap.close()
+        if isinstance(self.original_image, TiledImage):
+            self.original_image.close()
+        # A new image starts a new canvas; edits to it then update the canvas in place.
+        self.graphics_view.clear_strokes()
+        with span("graphics_scene.clear", "scene"):
             self.graphics_scene.clear()
-            
-            self.resizable_item = ResizablePixmapItem(pixmap)
-            self.graphics_scene.addItem(self.resizable_item)
-
-            self.graphics_view.fitInView(self.graphics_scene.itemsBoundingRect(), Qt.KeepAspectRatio)
-
-            self.current_contrast = 50
-            self.current_brightness = 50
-            self.current_saturation = 50
-
-            self.export_jpg_action.setEnabled(True)
-            self.export_png_action.setEnabled(True)
-
-            if hasattr(self, 'contrast_dialog'):
-                self.contrast_dialog.slider.setValue(self.current_contrast)
-            if hasattr(self, 'brightness_dialog'):
-                self.brightness_dialog.slider.setValue(self.current_brightness)
-            if hasattr(self, 'saturation_dialog'):
-                self.saturation_dialog.slider.setValue(self.current_saturation)
+        self.resizable_item = None
+        self.document.captions = []
+
+        self.original_image = None
+        self.current_pixmap = None
+
+        self.current_contrast = 50
+        self.current_brightness = 50
+        self.current_saturation = 50
+
+        if hasattr(self, 'contrast_dialog'):
+            self.contrast_dialog.slider.setValue(self.current_contrast)
+        if hasattr(self, 'brightness_dialog'):
+            self.brightness_dialog.slider.setValue(self.current_brightness)
+        if hasattr(self, 'saturation_dialog'):
+            self.saturation_dialog.slider.setValue(self.current_saturation)
+
+        self.image_key = key
+        self.decode_cache.add_recent(image_path)
+        self.recent_panel.refresh()
+
+        if is_project(image_path):
+            self.open_project(image_path, key)
+            return
+        cached = self.image_cache.get(key)
+        if cached is not None:
+            self.loader.cancel()
+            self.image_size = cached.size
+            self.on_image_loaded(cached, to_qimage(cached), True)
+        else:
+            # Show a cached mid-resolution decode or the embedded EXIF preview
+            # straight away, then let the loader refine the canvas with a JPEG
+            # draft and finally the full decode.
+            with span("probe", "engine"):
+                size, preview = probe(image_path)
+            with span("cache lookup", "engine"):
+                mid = self.decode_cache.mid(key)
+            self.image_size = size
+            if mid is not None and mid.size == size:
+                # Small files are cached whole.
+                self.loader.cancel()
+                frame = SharedFrame.from_image(mid)
+                self.on_image_loaded(frame.image, frame.qimage, True)
+            else:
+                preview = mid if mid is not None else preview
+                if preview is not None:
+                    self.show_rendered_frame(preview, to_qimage(preview), size[0] / preview.width)
+                self.load_image(image_path, key, with_draft=mid is None)
+
+    def load_image(self, image_path, key, with_draft=True):
+        """Decode image_path on the loader thread: a draft sized to the view first, then the full image.
+
+        The decode is then written to the disk cache under key without delaying it.
+        """
+        viewport = self.graphics_view.viewport().size()
+        ratio = self.graphics_view.devicePixelRatioF()
+        max_size = (int(viewport.width() * ratio), int(viewport.height() * ratio))
+        tile_cache = self.tile_cache
+        decode_cache = self.decode_cache
+        # The in-memory image shown for the final stage, cached once it is posted.
+        decoded = []
+
+        def load_draft():
+            image = draft(image_path, max_size)
+            return None if image is None else (image, to_qimage(image))
+
+        def load_full():
+            image = decode(image_path)
+            if image.width * image.height > TILED_PIXELS:
+                # Spill very large images to disk-backed tiles instead of keeping
+                # full-size copies in memory; only a downsample is displayed.
+                tiled = TiledImage.from_image(normalize_mode(image), cache=tile_cache)
+                image.close()
+                decoded.append(display_image(tiled))
+                return tiled, to_qimage(decoded[0])
+            # Decode once into a buffer PIL and Qt share.
+            frame = SharedFrame.from_image(image)
+            image.close()
+            decoded.append(frame.image)
+            return frame.image, frame.qimage
+
+        def store():
+            decode_cache.store(key, decoded[0])
+
+        stages = [("decode", load_full)]
+        if with_draft:
+            stages.insert(0, ("decode draft", load_draft))
+        self.loader.load(stages, self.for_document(self.on_image_loaded), after=("cache store", store))
+
+    def on_image_loaded(self, image, q_image, final):
+        # Frames are placed in full-resolution scene coordinates from the first preview on.
+        self.show_rendered_frame(image, q_image, self.image_size[0] / q_image.width())
+        if not final:
+            return
+        self.original_image = image
+        self.current_pixmap = image
+        if isinstance(image, Image.Image):
+            self.image_cache.put(self.image_key, image)
+        self.build_pyramid(image)
+        if self.document is self.active_document:
+            self.update_export_actions()
+        self.enforce_memory_budget()
+
+    def open_project(self, path, key):
+        """Open a saved project: its edits and strokes, the stored preview at once, then the source.
+
+        Only the manifest and the preview are read here. The source tiles
+        stay in the memory-mapped file; a small image is decompressed on the
+        loader thread and a large one is kept as tiles read as they are
+        drawn or rendered.
+        """
+        self.loader.cancel()
+        try:
+            with span("open project", "engine"):
+                project = ProjectFile(path)
+                try:
+                    preview = project.preview()
+                    # The source maps the file on its own; the project's map is only needed for the preview.
+                    source = project.source(self.tile_cache)
+                finally:
+                    project.close()
+        except (OSError, ValueError) as error:
+            print(f"[ERROR] Could not open project {path}: {error}")
+            return
+        self.image_size = project.size
+        self.edit_stack = EditStack(project.edits)
+        self.sync_sliders()
+        strokes = project.strokes()
+        if strokes:
+            layer = StrokeLayer()
+            self.graphics_scene.addItem(layer)
+            for stroke in strokes:
+                layer.add(stroke)
+            self.graphics_view.stroke_layer = self.document.stroke_layer = layer
+        # Undo goes back to the bare source, strokes included, as it does for an opened image.
+        self.history.record("open", project.edits, strokes=strokes)
+        self.show_rendered_frame(preview, to_qimage(preview), project.size[0] / preview.width)
+
+        decode_cache = self.decode_cache
+
+        def load():
+            if source.width * source.height > TILED_PIXELS:
+                return source, to_qimage(preview)
+            frame = SharedFrame.from_image(source.to_image())
+            source.close()
+            return frame.image, frame.qimage
+
+        def store():
+            decode_cache.store(key, preview)
+
+        self.loader.load([("load project", load)], self.for_document(self.on_project_loaded),
+                         after=("cache store", store))
+
+    def on_project_loaded(self, image, q_image, final):
+        if not len(self.edit_stack):
+            self.on_image_loaded(image, q_image, final)
+            return
+        self.original_image = image
+        if isinstance(image, TiledImage) and self.edit_stack.region_halo() is not None:
+            # Tiles of the edited image are rendered as they are drawn, keeping
+            # the stored preview as the canvas frame; nothing is rendered whole.
+            stack = self.edit_stack.copy()
+            self.current_pixmap = RenderedTiles(stack, image)
+            self.rendered_edits = stack.edits
+            self.build_pyramid(self.current_pixmap)
+            if self.document is self.active_document:
+                self.update_export_actions()
+            self.enforce_memory_budget()
+            return
+        # Edits that move pixels or read the whole image, such as a crop or
+        # contrast, are rendered whole in the background; the stored preview
+        # stays on the canvas until then.
+        self.current_pixmap = image
+        if self.document is self.active_document:
+            self.update_export_actions()
+        self.render_stack()
 
     def update_image(self, pil_image):
         """Updates the display with the new PIL image."""
-        
-        q_image = ImageQt(pil_image)
-        pixmap = QPixmap.fromImage(q_image)
-        
-        self.graphics_scene.clear() 
-        
+        self.show_rendered_frame(pil_image, to_qimage(pil_image))
+
+    def show_rendered_frame(self, pil_image, q_image, scale=None):
+        """Show a frame produced by the render worker on the persistent canvas item.
+
+        The item is updated in place, so zoom, pan and anything drawn over the
+        image survive. scale maps frame pixels to full-resolution pixels; by
+        default it is derived from pil_image, e.g. for a tiled image's downsample.
+        """
+        with span("QPixmap.fromImage", "convert"):
+            pixmap = QPixmap.fromImage(q_image)
+        if scale is None:
+            scale = pil_image.width / q_image.width()
+
+        canvas = getattr(self, 'resizable_item', None)
+        if canvas is not None and canvas.scene() is self.graphics_scene:
+            # The canvas stops drawing from the pyramid of the previous frame.
+            self.pyramid_source = None
+            with span("set_frame", "scene"):
+                canvas.set_frame(pixmap, scale)
+            self.sync_captions()
+            return
+
         self.resizable_item = ResizablePixmapItem(pixmap)
+        self.resizable_item.setScale(scale)
         self.graphics_scene.addItem(self.resizable_item)
         
-        self.graphics_view.fitInView(self.graphics_scene.itemsBoundingRect(), Qt.KeepAspectRatio)
+        if self.graphics_view.scene() is not self.graphics_scene:
+            # Loaded in a background tab; fit when the tab is shown.
+            self.document.fit_pending = True
+            return
+        with span("fitInView", "scene"):
+            self.graphics_view.fitInView(self.graphics_scene.itemsBoundingRect(), Qt.KeepAspectRatio)
 
     def export_image(self, format):
+        if self.export_busy():
+            return
         file_dialog = QFileDialog(self, "Save Image as {}".format(format.upper()))
         file_dialog.setAcceptMode(QFileDialog.AcceptSave)
         file_dialog.setNameFilter("Image Files (*.{})".format(format))
         file_dialog.setModal(True)
         file_dialog.setOption(QFileDialog.DontUseNativeDialog, True)
         
-        if file_dialog.exec() == QDialog.Accepted:
-            file_path = file_dialog.selectedFiles()[0]
-            if file_path:
-                if not file_path.lower().endswith(f".{format}"):
-                    file_path += f".{format}"
-                print(f"[DEBUG] Attempting to save image to: {file_path}")
-
-                if hasattr(self, 'resizable_item'):
-                    print(f"[DEBUG] Item in graphics scene: {type(self.resizable_item)}")
-                    if isinstance(self.resizable_item, ResizablePixmapItem):
-                        pixmap_to_save = self.resizable_item.current_pixmap
-                        if pixmap_to_save and not pixmap_to_save.isNull():
-                            print("[DEBUG] Pixmap is valid.")
-                            success = pixmap_to_save.save(file_path, format.upper())
-                            if success:
-                                print(f"[SUCCESS] Image saved to {file_path}")
-                            else:
-                                print(f"[ERROR] Failed to save image to {file_path}. Check format or permissions.")
-                        else:
-                            print("[ERROR] Pixmap is null or invalid. Unable to save.")
-                    else:
-                        print("[ERROR] The item is not a ResizablePixmapItem.")
-                else:
-                    print("[ERROR] No resizable item found to export.")
-            else:
-                print("[ERROR] No file path selected.")
+        if file_dialog.exec() != QDialog.Accepted:
+            print("[INFO] File dialog was cancelled.")
+            return
+        file_path = file_dialog.selectedFiles()[0]
+        if not file_path:
+            print("[ERROR] No file path selected.")
+            return
+        if not file_path.lower().endswith(f".{format}"):
+            file_path += f".{format}"
+        if self.original_image is None:
+            print("[ERROR] No image to export.")
+            return
+
+        options_dialog = ExportOptionsDialog(format_for_path(file_path), self)
+        if options_dialog.exec() != QDialog.Accepted:
+            return
+        self.start_export(file_path, options_dialog.options())
+
+    def start_export(self, file_path, options):
+        """Encode the full-resolution edited image to file_path on the export thread."""
+        if self.export_busy():
+            return
+        stack = self.edit_stack.copy()
+        source = self.original_image
+        frame = self.current_pixmap
+        lossless = self.lossless_jpeg_orientation(stack, file_path)
+        if lossless is not None:
+            # Only flips and quarter turns on a JPEG: copy the file with a new EXIF orientation.
+            source_path = self.document.path
+            render = lambda: oriented_jpeg(source_path, lossless)
+            print("[INFO] Writing the JPEG without re-encoding; encoder options are not used.")
+        elif (isinstance(frame, Image.Image) and not self.full_render_pending
+                and stack.edits == self.rendered_edits):
+            # The canvas already holds this full-resolution render.
+            render = lambda: frame
         else:
+            render = lambda: render_full(stack, source)
+
+        self.show_export_progress("Export", "Exporting...")
+        self.exporter.start(render, file_path, options)
+
+    def show_export_progress(self, title, label):
+        # Encoded size is unknown up front, so the dialog shows a busy bar and the bytes written.
+        self.export_progress = QProgressDialog(label, "Cancel", 0, 0, self)
+        self.export_progress.setWindowTitle(title)
+        self.export_progress.setMinimumDuration(0)
+        self.export_progress.canceled.connect(self.exporter.cancel)
+        self.export_progress.show()
+        self.update_export_actions()
+
+    def export_busy(self):
+        """Whether a job still holds the exporter, which runs one at a time; says so if it does.
+
+        The progress dialog is kept until the job reports back, so this
+        also covers a job that is queued or cancelled but not yet finished.
+        """
+        if self.export_progress is None and not self.exporter.is_busy():
+            return False
+        print("[ERROR] Another export is still running; wait for it or cancel it first.")
+        return True
+
+    def save_project_as(self):
+        if self.export_busy():
+            return
+        if self.original_image is None:
+            print("[ERROR] No image to save.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save Project", "", f"Redy Projects (*{PROJECT_EXTENSION})")
+        if not path:
             print("[INFO] File dialog was cancelled.")
+            return
+        if not is_project(path):
+            path += PROJECT_EXTENSION
+        self.start_save_project(path)
+
+    def start_save_project(self, path):
+        """Write the source pixels, edit stack and strokes to a project at path on the export thread.
+
+        The preview stored with it is reduced from the canvas's frame when
+        that is the current full-resolution render, and rendered on a
+        downsample of the source otherwise.
+        """
+        if self.export_busy():
+            return
+        stack = self.edit_stack.copy()
+        source = self.original_image
+        frame = self.current_pixmap if self.is_frame_synced() else None
+        strokes = list(self.graphics_view.strokes)
+        decode_cache = self.decode_cache
+        render = lambda: {"source": source, "edits": stack.edits, "strokes": strokes,
+                          "preview": project_preview(stack, source, frame)}
+
+        def save(project, path, options, cancelled, on_write):
+            save_project(project, path, options, cancelled, on_write)
+            # Gives the project a thumbnail in the recent files.
+            decode_cache.store(file_key(path), project["preview"])
+
+        self.show_export_progress("Save Project", "Saving...")
+        self.exporter.start(render, path, None, save)
+
+    def lossless_jpeg_orientation(self, stack, file_path):
+        """Orientation to write file_path in as a copy of the open JPEG file, or None if it must be encoded."""
+        path = self.document.path
+        if path is None or format_for_path(file_path) != "JPEG" or stack.orientation() is None:
+            return None
+        try:
+            if format_for_path(path) != "JPEG" or file_key(path) != self.image_key:
+                return None
+        except (OSError, ValueError):
+            return None
+        return stack.orientation()
+
+    def on_export_progress(self, label):
+        if self.export_progress is not None:
+            self.export_progress.setLabelText(label)
+
+    def close_export_progress(self):
+        if self.export_progress is not None:
+            self.export_progress.canceled.disconnect(self.exporter.cancel)
+            self.export_progress.close()
+            self.export_progress = None
+            self.update_export_actions()
+
+    def on_export_finished(self, path):
+        self.close_export_progress()
+        if is_project(path):
+            self.decode_cache.add_recent(path)
+            self.recent_panel.refresh()
+            print(f"[SUCCESS] Project saved to {path}")
+            return
+        print(f"[SUCCESS] Image saved to {path}")
+
+    def on_export_failed(self, path, error):
+        self.close_export_progress()
+        print(f"[ERROR] Failed to save image to {path}:\n{error}")
+
+    def on_export_cancelled(self):
+        self.close_export_progress()
+        print("[INFO] Export was cancelled.")
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,9 @@
+"""Engine tests. Run from the repository root:
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+# The editor's packages are imported from src, as when it is run from there.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
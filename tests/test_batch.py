@@ -0,0 +1,65 @@
+"""Runs of the headless batch command on small images."""
+import json
+import os
+import subprocess
+import sys
+from PIL import Image
+from engine.stack import EditStack
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+RECIPE = [{"op": "brightness", "factor": 1.2}, {"op": "flip", "direction": "horizontal"}, {"op": "grayscale"}]
+
+def write_image(path, color):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    image = Image.linear_gradient("L").resize((40, 30)).convert("RGB")
+    Image.composite(image, Image.new("RGB", image.size, color), Image.new("L", image.size, 128)).save(path)
+
+def batch(tmp_path, *arguments):
+    recipe = tmp_path / "recipe.json"
+    recipe.write_text(json.dumps(RECIPE))
+    return subprocess.run([sys.executable, "batch.py", str(recipe), "--workers", "2", *map(str, arguments)],
+                          cwd=SRC, capture_output=True, text=True)
+
+def test_applies_the_recipe_to_every_image(tmp_path):
+    for name, color in (("a", (255, 0, 0)), ("b", (0, 0, 255))):
+        write_image(tmp_path / "photos" / f"{name}.png", color)
+    result = batch(tmp_path, tmp_path / "photos", "--output", tmp_path / "edited", "--format", ".png")
+    assert result.returncode == 0, result.stdout + result.stderr
+    for name in ("a", "b"):
+        with Image.open(tmp_path / "photos" / f"{name}.png") as source:
+            expected = EditStack(RECIPE).render(source)
+        with Image.open(tmp_path / "edited" / f"{name}.png") as edited:
+            assert edited.tobytes() == expected.tobytes()
+
+def test_reports_files_it_cannot_read(tmp_path):
+    write_image(tmp_path / "photos" / "a.png", (255, 0, 0))
+    (tmp_path / "photos" / "broken.png").write_bytes(b"not an image")
+    result = batch(tmp_path, tmp_path / "photos", "--output", tmp_path / "edited")
+    assert result.returncode == 1
+    assert "broken.png" in result.stdout
+    assert os.listdir(tmp_path / "edited") == ["a.png"]
+
+def test_same_names_in_two_directories_keep_their_paths(tmp_path):
+    write_image(tmp_path / "photos" / "x.png", (255, 0, 0))
+    write_image(tmp_path / "scans" / "x.png", (0, 0, 255))
+    result = batch(tmp_path, tmp_path / "photos", tmp_path / "scans", "--output", tmp_path / "edited", "--format", ".jpg")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert (tmp_path / "edited" / "photos" / "x.jpg").is_file()
+    assert (tmp_path / "edited" / "scans" / "x.jpg").is_file()
+
+def test_refuses_to_write_over_inputs_or_twice_to_one_file(tmp_path):
+    write_image(tmp_path / "photos" / "x.png", (255, 0, 0))
+    write_image(tmp_path / "photos" / "x.jpg", (0, 0, 255))
+    before = (tmp_path / "photos" / "x.png").read_bytes()
+    for output, extension in ((tmp_path / "photos", ".png"), (tmp_path / "edited", ".png")):
+        result = batch(tmp_path, tmp_path / "photos", "--output", output, "--format", extension)
+        assert result.returncode == 1
+        assert "[ERROR]" in result.stdout
+    assert (tmp_path / "photos" / "x.png").read_bytes() == before
+    assert not (tmp_path / "edited").exists()
+
+def test_rejects_a_worker_count_below_one(tmp_path):
+    write_image(tmp_path / "photos" / "x.png", (255, 0, 0))
+    result = batch(tmp_path, tmp_path / "photos", "--output", tmp_path / "edited", "--workers", "0")
+    assert result.returncode == 2
+    assert "must be at least 1" in result.stderr
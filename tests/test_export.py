@@ -0,0 +1,66 @@
+"""Checks that exports honour their encoder settings and replace files only once complete."""
+import os
+import zlib
+import pytest
+from PIL import Image
+from engine.export import ExportCancelled, encoder_options, save_image
+
+def sample_image(mode="RGB"):
+    image = Image.linear_gradient("L").resize((64, 48))
+    return Image.merge(mode, [image, image.transpose(Image.FLIP_LEFT_RIGHT), image.rotate(180)] + [image] * (len(mode) - 3))
+
+def test_encoder_options_ignore_settings_of_other_formats():
+    assert encoder_options("JPEG", {"quality": 70, "lossless": True}) == {"quality": 70, "progressive": False, "optimize": False}
+    assert encoder_options("PNG", {"strategy": "rle"})["compress_type"] == zlib.Z_RLE
+    assert encoder_options("BMP", {"quality": 10}) == {}
+
+@pytest.mark.parametrize("name", ["image.png", "image.jpg", "image.webp", "image.bmp"])
+def test_saves_in_the_format_of_the_extension(tmp_path, name):
+    path = tmp_path / name
+    save_image(sample_image("RGBA"), str(path), {"quality": 95, "lossless": True})
+    with Image.open(path) as saved:
+        assert saved.format == {".png": "PNG", ".jpg": "JPEG", ".webp": "WEBP", ".bmp": "BMP"}[path.suffix]
+        assert saved.size == (64, 48)
+        # Formats without alpha get the colour channels only.
+        assert saved.mode == ("RGB" if path.suffix in (".jpg", ".bmp") else "RGBA")
+    assert os.listdir(tmp_path) == [name]
+
+def test_lossless_exports_keep_the_pixels(tmp_path):
+    image = sample_image()
+    for name, options in (("image.png", {"compress_level": 1}), ("image.webp", {"lossless": True})):
+        save_image(image, str(tmp_path / name), options)
+        with Image.open(tmp_path / name) as saved:
+            assert saved.convert("RGB").tobytes() == image.tobytes()
+
+def test_progress_reports_every_byte(tmp_path):
+    written = []
+    save_image(sample_image(), str(tmp_path / "image.jpg"), {"progressive": True}, on_write=written.append)
+    assert written == sorted(written)
+    assert written[-1] == os.path.getsize(tmp_path / "image.jpg")
+
+def test_cancelled_export_keeps_the_previous_file(tmp_path):
+    path = tmp_path / "image.png"
+    save_image(sample_image(), str(path))
+    before = path.read_bytes()
+    with pytest.raises(ExportCancelled):
+        save_image(sample_image().rotate(90), str(path), cancelled=lambda: True)
+    assert path.read_bytes() == before
+    assert os.listdir(tmp_path) == ["image.png"]
+
+def test_exports_get_the_permissions_of_a_new_file(tmp_path):
+    (tmp_path / "plain").write_bytes(b"")
+    save_image(sample_image(), str(tmp_path / "image.png"))
+    assert os.stat(tmp_path / "image.png").st_mode == os.stat(tmp_path / "plain").st_mode
+
+def test_exports_follow_the_umask_at_the_time_of_the_export(tmp_path):
+    previous = os.umask(0o027)
+    try:
+        save_image(sample_image(), str(tmp_path / "image.png"))
+    finally:
+        os.umask(previous)
+    assert os.stat(tmp_path / "image.png").st_mode & 0o777 == 0o640
+
+def test_rejects_unknown_extensions(tmp_path):
+    with pytest.raises(ValueError):
+        save_image(sample_image(), str(tmp_path / "image.gif"))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,70 @@
+"""Undo/redo round-trips through the history, with tile patches kept in memory and spilled to disk."""
+from PIL import Image, ImageDraw
+from engine.history import History
+from engine.strokes import Stroke
+
+def frames(size=(100, 70)):
+    """A frame and a copy with text-like pixels drawn over a region spanning several tiles."""
+    before = Image.linear_gradient("L").resize(size).convert("RGB")
+    after = before.copy()
+    ImageDraw.Draw(after).rectangle((10, 20, 60, 45), fill=(255, 0, 0))
+    return before, after
+
+def paste(frame, patches):
+    frame = frame.copy()
+    for box, tile in patches:
+        frame.paste(tile, box[:2])
+    return frame
+
+def test_undo_and_redo_restore_edits():
+    history = History()
+    assert history.undo() is None
+    history.record("Contrast", [{"op": "contrast", "factor": 1.2}])
+    history.record("Grayscale", [{"op": "contrast", "factor": 1.2}, {"op": "grayscale"}])
+    assert history.record("Nothing", [{"op": "contrast", "factor": 1.2}, {"op": "grayscale"}]) is None
+    assert history.undo() == ([{"op": "contrast", "factor": 1.2}], [], ())
+    assert history.undo() == ([], [], ())
+    assert not history.can_undo()
+    assert history.redo() == ([{"op": "contrast", "factor": 1.2}], [], ())
+    # Recording after an undo drops the steps that could have been redone.
+    history.record("Blur", [{"op": "contrast", "factor": 1.2}, {"op": "blur", "radius": 2}])
+    assert not history.can_redo()
+    assert history.current_edits() == [{"op": "contrast", "factor": 1.2}, {"op": "blur", "radius": 2}]
+
+def test_strokes_are_steps_of_their_own():
+    history = History()
+    first, second = Stroke((255, 0, 0, 255), 3), Stroke((0, 0, 255, 255), 5)
+    history.record("Stroke", [], strokes=[first])
+    # Edits recorded later keep the strokes of the step before them.
+    history.record("Grayscale", [{"op": "grayscale"}])
+    history.record("Stroke", [{"op": "grayscale"}], strokes=[first, second])
+    assert history.record("Nothing", [{"op": "grayscale"}], strokes=[first, second]) is None
+    assert history.undo() == ([{"op": "grayscale"}], [], (first,))
+    assert history.undo() == ([], [], (first,))
+    assert history.undo() == ([], [], ())
+    assert history.redo() == ([], [], (first,))
+    history.redo()
+    assert history.redo() == ([{"op": "grayscale"}], [], (first, second))
+
+def check_patches(budget):
+    before, after = frames()
+    history = History(budget=budget, tile_size=16)
+    entry = history.record("Text", [{"op": "text"}], before, after, (10, 20, 61, 46))
+    assert entry.patches and all(patch.box[2] - patch.box[0] <= 16 for patch in entry.patches)
+    edits, patches, _ = history.undo()
+    assert edits == []
+    assert paste(after, patches).tobytes() == before.tobytes()
+    edits, patches, _ = history.redo()
+    assert edits == [{"op": "text"}]
+    assert paste(before, patches).tobytes() == after.tobytes()
+    return history
+
+def test_patches_round_trip_in_memory():
+    history = check_patches(budget=2**20)
+    assert history.file is None
+
+def test_patches_round_trip_after_spilling():
+    history = check_patches(budget=0)
+    assert history.file is not None and history.used == 0
+    history.clear()
+    assert history.file is None
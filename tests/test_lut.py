@@ -0,0 +1,52 @@
+"""Checks that the fused point-operation pipeline matches chained ImageEnhance calls."""
+import random
+from PIL import Image, ImageChops, ImageEnhance
+from engine.lut import PointPipeline
+
+ENHANCERS = {"brightness": ImageEnhance.Brightness, "contrast": ImageEnhance.Contrast,
+             "saturation": ImageEnhance.Color}
+
+def noise_image(mode="RGB", size=(48, 32), seed=4):
+    rng = random.Random(seed)
+    return Image.frombytes(mode, size, bytes(rng.randrange(256) for _ in range(size[0] * size[1] * len(mode))))
+
+def chained(image, edits):
+    for edit in edits:
+        image = ENHANCERS[edit["op"]](image).enhance(edit["factor"])
+    return image
+
+def max_difference(first, second):
+    return max(high for _, high in ImageChops.difference(first, second).getextrema())
+
+def test_random_pipelines_match_chained_enhancers():
+    rng = random.Random(4)
+    image = noise_image()
+    for _ in range(50):
+        edits = [{"op": rng.choice(("brightness", "contrast")), "factor": rng.uniform(0.8, 1.2)}
+                 for _ in range(rng.randrange(1, 4))]
+        edits.append({"op": "saturation", "factor": rng.uniform(0.5, 1.5)})
+        # Only rounding differs from the chain, which rounds to 8 bits after every op.
+        assert max_difference(PointPipeline(edits).apply(image), chained(image, edits)) <= 6, edits
+
+def test_contrast_pivot_follows_earlier_curves():
+    image = noise_image()
+    edits = [{"op": "brightness", "factor": 0.6}, {"op": "contrast", "factor": 1.5}]
+    assert max_difference(PointPipeline(edits).apply(image), chained(image, edits)) <= 2
+
+def test_identity_edits_compile_to_nothing():
+    pipeline = PointPipeline([{"op": "brightness", "factor": 1.0}, {"op": "saturation", "factor": 1.0}])
+    assert pipeline.compile() == (None, None)
+    image = noise_image()
+    assert pipeline.apply(image) is image
+    assert not PointPipeline([{"op": "brightness", "factor": 1.2}]).needs_histogram()
+    assert PointPipeline([{"op": "contrast", "factor": 1.2}]).needs_histogram()
+
+def test_grayscale_has_equal_channels():
+    red, green, blue = PointPipeline([{"op": "grayscale"}]).apply(noise_image()).split()
+    assert red.tobytes() == green.tobytes() == blue.tobytes()
+
+def test_rgba_keeps_alpha():
+    image = noise_image("RGBA")
+    result = PointPipeline([{"op": "contrast", "factor": 1.3}, {"op": "saturation", "factor": 0.4}]).apply(image)
+    assert result.mode == "RGBA"
+    assert result.getchannel("A").tobytes() == image.getchannel("A").tobytes()
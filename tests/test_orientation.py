@@ -0,0 +1,110 @@
+"""Round-trip checks for composed flips and quarter turns and for lossless JPEG orientation."""
+import io
+import random
+from PIL import Image, ImageOps
+from engine.export import jpeg_segments, oriented_jpeg
+from engine.stack import TRANSPOSE_METHODS, EditStack, orientation, transpose
+from engine.tiles import TiledImage, TileCache
+
+def asymmetric_image(width=37, height=23):
+    """RGB image with no symmetry, so every orientation of it is different."""
+    image = Image.new("RGB", (width, height))
+    image.putdata([(x * 7 % 256, y * 11 % 256, (x * y) % 256) for y in range(height) for x in range(width)])
+    return image
+
+def random_edits(rng):
+    edits = []
+    for _ in range(rng.randrange(9)):
+        if rng.random() < 0.5:
+            edits.append({"op": "flip", "direction": rng.choice(("horizontal", "vertical"))})
+        else:
+            edits.append({"op": "rotate", "angle": rng.choice((90, -90, 180, 270, -180))})
+    return edits
+
+def apply_one_by_one(image, edits):
+    """The edits applied with plain Pillow calls, one at a time."""
+    for edit in edits:
+        if edit["op"] == "rotate":
+            image = image.rotate(edit["angle"], expand=True)
+        elif edit["direction"] == "horizontal":
+            image = image.transpose(Image.FLIP_LEFT_RIGHT)
+        else:
+            image = image.transpose(Image.FLIP_TOP_BOTTOM)
+    return image
+
+def test_composed_orientation_matches_edits_in_order():
+    rng = random.Random(21)
+    image = asymmetric_image()
+    tiled = TiledImage.from_image(image, tile_size=8, cache=TileCache())
+    for _ in range(300):
+        edits = random_edits(rng)
+        expected = apply_one_by_one(image, edits).tobytes()
+        assert EditStack(edits).render(image).tobytes() == expected, edits
+        assert transpose(tiled, orientation(edits)).to_image().tobytes() == expected, edits
+    tiled.close()
+
+def test_stack_orientation_ignores_identity_edits_and_refuses_others():
+    assert EditStack([{"op": "rotate", "angle": 90}, {"op": "brightness", "factor": 1.0}]).orientation() == (1, False)
+    assert EditStack([{"op": "rotate", "angle": 90}, {"op": "grayscale"}]).orientation() is None
+    assert EditStack([{"op": "rotate", "angle": 45}]).orientation() is None
+
+def jpeg_bytes(image, exif=None, jfif=True):
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90, **({} if exif is None else {"exif": exif}))
+    data = buffer.getvalue()
+    if not jfif:
+        # Pillow writes a JFIF APP0 segment; drop it to cover files without one.
+        for marker, start, end in jpeg_segments(data):
+            if marker == 0xE0:
+                return data[:start] + data[end:]
+    return data
+
+def scan_data(data):
+    """Bytes from the start-of-scan marker on, which a lossless orientation change must keep."""
+    end = 2
+    for _, _, end in jpeg_segments(data):
+        pass
+    return data[end:]
+
+def source_variants():
+    """JPEGs without EXIF, with an orientation entry, with EXIF but no orientation entry, and without JFIF."""
+    image = asymmetric_image(48, 32)
+    with_orientation = Image.Exif()
+    with_orientation[0x0112] = 6
+    without_orientation = Image.Exif()
+    without_orientation[0x010F] = "Camera"
+    return {
+        "plain": jpeg_bytes(image),
+        "oriented": jpeg_bytes(image, with_orientation.tobytes()),
+        "exif without orientation": jpeg_bytes(image, without_orientation.tobytes()),
+        "no jfif": jpeg_bytes(image, jfif=False),
+    }
+
+def test_oriented_jpeg_matches_exif_transpose(tmp_path):
+    for name, data in source_variants().items():
+        path = tmp_path / "source.jpg"
+        path.write_bytes(data)
+        with Image.open(path) as source:
+            decoded = source.convert("RGB")
+        for pair in TRANSPOSE_METHODS:
+            result = oriented_jpeg(str(path), pair)
+            assert scan_data(result) == scan_data(data), (name, pair)
+            with Image.open(io.BytesIO(result)) as oriented:
+                shown = ImageOps.exif_transpose(oriented).convert("RGB")
+            assert shown.tobytes() == transpose(decoded, pair).tobytes(), (name, pair)
+
+def test_oriented_jpeg_keeps_other_exif_entries(tmp_path):
+    path = tmp_path / "source.jpg"
+    path.write_bytes(source_variants()["exif without orientation"])
+    with Image.open(io.BytesIO(oriented_jpeg(str(path), (3, True)))) as oriented:
+        exif = oriented.getexif()
+    assert exif[0x0112] == 7
+    assert exif[0x010F] == "Camera"
+
+def test_jpeg_segments_rejects_other_files():
+    for data in (b"", b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff\xe0\x00\x10JFIF"):
+        try:
+            list(jpeg_segments(data))
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {data!r}")
@@ -0,0 +1,115 @@
+"""Round-trip checks for the project file format."""
+import os
+import pytest
+from PIL import Image
+from engine.export import ExportCancelled
+from engine.project import MappedTiledImage, ProjectFile, project_preview, save_project
+from engine.stack import EditStack, RenderedTiles
+from engine.strokes import Stroke
+from engine.tiles import TiledImage, TileCache
+
+EDITS = [{"op": "brightness", "factor": 1.2}, {"op": "blur", "radius": 1.5},
+         {"op": "text", "text": "Project", "position": [20, 30], "color": [255, 0, 0]}]
+
+def noise_image(mode="RGB", size=(700, 300)):
+    """Incompressible pixels whose size is not a multiple of the tile size, so edge tiles are partial."""
+    return Image.frombytes(mode, size, os.urandom(size[0] * size[1] * len(mode)))
+
+def strokes():
+    stroke = Stroke((0, 128, 255, 255), 4.5, 0.25)
+    stroke.points.extend([1.0, 2.0, 30.5, 40.25, 99.0, 7.0])
+    return [stroke]
+
+def project(source, edits=EDITS):
+    return {"source": source, "edits": edits, "strokes": strokes(),
+            "preview": project_preview(EditStack(edits), source)}
+
+def assert_round_trip(path, pixels, preview=None):
+    opened = ProjectFile(str(path))
+    source = opened.source(TileCache())
+    assert isinstance(source, MappedTiledImage)
+    assert opened.size == pixels.size and source.mode == pixels.mode
+    assert source.to_image().tobytes() == pixels.tobytes()
+    assert opened.edits == EDITS
+    [stroke] = opened.strokes()
+    assert (stroke.color, stroke.width, stroke.tolerance) == ((0, 128, 255, 255), 4.5, 0.25)
+    assert list(stroke.points) == [1.0, 2.0, 30.5, 40.25, 99.0, 7.0]
+    if preview is not None:
+        assert opened.preview().tobytes() == preview.tobytes()
+    opened.close()
+    assert opened.mapping.closed
+    # The source keeps its own map.
+    assert source.to_image().tobytes() == pixels.tobytes()
+    return source
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+def test_pil_source(tmp_path, mode):
+    image = noise_image(mode)
+    saved = project(image)
+    save_project(saved, str(tmp_path / "image.redy"))
+    assert_round_trip(tmp_path / "image.redy", image, saved["preview"]).close()
+
+def test_source_is_normalized(tmp_path):
+    image = noise_image("L")
+    save_project(project(image), str(tmp_path / "gray.redy"))
+    assert_round_trip(tmp_path / "gray.redy", image.convert("RGB")).close()
+
+def test_tiled_source(tmp_path):
+    image = noise_image()
+    tiled = TiledImage.from_image(image, tile_size=64, cache=TileCache())
+    save_project(project(tiled), str(tmp_path / "tiled.redy"))
+    source = assert_round_trip(tmp_path / "tiled.redy", image)
+    assert source.tile_size == 64
+    source.close()
+    tiled.close()
+
+def test_mapped_source_and_saving_over_its_own_file(tmp_path):
+    image = noise_image()
+    path = tmp_path / "self.redy"
+    save_project(project(image), str(path))
+    source = assert_round_trip(path, image)
+    mapping = source.mapping
+    # The compressed tiles are copied as they are, into a new file renamed over the mapped
+    # one once that is unmapped, as Windows requires; the source then maps the new file.
+    save_project(project(source, EDITS[:1]), str(path))
+    assert mapping.closed and not source.mapping.closed
+    source.cache.discard(source.key)
+    assert source.to_image().tobytes() == image.tobytes()
+    opened = ProjectFile(str(path))
+    assert opened.edits == EDITS[:1]
+    saved = opened.source(TileCache())
+    assert saved.to_image().tobytes() == image.tobytes()
+    saved.close()
+    opened.close()
+    source.close()
+    assert source.mapping is None and mapping.closed
+
+def test_cancelled_save_keeps_the_previous_file(tmp_path):
+    path = tmp_path / "kept.redy"
+    image = noise_image()
+    save_project(project(image), str(path))
+    with pytest.raises(ExportCancelled):
+        save_project(project(noise_image()), str(path), cancelled=lambda: True)
+    assert_round_trip(path, image).close()
+    assert os.listdir(tmp_path) == ["kept.redy"]
+
+def test_rejects_other_and_truncated_files(tmp_path):
+    path = tmp_path / "project.redy"
+    save_project(project(noise_image()), str(path))
+    data = path.read_bytes()
+    for name, content in (("empty", b""), ("png", b"\x89PNG\r\n\x1a\n" + data[8:]), ("truncated", data[:-5])):
+        broken = tmp_path / f"{name}.redy"
+        broken.write_bytes(content)
+        with pytest.raises(ValueError):
+            ProjectFile(str(broken))
+
+def test_rendered_tiles_match_a_whole_render():
+    image = noise_image()
+    tiled = TiledImage.from_image(image, tile_size=64, cache=TileCache())
+    stack = EditStack(EDITS + [{"op": "grayscale"}])
+    assert stack.region_halo() is not None
+    lazy = RenderedTiles(stack, tiled)
+    whole = stack.render_tiled(tiled)
+    assert lazy.to_image().tobytes() == whole.to_image().tobytes()
+    for image in (lazy, whole, tiled):
+        image.close()
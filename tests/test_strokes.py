@@ -0,0 +1,53 @@
+"""Checks that stroke simplification keeps every captured point within tolerance."""
+import math
+import random
+import time
+from engine.strokes import Stroke
+
+def segment_distance(point, start, end):
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    length = dx * dx + dy * dy
+    t = 0.0 if length == 0 else max(0.0, min(1.0, ((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) / length))
+    return math.hypot(point[0] - start[0] - t * dx, point[1] - start[1] - t * dy)
+
+def polyline_distance(stroke, point):
+    if len(stroke) == 1:
+        return math.hypot(point[0] - stroke.points[0], point[1] - stroke.points[1])
+    return min(segment_distance(point, stroke.point(index), stroke.point(index + 1)) for index in range(len(stroke) - 1))
+
+def drag(rng, count):
+    """A wandering mouse drag: small steps whose heading drifts."""
+    x = y = heading = 0.0
+    points = []
+    for _ in range(count):
+        heading += rng.gauss(0, 0.15)
+        step = rng.uniform(0.5, 4.0)
+        x, y = x + step * math.cos(heading), y + step * math.sin(heading)
+        points.append((x, y))
+    return points
+
+def test_captured_points_stay_within_tolerance():
+    rng = random.Random(18)
+    for tolerance in (0.25, 0.5, 2.0):
+        stroke = Stroke((0, 0, 0, 255), 3, tolerance)
+        points = drag(rng, 500)
+        for x, y in points:
+            stroke.add(x, y)
+        assert len(stroke) < len(points) / 3
+        # Merged points stay within tolerance of their segment. A dropped point was within
+        # tolerance of a vertex that, if later moved, stayed within tolerance of its segment.
+        assert all(polyline_distance(stroke, point) <= 2 * tolerance + 1e-9 for point in points)
+
+def test_straight_drag_keeps_its_ends():
+    stroke = Stroke((0, 0, 0, 255), 3)
+    results = [stroke.add(x * 2.0, 5.0) for x in range(10000)]
+    assert results[:2] == [True, True] and set(results[2:]) == {False}
+    assert list(stroke.points) == [0.0, 5.0, 19998.0, 5.0]
+
+def test_long_drag_costs_the_same_per_point():
+    stroke = Stroke((0, 0, 0, 255), 3, 1.0)
+    start = time.perf_counter()
+    for x in range(50000):
+        stroke.add(float(x), math.sin(x / 5000.0))
+    # Re-testing every merged point took minutes here; a cone check takes well under a second.
+    assert time.perf_counter() - start < 5